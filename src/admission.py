@@ -0,0 +1,259 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+import asyncio
+import math
+import time
+import httpx
+import openai
+from .components.call_policy import DeadlineExceeded
+
+# Upstream statuses that mean the backend is saturated rather than the request being bad
+OVERLOAD_STATUS_CODES = (429, 503)
+
+def is_overload(error: BaseException) -> bool:
+    """Whether a failed request signals overload (timeouts, upstream 429/503)."""
+    if isinstance(error, (DeadlineExceeded, TimeoutError, openai.APITimeoutError, httpx.TimeoutException)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in OVERLOAD_STATUS_CODES
+
+class BaseLimiter(ABC):
+    """Adaptive limit on the number of requests processed concurrently"""
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self._limit = float(initial_limit)
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    def _set(self, value: float) -> None:
+        self._limit = min(float(self.max_limit), max(float(self.min_limit), value))
+
+    @abstractmethod
+    def on_sample(self, latency_s: float, inflight: int, dropped: bool) -> None:
+        """Update the limit from a completed request.
+
+        `inflight` is the concurrency the request ran at; `dropped` marks
+        failures that signal overload (timeouts, upstream rate limits).
+        """
+        pass
+
+class AIMDLimiter(BaseLimiter):
+    """Additive increase, multiplicative decrease.
+
+    Grows by one per successful request while the limit is actually being
+    used, and backs off by `backoff_ratio` on drops or when latency exceeds
+    `latency_target_s`.
+    """
+    def __init__(self, initial_limit: int = 16, min_limit: int = 2, max_limit: int = 128,
+                 backoff_ratio: float = 0.9, latency_target_s: Optional[float] = None):
+        super().__init__(initial_limit, min_limit, max_limit)
+        self.backoff_ratio = backoff_ratio
+        self.latency_target_s = latency_target_s
+
+    def on_sample(self, latency_s: float, inflight: int, dropped: bool) -> None:
+        if dropped or (self.latency_target_s is not None and latency_s > self.latency_target_s):
+            self._set(self._limit * self.backoff_ratio)
+        elif inflight * 2 >= self.limit:
+            self._set(self._limit + 1)
+
+class GradientLimiter(BaseLimiter):
+    """Latency-gradient limiter.
+
+    Compares each request's latency with a slow moving average. While latency
+    stays near the long-term baseline the limit grows by sqrt(limit); as
+    queueing inflates latency the ratio drops below one and shrinks the limit
+    proportionally, down to half per sample.
+    """
+    def __init__(self, initial_limit: int = 16, min_limit: int = 2, max_limit: int = 128,
+                 tolerance: float = 1.5, smoothing: float = 0.2, long_window: int = 600,
+                 backoff_ratio: float = 0.9):
+        super().__init__(initial_limit, min_limit, max_limit)
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.long_window = long_window
+        self.backoff_ratio = backoff_ratio
+        self.long_latency_s: Optional[float] = None
+
+    def on_sample(self, latency_s: float, inflight: int, dropped: bool) -> None:
+        if dropped:
+            self._set(self._limit * self.backoff_ratio)
+            return
+        if self.long_latency_s is None:
+            self.long_latency_s = latency_s
+        else:
+            self.long_latency_s += (latency_s - self.long_latency_s) / self.long_window
+            # Recover the baseline faster after a sustained latency increase has ended
+            if self.long_latency_s / max(latency_s, 1e-9) > 2:
+                self.long_latency_s *= 0.95
+
+        # Don't grow a limit the traffic isn't using
+        if inflight * 2 < self.limit:
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_latency_s / max(latency_s, 1e-9)))
+        target = self._limit * gradient + math.sqrt(self._limit)
+        self._set(self._limit * (1 - self.smoothing) + target * self.smoothing)
+
+class AdmissionRejected(Exception):
+    """The request was shed; `status_code` is 429 (queue full) or 503 (queue timeout)."""
+    def __init__(self, status_code: int, retry_after_s: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after_s = retry_after_s
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+class AdmissionController:
+    """Admits requests up to the limiter's concurrency limit and queues the rest.
+
+    Each priority class (highest first in `priorities`) has its own bounded
+    queue. Freed slots go to the oldest waiter of the highest non-empty class.
+    A request is rejected with 429 when its class's queue is full and with 503
+    when it waits longer than `queue_timeout_s`; both carry a Retry-After
+    estimate. Must be used from a single event loop.
+    """
+    def __init__(self, limiter: BaseLimiter, priorities: List[str],
+                 max_queue_sizes: Dict[str, int], queue_timeout_s: float = 5.0):
+        self.limiter = limiter
+        self.priorities = priorities
+        self.max_queue_sizes = max_queue_sizes
+        self.queue_timeout_s = queue_timeout_s
+        self.inflight = 0
+        self._queues: Dict[str, Deque[_Waiter]] = {p: deque() for p in priorities}
+        self._latency_ewma_s: Optional[float] = None
+        self.admitted = 0
+        self.rejected = {429: 0, 503: 0}
+
+    @asynccontextmanager
+    async def admit(self, priority: str, max_wait_s: Optional[float] = None):
+        """Hold a concurrency slot for the body of the `async with` block.
+
+        Overload errors raised inside the block (see `is_overload`) are
+        reported to the limiter as drops. Other errors release the slot
+        without a sample, so failing requests neither shrink nor grow the limit.
+        """
+        await self._acquire(priority, max_wait_s)
+        start = time.monotonic()
+        inflight = self.inflight
+        try:
+            yield
+        except BaseException as e:
+            if is_overload(e):
+                self._release(time.monotonic() - start, inflight, dropped=True)
+            else:
+                self._release_slot()
+            raise
+        self._release(time.monotonic() - start, inflight, dropped=False)
+
+    async def _acquire(self, priority: str, max_wait_s: Optional[float]) -> None:
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority}")
+        if self.inflight < self.limiter.limit and not self._waiting_at_or_above(priority):
+            self.inflight += 1
+            self.admitted += 1
+            return
+
+        queue = self._queues[priority]
+        if len(queue) >= self.max_queue_sizes.get(priority, 0):
+            self.rejected[429] += 1
+            raise AdmissionRejected(429, self.retry_after_s(), f"Queue for priority '{priority}' is full")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future())
+        queue.append(waiter)
+        timeout = self.queue_timeout_s if max_wait_s is None else min(self.queue_timeout_s, max_wait_s)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Admitted just as the wait timed out; keep the slot
+                return
+            queue.remove(waiter)
+            waiter.future.cancel()
+            self.rejected[503] += 1
+            raise AdmissionRejected(503, self.retry_after_s(), "Timed out waiting for capacity")
+        except asyncio.CancelledError:
+            # Client went away: give back a slot we may already have been handed
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release_slot()
+            elif waiter in queue:
+                queue.remove(waiter)
+            raise
+
+    def _waiting_at_or_above(self, priority: str) -> bool:
+        for name in self.priorities:
+            if self._queues[name]:
+                return True
+            if name == priority:
+                return False
+        return False
+
+    def _release(self, latency_s: float, inflight: int, dropped: bool) -> None:
+        self.limiter.on_sample(latency_s, inflight, dropped)
+        if not dropped:
+            if self._latency_ewma_s is None:
+                self._latency_ewma_s = latency_s
+            else:
+                self._latency_ewma_s += 0.1 * (latency_s - self._latency_ewma_s)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        self.inflight -= 1
+        # Hand freed slots (and any the limit grew by) to waiters, highest priority first
+        for name in self.priorities:
+            queue = self._queues[name]
+            while queue and self.inflight < self.limiter.limit:
+                waiter = queue.popleft()
+                if waiter.future.done():
+                    continue
+                waiter.future.set_result(None)
+                self.inflight += 1
+                self.admitted += 1
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def retry_after_s(self) -> int:
+        """Rough time for the current backlog to drain, in whole seconds."""
+        latency = self._latency_ewma_s or 1.0
+        return max(1, math.ceil((self.queued() + 1) * latency / self.limiter.limit))
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limiter.limit,
+            "inflight": self.inflight,
+            "queued": {name: len(q) for name, q in self._queues.items()},
+            "admitted": self.admitted,
+            "rejected": {str(k): v for k, v in self.rejected.items()},
+            "latency_ewma_s": self._latency_ewma_s
+        }
+
+def create_admission_controller(settings) -> Optional[AdmissionController]:
+    """Build the controller configured by the `admission_*` settings, or None if disabled."""
+    if not settings.admission_enabled:
+        return None
+    limits = dict(
+        initial_limit=settings.admission_initial_limit,
+        min_limit=settings.admission_min_limit,
+        max_limit=settings.admission_max_limit
+    )
+    if settings.admission_limiter == "aimd":
+        limiter = AIMDLimiter(latency_target_s=settings.admission_latency_target_seconds, **limits)
+    elif settings.admission_limiter == "gradient":
+        limiter = GradientLimiter(**limits)
+    else:
+        raise ValueError(f"Unknown admission limiter: {settings.admission_limiter}")
+    if settings.default_priority not in settings.admission_priorities:
+        raise ValueError(f"Default priority {settings.default_priority} is not in admission_priorities")
+    return AdmissionController(
+        limiter=limiter,
+        priorities=settings.admission_priorities,
+        max_queue_sizes=settings.admission_queue_sizes,
+        queue_timeout_s=settings.admission_queue_timeout_seconds
+    )
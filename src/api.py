@@ -1,94 +1,374 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Header, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional, Dict, Any
+import hmac
+import json
 import uvicorn
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from .config import Settings
-from .logging.json_logger import JsonLogger
+from .logging.json_logger import JsonLogger, LoggingEncoder
+from .logging.finetuning import iter_finetuning_examples
+from .logging.compaction import LogCompactor, start_background_compaction
+from .components.bm25 import start_background_sync
 from .components import (
     LLMRequestRouter,
+    EmbeddingRequestRouter,
     LLMQueryReformulator,
     VectorRetriever,
+    BM25Index,
     LLMCompletionChecker,
-    LLMAnswerGenerator
+    AdaptiveCompletionChecker,
+    LLMAnswerGenerator,
+    Deadline,
+    DeadlineExceeded,
+    create_llm_cache,
+    SQLiteLLMCache,
+    create_shared_caches,
+    create_embedding_provider,
+    create_session_lookup,
+    policy_for_step
 )
-from .workflow import RAGWorkflow
+from .workflow import RAGWorkflow, build_rag_dag
 from .models import RAGResponse, Document
+from .ingestion import IngestionJobManager, JobQueueFull, JobStore, QueryPriorityGate, create_deduplicator
+from .admission import AdmissionRejected, create_admission_controller
+from .profiling import ARTIFACTS, create_request_profiler
 
 app = FastAPI()
 
-logger = JsonLogger()
-
 # Load settings
 settings = Settings()
 
+logger = JsonLogger(settings.log_dir)
+if settings.log_compaction_interval_seconds:
+    # Roll old logs into compressed segments and enforce retention in the background
+    start_background_compaction(LogCompactor(
+        settings.log_dir,
+        min_age=timedelta(hours=settings.log_compaction_min_age_hours),
+        retention=timedelta(days=settings.log_retention_days) if settings.log_retention_days else None,
+        max_bytes=int(settings.log_max_size_mb * 1024 * 1024) if settings.log_max_size_mb else None
+    ), settings.log_compaction_interval_seconds)
+
+# Build every configured retrieval profile up front so bad configuration fails at startup
+retrieval_profiles = {
+    name: settings.get_retrieval_profile(name) for name in settings.retrieval_profiles
+}
+
 # Initialize retriever
+keyword_index = None
+if settings.keyword_index_path:
+    # The first worker process to open the index writes it; the others read its snapshots
+    keyword_index = BM25Index.open(settings.keyword_index_path, settings.keyword_index_merge_threshold)
+embedding_provider = create_embedding_provider(settings, policy_for_step(settings, "retriever"))
 retriever = VectorRetriever(
     collection_name=settings.qdrant_collection_name,
-    url=settings.qdrant_url
+    url=settings.qdrant_url,
+    default_profile=settings.get_retrieval_profile(),
+    policy=policy_for_step(settings, "retriever"),
+    keyword_index=keyword_index,
+    embedding_provider=embedding_provider,
+    **create_shared_caches(settings, embedding_provider.dimension, embedding_provider.name)
 )
+if keyword_index is not None:
+    # Documents added since the last save only lived in the unsaved delta; reindex if any are missing
+    if keyword_index.writer and len(keyword_index) != retriever.client.count(settings.qdrant_collection_name).count:
+        retriever.rebuild_keyword_index()
+        keyword_index.save()
+    start_background_sync(keyword_index, settings.keyword_index_sync_interval_seconds)
 
 # Initialize components
-router = LLMRequestRouter(model=settings.router_model)
-reformulator = LLMQueryReformulator(model=settings.reformulator_model)
-completion_checker = LLMCompletionChecker(model=settings.completion_model)
-answer_generator = LLMAnswerGenerator(model=settings.answer_model)
+llm_cache = create_llm_cache(settings)
+router = LLMRequestRouter(
+    model=settings.router_model, cache=llm_cache, policy=policy_for_step(settings, "router")
+)
+if settings.router_strategy == "embedding":
+    # Classify by query embedding; the LLM router only handles low-confidence queries
+    router = EmbeddingRequestRouter(
+        embed=retriever.embed_query,
+        embed_batch=retriever.embed_queries,
+        fallback=router,
+        confidence_threshold=settings.router_confidence_threshold,
+        model_path=settings.router_model_path
+    )
+    if router.weights is None:
+        # Embed the prototypes now rather than inside the first request's deadline
+        router.build_centroids()
+reformulator = LLMQueryReformulator(
+    model=settings.reformulator_model, cache=llm_cache, policy=policy_for_step(settings, "reformulator"),
+    num_variants=settings.reformulator_num_variants
+)
+completion_checker = LLMCompletionChecker(
+    model=settings.completion_model, cache=llm_cache, policy=policy_for_step(settings, "completion_checker")
+)
+if settings.completion_strategy == "adaptive":
+    # Decide from retrieval scores; the LLM checker only handles uncertain contexts
+    completion_checker = AdaptiveCompletionChecker(
+        fallback=completion_checker,
+        threshold=settings.completion_threshold,
+        confidence=settings.completion_fast_path_confidence,
+        shadow_rate=settings.completion_shadow_rate,
+        model_path=settings.completion_model_path
+    )
+answer_generator = LLMAnswerGenerator(
+    model=settings.answer_model, policy=policy_for_step(settings, "answer_generator")
+)
+
+# Conversation sessions; shares the retriever's query embedding cache
+session_lookup = create_session_lookup(settings, retriever.embed_query)
 
 # Initialize workflow
-workflow = RAGWorkflow(
+if settings.workflow_engine not in ("linear", "dag"):
+    raise ValueError(f"Unknown workflow engine: {settings.workflow_engine}")
+workflow = (build_rag_dag if settings.workflow_engine == "dag" else RAGWorkflow)(
     router=router,
     reformulator=reformulator,
     retriever=retriever,
     completion_checker=completion_checker,
     answer_generator=answer_generator,
-    completion_threshold=settings.completion_threshold
+    completion_threshold=settings.completion_threshold,
+    logger=logger,
+    session_lookup=session_lookup
 )
 
+# Ingestion runs in its own worker pool and yields to queries between batches
+priority_gate = QueryPriorityGate()
+ingestion_jobs = IngestionJobManager(
+    retriever=retriever,
+    workers=settings.ingestion_workers,
+    batch_size=settings.ingestion_batch_size,
+    max_queued_jobs=settings.ingestion_max_queued_jobs,
+    priority_gate=priority_gate,
+    deduplicator=create_deduplicator(settings),
+    store=JobStore(settings.ingestion_jobs_path) if settings.ingestion_jobs_path else None
+)
+
+@app.on_event("shutdown")
+def save_keyword_index() -> None:
+    if keyword_index is not None and keyword_index.writer:
+        keyword_index.save()
+        keyword_index.close()
+
+@app.on_event("shutdown")
+def flush_llm_cache() -> None:
+    # Access times of SQLite cache hits are buffered; write the rest
+    if isinstance(llm_cache, SQLiteLLMCache):
+        llm_cache.flush()
+
+# Sheds /query load beyond what the backends can serve at acceptable latency
+admission = create_admission_controller(settings)
+
+# Opt-in profiling of sampled or X-Profile flagged queries
+request_profiler = create_request_profiler(settings)
+
 class QueryRequest(BaseModel):
     query: str
+    profile: Optional[str] = None  # Name of a retrieval profile from settings
+    priority: Optional[str] = None  # Admission priority class; overrides the X-Priority header
+    session_id: Optional[str] = None  # Conversation id; follow-ups may reuse earlier context
 
 class DocumentRequest(BaseModel):
     documents: List[Document]
 
+def _is_admin(token: Optional[str]) -> bool:
+    return bool(settings.admin_token and token and hmac.compare_digest(token, settings.admin_token))
+
+def _run_workflow(profiled: bool, *args):
+    """Execute the workflow, profiled if requested. Returns (response, workflow_log, profile_id)."""
+    if not profiled:
+        return (*workflow.execute(*args), None)
+    with request_profiler.profile("/query") as profile_id:
+        return (*workflow.execute(*args), profile_id)
+
 @app.post("/query")
-async def process_query(request: QueryRequest):
-    """Process a query through the RAG workflow"""
-    response, workflow_log = workflow.execute(request.query)
+async def process_query(request: QueryRequest, response: Response,
+                        x_priority: Optional[str] = Header(None),
+                        x_profile: Optional[str] = Header(None),
+                        x_admin_token: Optional[str] = Header(None)):
+    """Process a query through the RAG workflow.
+    
+    Sends an X-Profile-Id header when the request was profiled. Send the
+    admin token as X-Profile to profile a specific request, and as
+    X-Admin-Token to use an admission priority above the default.
+    """
+    # The budget starts when the request arrives, so time queued behind ingestion counts
+    deadline = Deadline(settings.request_timeout_seconds) if settings.request_timeout_seconds else None
+    profile_name = request.profile or settings.default_retrieval_profile
+    if profile_name not in retrieval_profiles:
+        raise HTTPException(status_code=400, detail=f"Unknown retrieval profile: {profile_name}")
+    priority = request.priority or x_priority or settings.default_priority
+    if admission and priority not in admission.priorities:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {priority}")
+    if (admission and admission.priorities.index(priority) < admission.priorities.index(settings.default_priority)
+            and not _is_admin(x_admin_token)):
+        raise HTTPException(status_code=403, detail=f"Priority {priority} requires the admin token")
+    profiled = bool(request_profiler) and request_profiler.should_profile(_is_admin(x_profile))
+    try:
+        async with _admit(priority, deadline):
+            with priority_gate.query():
+                result, workflow_log, profile_id = await run_in_threadpool(
+                    _run_workflow, profiled, request.query, retrieval_profiles[profile_name], deadline,
+                    request.session_id
+                )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after_s)}
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     logger.log_workflow(workflow_log)
-    if not response:
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    if not result:
         raise HTTPException(status_code=400, detail="Could not process query")
-    return response
+    return result
+
+@asynccontextmanager
+async def _admit(priority: str, deadline: Optional[Deadline]):
+    if admission is None:
+        yield
+        return
+    async with admission.admit(priority, max_wait_s=deadline.remaining() if deadline else None):
+        yield
+
+@app.get("/admission")
+async def get_admission_stats() -> dict:
+    """Current concurrency limit, in-flight and queued requests, and shed counts"""
+    return admission.stats() if admission else {"enabled": False}
+
+@app.get("/completion-checker")
+async def get_completion_checker_stats() -> dict:
+    """Skip rate of the adaptive completion checker and its agreement with the LLM on shadow checks"""
+    if isinstance(completion_checker, AdaptiveCompletionChecker):
+        return completion_checker.stats()
+    return {"enabled": False}
+
+@app.get("/sessions")
+async def get_session_stats() -> dict:
+    """Number of live sessions and turns, approximate memory use and evictions"""
+    return session_lookup.store.stats() if session_lookup else {"enabled": False}
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str) -> dict:
+    """Forget a conversation's earlier turns"""
+    if not session_lookup or not session_lookup.store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown session {session_id}")
+    return {"status": "deleted", "session_id": session_id}
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if not _is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def _profiler():
+    if request_profiler is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return request_profiler
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles(limit: int = Query(100, ge=1, le=1000)) -> list:
+    """Newest request profiles, with their duration and available artifacts"""
+    return _profiler().list_profiles(limit)
 
-@app.post("/documents")
+@app.get("/admin/profiles/hot", dependencies=[Depends(require_admin)])
+def get_hot_functions(limit: int = Query(50, ge=1, le=1000),
+                      last: int = Query(100, ge=1, le=1000)) -> dict:
+    """Functions ranked by self time, summed over the newest `last` profiles"""
+    return _profiler().hot_functions(limit, last)
+
+@app.get("/admin/profiles/{profile_id}/{artifact}", dependencies=[Depends(require_admin)])
+def get_profile_artifact(profile_id: str, artifact: str):
+    """Download a profile artifact: speedscope, collapsed, pstats or report.
+    
+    Open speedscope files at https://www.speedscope.app; collapsed stacks are
+    the input of flamegraph.pl; pstats files load with `python -m pstats`.
+    """
+    path = _profiler().artifact(profile_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No {artifact} artifact for profile {profile_id}")
+    return FileResponse(path, filename=f"{profile_id}-{ARTIFACTS[artifact]}")
+
+@app.post("/documents", status_code=202)
 async def add_documents(request: DocumentRequest) -> dict:
-    """Add documents to the retriever"""
+    """Enqueue documents for background ingestion"""
+    documents = [Document(text=doc.text, metadata=doc.metadata, id=doc.id) for doc in request.documents]
     try:
-        documents = [Document(text=doc.text, metadata=doc.metadata) for doc in request.documents]
-        retriever.add_documents(documents)
-        return {"status": "success", "message": f"Added {len(documents)} documents"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job = ingestion_jobs.submit(documents)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {
+        "status": job.status.value,
+        "job_id": job.job_id,
+        "message": f"Queued {len(documents)} documents"
+    }
+
+@app.get("/documents/jobs/{job_id}")
+async def get_ingestion_job(job_id: str) -> dict:
+    """Get progress, errors and throughput of an ingestion job"""
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+def _ndjson(records: Iterator[Any]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, cls=LoggingEncoder) + "\n"
+
+def _page_response(records: Iterator[Any], next_cursor: Optional[str]) -> StreamingResponse:
+    # The cursor is known before the body streams, so it goes in a header
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return StreamingResponse(_ndjson(records), media_type="application/x-ndjson", headers=headers)
+
+def _page_workflows(cursor: Optional[str], limit: int,
+                    start_time: Optional[datetime], end_time: Optional[datetime]):
+    try:
+        return logger.page_workflow_logs(cursor, limit, start_time, end_time)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/logs/workflows")
-async def get_workflow_logs(
+def get_workflow_logs(
     workflow_id: Optional[str] = None,
     start_time: Optional[datetime] = None,
-    end_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=10000)
 ):
-    """Get workflow logs with optional filtering"""
-    return workflow.logger.get_workflow_logs(workflow_id, start_time, end_time)
+    """Stream workflow logs as NDJSON, one page at a time.
+    
+    Pass the X-Next-Cursor response header as `cursor` to get the next page;
+    it is absent on the last page.
+    """
+    if workflow_id:
+        return _page_response(iter(logger.get_workflow_logs(workflow_id, start_time, end_time)), None)
+    workflows, next_cursor = _page_workflows(cursor, limit, start_time, end_time)
+    return _page_response(workflows, next_cursor)
 
 @app.get("/logs/finetuning")
-async def export_logs_for_finetuning(
+def export_logs_for_finetuning(
     start_time: Optional[datetime] = None,
-    end_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None,
+    steps: str = "answer_generator",
+    answered_only: bool = True,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=100000)
 ):
-    """Export logs in OpenAI finetuning format"""
-    return workflow.logger.export_for_finetuning(start_time, end_time)
+    """Stream logged LLM steps as OpenAI chat fine-tuning examples (NDJSON).
+    
+    `steps` is a comma-separated list of router, reformulator, completion_checker
+    and answer_generator. Paginated over workflows like /logs/workflows.
+    """
+    workflows, next_cursor = _page_workflows(cursor, limit, start_time, end_time)
+    examples = iter_finetuning_examples(logger, workflows, steps.split(","), answered_only)
+    return _page_response(examples, next_cursor)
 
 if __name__ == "__main__":
     uvicorn.run("src.api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,203 @@
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+@dataclass
+class FakeOpenAIConfig:
+    chat_latency_ms: float = 50.0      # Time to first token
+    chat_jitter_ms: float = 10.0
+    tokens_per_sec: float = 100.0      # Output generation rate
+    embedding_latency_ms: float = 10.0
+    embedding_dim: int = 1536
+    route: str = "ANSWER"
+    completion_score: float = 0.9
+    answer_tokens: int = 100
+    seed: Optional[int] = None
+
+def hash_embedding(text: str, dim: int) -> np.ndarray:
+    """Deterministic bag-of-words embedding so similar texts land close together."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[bucket] += sign
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text.split()))
+
+class FakeOpenAIServer:
+    """OpenAI-compatible HTTP server with configurable latency.
+
+    Serves `/v1/chat/completions` and `/v1/embeddings`. Chat responses are
+    chosen from the prompt so each LLM component receives output it can parse.
+    Latency is `chat_latency_ms` plus jitter plus output tokens at
+    `tokens_per_sec`, which keeps benchmarks reproducible without API spend.
+    """
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeOpenAIConfig()
+        self._random = random.Random(self.config.seed)
+        self._random_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _jitter_s(self) -> float:
+        with self._random_lock:
+            return self._random.uniform(0, self.config.chat_jitter_ms) / 1000
+
+    def chat_content(self, prompt: str) -> str:
+        config = self.config
+        if "query router" in prompt:
+            return config.route
+        if "reformulate it" in prompt:
+            query = prompt.rsplit("User Query:", 1)[-1].strip()
+            keywords = [w for w in re.findall(r"\w+", query) if len(w) > 3][:3]
+            response: Dict[str, Any] = {"refined_query": query, "keywords": keywords}
+            match = re.search(r"write (\d+) alternative phrasings", prompt)
+            if match:
+                # Vary the query by dropping one word at a time
+                words = query.split()
+                response["variants"] = [
+                    " ".join(words[:i] + words[i + 1:]) for i in range(min(int(match.group(1)), len(words)))
+                ]
+            return json.dumps(response)
+        if "sufficient information" in prompt:
+            return f"{config.completion_score:.2f}"
+        if "answer the question" in prompt:
+            match = re.search(r"Context 1:\n(.*?)(?:\n\n|$)", prompt, re.S)
+            citation = match.group(1).strip() if match else ""
+            filler = " ".join(["lorem"] * config.answer_tokens)
+            return json.dumps({
+                "answer": filler,
+                "citations": [{"text": citation, "relevance_score": 0.9}] if citation else [],
+                "confidence_score": 0.9
+            })
+        if prompt.lstrip().startswith("Evaluate"):
+            return json.dumps({"score": 0.8, "feedback": "Looks reasonable"})
+        return "OK"
+
+    def chat_completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        content = self.chat_content(prompt)
+        completion_tokens = _approx_tokens(content)
+        time.sleep(
+            self.config.chat_latency_ms / 1000
+            + self._jitter_s()
+            + completion_tokens / self.config.tokens_per_sec
+        )
+        prompt_tokens = _approx_tokens(prompt)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def embeddings(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body.get("input", [])
+        texts: List[str] = [inputs] if isinstance(inputs, str) else list(inputs)
+        time.sleep(self.config.embedding_latency_ms / 1000)
+
+        data = []
+        for i, text in enumerate(texts):
+            vector = hash_embedding(text, self.config.embedding_dim)
+            if body.get("encoding_format") == "base64":
+                embedding: Any = base64.b64encode(vector.astype("<f4").tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(_approx_tokens(t) for t in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.endswith("/chat/completions"):
+                    payload = server.chat_completion(body)
+                elif self.path.endswith("/embeddings"):
+                    payload = server.embeddings(body)
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--chat-latency-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(FakeOpenAIConfig(
+        chat_latency_ms=args.chat_latency_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        embedding_latency_ms=args.embedding_latency_ms
+    ), host=args.host, port=args.port)
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
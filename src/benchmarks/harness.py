@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+from .stats import summarize
+
+TOPICS = {
+    "python": ["python", "language", "guido", "interpreter", "indentation", "typing", "garbage", "collector"],
+    "database": ["index", "query", "transaction", "postgres", "replication", "schema", "btree", "vacuum"],
+    "network": ["packet", "latency", "router", "tcp", "bandwidth", "congestion", "socket", "dns"],
+    "biology": ["cell", "protein", "enzyme", "membrane", "genome", "mitosis", "ribosome", "organism"],
+    "finance": ["market", "bond", "equity", "interest", "inflation", "dividend", "portfolio", "yield"],
+}
+FILLER = ["the", "a", "system", "often", "describes", "with", "about", "which", "many", "important"]
+
+def make_corpus(num_docs: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """Deterministic (topic, text) documents so every run sees the same data."""
+    rng = random.Random(seed)
+    topics = sorted(TOPICS)
+    corpus = []
+    for i in range(num_docs):
+        topic = topics[i % len(topics)]
+        words = rng.choices(TOPICS[topic], k=12) + rng.choices(FILLER, k=8)
+        rng.shuffle(words)
+        corpus.append((topic, f"Document {i} about {topic}: " + " ".join(words) + "."))
+    return corpus
+
+def make_queries(num_queries: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    topics = sorted(TOPICS)
+    return [
+        "What does the " + " ".join(rng.sample(TOPICS[topics[i % len(topics)]], 3)) + " mean?"
+        for i in range(num_queries)
+    ]
+
+def collect_stage_timings(log_dir: Path) -> Dict[str, List[float]]:
+    """Read step durations from the JSON step logs, then clear them for the next level."""
+    durations: Dict[str, List[float]] = defaultdict(list)
+    step_dir = log_dir / "steps"
+    for path in step_dir.glob("*.json"):
+        with open(path) as f:
+            step = json.load(f)
+        durations[step["step_name"]].append(step["duration_ms"])
+        path.unlink()
+    for path in (log_dir / "workflows").glob("*.json"):
+        path.unlink()
+    return durations
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class WorkflowTarget:
+    """Runs the real RAGWorkflow in-process against the local stand-ins."""
+    def __init__(self, log_dir: Path):
+        from ..config import Settings
+        from ..components import (
+            LLMRequestRouter, LLMQueryReformulator, VectorRetriever,
+            LLMCompletionChecker, LLMAnswerGenerator, create_embedding_provider
+        )
+        from ..logging.json_logger import JsonLogger
+        from ..workflow import RAGWorkflow, build_rag_dag
+
+        settings = Settings()
+        self.retriever = VectorRetriever(
+            collection_name=settings.qdrant_collection_name,
+            embedding_provider=create_embedding_provider(settings),
+            url=settings.qdrant_url
+        )
+        engine = build_rag_dag if settings.workflow_engine == "dag" else RAGWorkflow
+        self.workflow = engine(
+            router=LLMRequestRouter(model=settings.router_model),
+            reformulator=LLMQueryReformulator(
+                model=settings.reformulator_model, num_variants=settings.reformulator_num_variants
+            ),
+            retriever=self.retriever,
+            completion_checker=LLMCompletionChecker(model=settings.completion_model),
+            answer_generator=LLMAnswerGenerator(model=settings.answer_model),
+            completion_threshold=settings.completion_threshold,
+            logger=JsonLogger(str(log_dir))
+        )
+
+    def ingest(self, texts: List[Tuple[str, str]]) -> None:
+        from ..models import Document
+        documents = [Document(text=text, metadata={"topic": topic}) for topic, text in texts]
+        for i in range(0, len(documents), 64):
+            self.retriever.add_documents(documents[i:i + 64])
+
+    def query(self, query: str) -> bool:
+        response, workflow_log = self.workflow.execute(query)
+        self.workflow.logger.log_workflow(workflow_log)
+        return response is not None
+
+    def close(self) -> None:
+        pass
+
+class ApiTarget:
+    """Serves the real FastAPI app with uvicorn and drives it over HTTP."""
+    def __init__(self, log_dir: Path):
+        import requests
+        import uvicorn
+        from .. import api
+
+        self._requests = requests
+        self._local = threading.local()
+        config = uvicorn.Config(api.app, host="127.0.0.1", port=0, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.05)
+        port = self._server.servers[0].sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = self._requests.Session()
+        return self._local.session
+
+    def ingest(self, texts: List[Tuple[str, str]]) -> None:
+        documents = [{"text": text, "metadata": {"topic": topic}} for topic, text in texts]
+        response = self._session().post(f"{self.base_url}/documents", json={"documents": documents})
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        while True:
+            job = self._session().get(f"{self.base_url}/documents/jobs/{job_id}").json()
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.1)
+        if job["status"] == "failed":
+            raise RuntimeError(f"Ingestion failed: {job['errors']}")
+
+    def query(self, query: str) -> bool:
+        response = self._session().post(f"{self.base_url}/query", json={"query": query})
+        return response.status_code == 200
+
+    def close(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+def run_level(query_fn: Callable[[str], bool], queries: List[str],
+              concurrency: int) -> Dict[str, Any]:
+    """Run every query once with `concurrency` closed-loop clients."""
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def run_one(query: str) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = query_fn(query)
+        except Exception:
+            ok = False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed_ms)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run_one, queries))
+    duration = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": errors,
+        "duration_s": duration,
+        "throughput_rps": len(queries) / duration if duration else 0.0,
+        "latency_ms": summarize(latencies)
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print relative changes against a previous results file."""
+    base_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"\nComparison against {baseline['meta'].get('revision') or 'baseline'}:")
+    for level in results["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if not base:
+            continue
+        changes = []
+        for name, new, old in [
+            ("throughput", level["throughput_rps"], base["throughput_rps"]),
+            ("p50", level["latency_ms"]["p50"], base["latency_ms"]["p50"]),
+            ("p95", level["latency_ms"]["p95"], base["latency_ms"]["p95"]),
+            ("p99", level["latency_ms"]["p99"], base["latency_ms"]["p99"]),
+        ]:
+            delta = (new - old) / old * 100 if old else 0.0
+            changes.append(f"{name} {delta:+.1f}%")
+        print(f"  c={level['concurrency']:<4} " + ", ".join(changes))
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end RAG benchmark")
+    parser.add_argument("--mode", choices=["workflow", "api"], default="workflow")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--chat-latency-ms", type=float, default=50.0)
+    parser.add_argument("--chat-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=10.0)
+    parser.add_argument("--output", default=None, help="Write JSON results to this file")
+    parser.add_argument("--compare", default=None, help="Previous results file to diff against")
+    args = parser.parse_args(argv)
+
+    fake_config = FakeOpenAIConfig(
+        chat_latency_ms=args.chat_latency_ms,
+        chat_jitter_ms=args.chat_jitter_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        embedding_latency_ms=args.embedding_latency_ms,
+        seed=0
+    )
+    server = FakeOpenAIServer(fake_config).start()
+    log_dir = Path(tempfile.mkdtemp(prefix="rag-bench-logs-"))
+
+    # Point every component at the local stand-ins before anything reads Settings
+    os.environ.update({
+        "OPENAI_API_KEY": "fake",
+        "OPENAI_BASE_URL": server.base_url,
+        "QDRANT_URL": ":memory:",
+        "LOG_DIR": str(log_dir),
+    })
+
+    target = WorkflowTarget(log_dir) if args.mode == "workflow" else ApiTarget(log_dir)
+    try:
+        target.ingest(make_corpus(args.docs))
+        queries = make_queries(args.requests)
+        for query in queries[:args.warmup]:
+            target.query(query)
+        collect_stage_timings(log_dir)
+
+        levels = []
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            level = run_level(target.query, queries, concurrency)
+            level["stages_ms"] = {
+                name: summarize(values)
+                for name, values in sorted(collect_stage_timings(log_dir).items())
+            }
+            levels.append(level)
+            latency = level["latency_ms"]
+            print(
+                f"c={concurrency:<4} {level['throughput_rps']:7.1f} req/s  "
+                f"p50={latency['p50']:7.1f}ms p95={latency['p95']:7.1f}ms "
+                f"p99={latency['p99']:7.1f}ms errors={level['errors']}"
+            )
+            for name, stage in level["stages_ms"].items():
+                print(f"       {name:<20} p50={stage['p50']:7.1f}ms p95={stage['p95']:7.1f}ms")
+    finally:
+        target.close()
+        server.stop()
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "mode": args.mode,
+            "timestamp": datetime.now().isoformat(),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "config": vars(args),
+        },
+        "levels": levels
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import requests
+from .stats import summarize
+
+@dataclass
+class RecordedQuery:
+    query: str
+    timestamp: Optional[datetime] = None
+
+def load_workflow_logs(log_dir: str) -> List[RecordedQuery]:
+    """Queries recorded by JsonLogger, in the order they arrived."""
+    from ..logging.json_logger import JsonLogger
+    workflows = JsonLogger(log_dir).get_workflow_logs()
+    workflows.sort(key=lambda wf: wf.start_time)
+    return [RecordedQuery(query=wf.query, timestamp=wf.start_time) for wf in workflows if wf.query]
+
+def load_query_file(path: str) -> List[RecordedQuery]:
+    """JSONL with a `query` field and an optional ISO `timestamp` per line."""
+    queries = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            timestamp = record.get("timestamp")
+            queries.append(RecordedQuery(
+                query=record["query"],
+                timestamp=datetime.fromisoformat(timestamp) if timestamp else None
+            ))
+    return queries
+
+def replay_schedule(queries: List[RecordedQuery], speedup: float = 1.0
+                    ) -> Iterator[Tuple[float, str]]:
+    """(offset_s, query) following the recorded inter-arrival times, compressed by `speedup`."""
+    timed = [q for q in queries if q.timestamp is not None]
+    if not timed:
+        raise ValueError("Replay mode needs timestamps; use --mode qps for untimed queries")
+    origin = timed[0].timestamp
+    for q in timed:
+        yield (q.timestamp - origin).total_seconds() / speedup, q.query
+
+def rate_schedule(queries: List[RecordedQuery], qps: float, count: int,
+                  arrival: str = "poisson", seed: int = 0) -> Iterator[Tuple[float, str]]:
+    """(offset_s, query) at a target rate, cycling through the query mix."""
+    rng = random.Random(seed)
+    offset = 0.0
+    for i in range(count):
+        yield offset, queries[i % len(queries)].query
+        offset += rng.expovariate(qps) if arrival == "poisson" else 1.0 / qps
+
+class OpenLoopLoadGenerator:
+    """Sends requests at their scheduled times regardless of outstanding responses.
+
+    Latency is measured from the *intended* send time, not from when a worker
+    got around to sending, so a stalled server shows up in the tail instead of
+    silently slowing the load down (coordinated omission). Service time, measured
+    from the actual send, is reported separately. Both cover successful (2xx)
+    responses only: requests shed with 429 or rejected with another 4xx are
+    counted apart, so fast rejections don't flatter the distribution.
+    """
+    def __init__(self, url: str, timeout_s: float = 60.0, max_inflight: int = 256):
+        self.url = url
+        self.timeout_s = timeout_s
+        self.max_inflight = max_inflight
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def run(self, schedule: Iterator[Tuple[float, str]]) -> Dict[str, Any]:
+        latencies: List[float] = []
+        service_times: List[float] = []
+        send_lag: List[float] = []
+        statuses: Counter = Counter()
+        lock = threading.Lock()
+
+        def send(intended: float, query: str) -> None:
+            sent = time.perf_counter()
+            try:
+                response = self._session().post(
+                    self.url, json={"query": query}, timeout=self.timeout_s
+                )
+                status = str(response.status_code)
+            except requests.RequestException as e:
+                status = e.__class__.__name__
+            done = time.perf_counter()
+            with lock:
+                if status.startswith("2"):
+                    latencies.append((done - intended) * 1000)
+                    service_times.append((done - sent) * 1000)
+                send_lag.append((sent - intended) * 1000)
+                statuses[status] += 1
+
+        start = time.perf_counter()
+        scheduled = 0
+        last_offset = 0.0
+        with ThreadPoolExecutor(max_workers=self.max_inflight) as executor:
+            for offset, query in schedule:
+                intended = start + offset
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(send, intended, query)
+                scheduled += 1
+                last_offset = offset
+        duration = time.perf_counter() - start
+
+        errors = sum(
+            count for status, count in statuses.items()
+            if not status.isdigit() or int(status) >= 500
+        )
+        rejected = statuses["429"]
+        client_errors = sum(
+            count for status, count in statuses.items()
+            if status.isdigit() and 400 <= int(status) < 500 and status != "429"
+        )
+        return {
+            "requests": scheduled,
+            "duration_s": duration,
+            # Offered rate over the send window; the drain of slow responses is excluded
+            "achieved_qps": (scheduled - 1) / last_offset if last_offset else 0.0,
+            "successes": len(latencies),
+            "errors": errors,
+            "error_rate": errors / scheduled if scheduled else 0.0,
+            "rejected": rejected,
+            "rejection_rate": rejected / scheduled if scheduled else 0.0,
+            "client_errors": client_errors,
+            "status_counts": dict(statuses),
+            "latency_ms": summarize(latencies),
+            "service_time_ms": summarize(service_times),
+            "send_lag_ms": summarize(send_lag),
+            "latency_histogram_ms": histogram(latencies)
+        }
+
+def histogram(values: List[float]) -> Dict[str, int]:
+    """Counts per power-of-two millisecond bucket, e.g. "128-256"."""
+    buckets: Counter = Counter()
+    for value in values:
+        upper = 1
+        while upper < value:
+            upper *= 2
+        buckets[upper] += 1
+    return {f"{upper // 2}-{upper}": buckets[upper] for upper in sorted(buckets)}
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded query traffic against /query")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--logs", help="Log directory written by JsonLogger")
+    source.add_argument("--queries", help="JSONL file with a `query` (and optional `timestamp`) per line")
+    parser.add_argument("--url", default="http://localhost:8000/query")
+    parser.add_argument("--mode", choices=["replay", "qps"], default="replay",
+                        help="replay: recorded arrival times; qps: fixed target rate")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="Time compression factor for replay mode")
+    parser.add_argument("--qps", type=float, default=10.0, help="Target rate for qps mode")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--count", type=int, default=None,
+                        help="Requests to send in qps mode (defaults to the number of queries)")
+    parser.add_argument("--max-inflight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", default=None, help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    queries = load_workflow_logs(args.logs) if args.logs else load_query_file(args.queries)
+    if not queries:
+        parser.error("No queries found")
+
+    if args.mode == "replay":
+        schedule = replay_schedule(queries, args.speedup)
+    else:
+        schedule = rate_schedule(queries, args.qps, args.count or len(queries), args.arrival)
+
+    generator = OpenLoopLoadGenerator(args.url, timeout_s=args.timeout, max_inflight=args.max_inflight)
+    results = generator.run(schedule)
+    results["config"] = vars(args)
+
+    latency = results["latency_ms"]
+    print(
+        f"{results['requests']} requests in {results['duration_s']:.1f}s "
+        f"({results['achieved_qps']:.1f} qps), error rate {results['error_rate']:.2%}, "
+        f"rejected {results['rejection_rate']:.2%}, other 4xx {results['client_errors']}"
+    )
+    print(
+        f"{results['successes']} successful: latency p50={latency['p50']:.1f}ms p95={latency['p95']:.1f}ms "
+        f"p99={latency['p99']:.1f}ms max={latency['max']:.1f}ms"
+    )
+    print(f"status codes: {results['status_counts']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+import numpy as np
+from ..components import BaseRetriever, VectorRetriever
+from ..models import SearchResult, RetrievalProfile
+from .fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+from .harness import make_corpus, make_queries
+from .stats import summarize
+
+def extract_keywords(query: str) -> List[str]:
+    return [w for w in re.findall(r"\w+", query.lower()) if len(w) > 3]
+
+class ExactRetriever(BaseRetriever):
+    """Brute-force cosine search over an in-memory matrix; the ground truth backend."""
+    def __init__(self, texts: List[str], embeddings: np.ndarray,
+                 query_embeddings: Dict[str, np.ndarray], top_k: int = 5):
+        super().__init__()
+        self.texts = texts
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.matrix = (embeddings / np.where(norms == 0, 1, norms)).astype(np.float32)
+        self.query_embeddings = query_embeddings
+        self.top_k = top_k
+
+    def retrieve(self, query: str, keywords: List[str],
+                 profile: Optional[RetrievalProfile] = None,
+                 variants: Optional[List[str]] = None) -> List[SearchResult]:
+        vector = self.query_embeddings[query].astype(np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        scores = self.matrix @ vector
+        k = min(self.top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [SearchResult(text=self.texts[i], metadata={}, score=float(scores[i])) for i in top]
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.matrix.nbytes
+
+class BenchmarkVectorRetriever(VectorRetriever):
+    """VectorRetriever with precomputed query embeddings.
+
+    Query embeddings are looked up instead of requested so latency measures
+    search alone, not the embedding round trip.
+    """
+    def __init__(self, collection_name: str, url: str,
+                 query_embeddings: Dict[str, np.ndarray]):
+        super().__init__(collection_name=collection_name, url=url)
+        self.query_embeddings = query_embeddings
+
+    def _get_embedding(self, text: str) -> np.ndarray:
+        if text in self.query_embeddings:
+            return self.query_embeddings[text]
+        return super()._get_embedding(text)
+
+class ProfiledRetriever(BaseRetriever):
+    """Runs a retriever with a fixed RetrievalProfile for one point of the sweep."""
+    def __init__(self, retriever: BaseRetriever, profile: RetrievalProfile):
+        super().__init__()
+        self.retriever = retriever
+        self.profile = profile
+
+    def retrieve(self, query: str, keywords: List[str],
+                 profile: Optional[RetrievalProfile] = None,
+                 variants: Optional[List[str]] = None) -> List[SearchResult]:
+        return self.retriever.retrieve(query, keywords, profile or self.profile, variants)
+
+@dataclass
+class SweepResult:
+    name: str
+    params: Dict[str, Any]
+    recall: float
+    latency_ms: Dict[str, float]
+    memory_bytes: int
+
+def recall_at_k(results: List[SearchResult], truth: List[SearchResult], k: int) -> float:
+    expected = {r.text for r in truth[:k]}
+    if not expected:
+        return 1.0
+    return len(expected & {r.text for r in results[:k]}) / len(expected)
+
+def evaluate(name: str, params: Dict[str, Any], retriever: BaseRetriever,
+             queries: List[str], truth: Dict[str, List[SearchResult]],
+             k: int, memory_bytes: int) -> SweepResult:
+    """Run every query through `retriever.retrieve` and score it against the ground truth."""
+    latencies = []
+    recalls = []
+    for query in queries:
+        start = time.perf_counter()
+        results = retriever.retrieve(query, extract_keywords(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(recall_at_k(results, truth[query], k))
+    return SweepResult(
+        name=name,
+        params=params,
+        recall=sum(recalls) / len(recalls),
+        latency_ms=summarize(latencies),
+        memory_bytes=memory_bytes
+    )
+
+def load_texts(path: str, text_field: str) -> List[str]:
+    with open(path) as f:
+        return [json.loads(line)[text_field] for line in f if line.strip()]
+
+def embed_all(embedder: VectorRetriever, texts: List[str], batch_size: int = 256) -> np.ndarray:
+    batches = [
+        embedder._get_embeddings(texts[i:i + batch_size])[0]
+        for i in range(0, len(texts), batch_size)
+    ]
+    return np.vstack(batches).astype(np.float32)
+
+def build_collection(client, name: str, texts: List[str], embeddings: np.ndarray,
+                     quantization: str) -> None:
+    """(Re)create a collection with the given quantization and load the corpus."""
+    from qdrant_client.http import models as rest
+
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    quantization_config = None
+    if quantization == "int8":
+        quantization_config = rest.ScalarQuantization(
+            scalar=rest.ScalarQuantizationConfig(type=rest.ScalarType.INT8, always_ram=True)
+        )
+    client.create_collection(
+        collection_name=name,
+        vectors_config=rest.VectorParams(size=embeddings.shape[1], distance=rest.Distance.COSINE),
+        quantization_config=quantization_config
+    )
+    for start in range(0, len(texts), 256):
+        client.upsert(collection_name=name, points=[
+            rest.PointStruct(id=i, vector=embeddings[i].tolist(), payload={"text": texts[i]})
+            for i in range(start, min(start + 256, len(texts)))
+        ])
+
+def vector_memory_bytes(count: int, dim: int, quantization: str) -> int:
+    """Estimated RAM for vectors: float32 originals plus the int8 copy when quantized."""
+    return count * dim * 4 + (count * dim if quantization == "int8" else 0)
+
+def choose_cheapest(results: List[SweepResult], recall_slo: float) -> Optional[SweepResult]:
+    """Lowest p95 latency (then memory) among configurations that meet the recall SLO."""
+    eligible = [r for r in results if r.recall >= recall_slo and r.name != "exact"]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (r.latency_ms["p95"], r.memory_bytes))
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Retrieval recall@k versus latency sweep")
+    parser.add_argument("--corpus", default=None, help="JSONL corpus (defaults to a synthetic one)")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--queries", default=None, help="JSONL file with a `query` field per line")
+    parser.add_argument("--docs", type=int, default=2000, help="Synthetic corpus size")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--top-k", default="5,10,20",
+                        help="Result limits to sweep; each is scored by recall at that depth")
+    parser.add_argument("--ef", default="16,64,128", help="HNSW ef values to sweep")
+    parser.add_argument("--quantization", default="none,int8")
+    parser.add_argument("--hybrid", action="store_true", help="Also sweep the hybrid (keyword) leg")
+    parser.add_argument("--qdrant-url", required=True,
+                        help="URL of a Qdrant server; in-memory Qdrant always searches exactly")
+    parser.add_argument("--live", action="store_true",
+                        help="Use the configured OpenAI embeddings instead of the fake server")
+    parser.add_argument("--recall-slo", type=float, default=0.95)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    if args.qdrant_url == ":memory:":
+        parser.error("in-memory Qdrant ignores hnsw_ef and quantization; pass a Qdrant server URL")
+
+    server = None
+    if not args.live:
+        server = FakeOpenAIServer(FakeOpenAIConfig(embedding_latency_ms=0)).start()
+        os.environ.update({"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": server.base_url})
+
+    try:
+        texts = load_texts(args.corpus, args.text_field) if args.corpus else [
+            text for _, text in make_corpus(args.docs)
+        ]
+        if args.queries:
+            queries = load_texts(args.queries, "query")
+        else:
+            queries = make_queries(args.num_queries)
+
+        embedder = VectorRetriever(collection_name="retrieval_bench_embedder", url=":memory:")
+        corpus_embeddings = embed_all(embedder, texts)
+        query_embeddings = dict(zip(queries, embed_all(embedder, queries)))
+        depth = max(_ints(args.top_k))
+
+        exact = ExactRetriever(texts, corpus_embeddings, query_embeddings, top_k=depth)
+        truth = {q: exact.retrieve(q, []) for q in queries}
+        results = [evaluate("exact", {"backend": "numpy"}, exact, queries, truth, depth, exact.memory_bytes)]
+
+        modes = [False, True] if args.hybrid else [False]
+        for quantization in args.quantization.split(","):
+            collection = f"retrieval_bench_{quantization}"
+            retriever = BenchmarkVectorRetriever(collection, args.qdrant_url, query_embeddings)
+            build_collection(retriever.client, collection, texts, corpus_embeddings, quantization)
+            memory = vector_memory_bytes(len(texts), corpus_embeddings.shape[1], quantization)
+
+            for top_k in _ints(args.top_k):
+                for ef in _ints(args.ef) + [None]:
+                    for hybrid in modes:
+                        profile = RetrievalProfile(
+                            semantic_top_k=top_k,
+                            keyword_top_k=top_k if hybrid else 0,
+                            hnsw_ef=ef,
+                            exact=ef is None,
+                            rescore=True if quantization == "int8" else None,
+                            payload_fields=[]
+                        )
+                        params = {"quantization": quantization, **asdict(profile)}
+                        name = (
+                            f"qdrant q={quantization} top_k={top_k} ef={ef or 'exact'}"
+                            + (" hybrid" if hybrid else "")
+                        )
+                        # The workflow passes all top_k results on, so recall is measured at that depth
+                        results.append(evaluate(
+                            name, params, ProfiledRetriever(retriever, profile),
+                            queries, truth, top_k, memory
+                        ))
+    finally:
+        if server:
+            server.stop()
+
+    print(f"{'configuration':<45} {'recall':>9} {'p50 ms':>8} {'p95 ms':>8} {'memory MB':>10}")
+    for r in sorted(results, key=lambda r: r.latency_ms["p95"]):
+        print(
+            f"{r.name:<45} {r.recall:9.3f} {r.latency_ms['p50']:8.2f} "
+            f"{r.latency_ms['p95']:8.2f} {r.memory_bytes / 1e6:10.1f}"
+        )
+    best = choose_cheapest(results, args.recall_slo)
+    print(f"\nCheapest configuration with recall@top_k >= {args.recall_slo}: "
+          f"{best.name if best else 'none'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                "config": vars(args),
+                "results": [asdict(r) for r in results],
+                "recommended": asdict(best) if best else None
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,76 @@
-from .base_component import BaseComponent
-from .router import BaseRequestRouter, LLMRequestRouter
+from .base_component import BaseComponent, record_metadata
+from .router import BaseRequestRouter, LLMRequestRouter, EmbeddingRequestRouter
 from .reformulator import BaseQueryReformulator, LLMQueryReformulator
 from .retriever import BaseRetriever, VectorRetriever
-from .completion_checker import BaseCompletionChecker, LLMCompletionChecker
+from .bm25 import BM25Index, BM25Retriever
+from .embeddings import (
+    BaseEmbeddingProvider,
+    OpenAIEmbeddingProvider,
+    HashingEmbeddingProvider,
+    StaticEmbeddingProvider,
+    create_embedding_provider
+)
+from .completion_checker import BaseCompletionChecker, LLMCompletionChecker, AdaptiveCompletionChecker
 from .answer_generator import BaseAnswerGenerator, LLMAnswerGenerator
+from .call_policy import CallPolicy, RetryPolicy, HedgePolicy, Deadline, DeadlineExceeded, policy_for_step
+from .llm_cache import BaseLLMCache, InMemoryLLMCache, SQLiteLLMCache, create_llm_cache
+from .sessions import (
+    SessionStore,
+    SessionTurn,
+    SessionMatch,
+    SessionLookup,
+    SessionContext,
+    create_session_lookup
+)
+from .shared_cache import (
+    SharedMemoryCache,
+    SharedMemoryLLMCache,
+    SharedEmbeddingCache,
+    SharedResultCache,
+    create_shared_caches
+)
 
 __all__ = [
     'BaseComponent',
+    'record_metadata',
     'BaseRequestRouter',
     'LLMRequestRouter',
+    'EmbeddingRequestRouter',
     'BaseQueryReformulator',
     'LLMQueryReformulator',
     'BaseRetriever',
     'VectorRetriever',
+    'BM25Index',
+    'BM25Retriever',
+    'BaseEmbeddingProvider',
+    'OpenAIEmbeddingProvider',
+    'HashingEmbeddingProvider',
+    'StaticEmbeddingProvider',
+    'create_embedding_provider',
     'BaseCompletionChecker',
     'LLMCompletionChecker',
+    'AdaptiveCompletionChecker',
     'BaseAnswerGenerator',
-    'LLMAnswerGenerator'
+    'LLMAnswerGenerator',
+    'BaseLLMCache',
+    'InMemoryLLMCache',
+    'SQLiteLLMCache',
+    'create_llm_cache',
+    'SharedMemoryCache',
+    'SharedMemoryLLMCache',
+    'SharedEmbeddingCache',
+    'SharedResultCache',
+    'create_shared_caches',
+    'SessionStore',
+    'SessionTurn',
+    'SessionMatch',
+    'SessionLookup',
+    'SessionContext',
+    'create_session_lookup',
+    'CallPolicy',
+    'RetryPolicy',
+    'HedgePolicy',
+    'Deadline',
+    'DeadlineExceeded',
+    'policy_for_step'
 ] 
\ No newline at end of file
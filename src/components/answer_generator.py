@@ -1,9 +1,10 @@
 from abc import abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from openai import OpenAI
 from .base_component import BaseComponent
 from ..config import Settings
 from ..models import RAGResponse, Citation, SearchResult
+from .call_policy import CallPolicy, call_with_policy, sdk_max_retries, sdk_timeout
 import json
 
 class BaseAnswerGenerator(BaseComponent):
@@ -20,21 +21,7 @@ class BaseAnswerGenerator(BaseComponent):
         """Generate an answer using the retrieved context."""
         pass
 
-class LLMAnswerGenerator(BaseAnswerGenerator):
-    def __init__(self, model: str = "gpt-4-turbo-preview"):
-        super().__init__()
-        settings = Settings()
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        self.model = model
-    
-    def generate_answer(self, query: str, context: List[SearchResult]) -> RAGResponse:
-        # Format context for the prompt
-        formatted_context = "\n\n".join([
-            f"Context {i+1}:\n{result.text}"
-            for i, result in enumerate(context)
-        ])
-        
-        prompt = """Using the provided context, answer the question. Your response must be in JSON format with these fields:
+ANSWER_PROMPT = """Using the provided context, answer the question. Your response must be in JSON format with these fields:
         1. "answer": Your detailed response
         2. "citations": A list of objects, each with:
            - "text": The relevant quote from the context
@@ -49,16 +36,32 @@ class LLMAnswerGenerator(BaseAnswerGenerator):
         Question: {query}
         
         Respond with only the JSON object, no other text."""
+
+class LLMAnswerGenerator(BaseAnswerGenerator):
+    def __init__(self, model: str = "gpt-4-turbo-preview", policy: Optional[CallPolicy] = None):
+        super().__init__()
+        settings = Settings()
+        self.client = OpenAI(api_key=settings.openai_api_key, max_retries=sdk_max_retries(policy))
+        self.model = model
+        self.policy = policy
+    
+    def generate_answer(self, query: str, context: List[SearchResult]) -> RAGResponse:
+        # Format context for the prompt
+        formatted_context = "\n\n".join([
+            f"Context {i+1}:\n{result.text}"
+            for i, result in enumerate(context)
+        ])
         
-        response = self.client.chat.completions.create(
+        response = call_with_policy(self.policy, lambda timeout: self.client.chat.completions.create(
             model=self.model,
             messages=[{
                 "role": "user", 
-                "content": prompt.format(context=formatted_context, query=query)
+                "content": ANSWER_PROMPT.format(context=formatted_context, query=query)
             }],
             temperature=0,
-            max_tokens=1000
-        )
+            max_tokens=1000,
+            timeout=sdk_timeout(timeout)
+        ))
         
         result = response.choices[0].message.content
         parsed = json.loads(result)
@@ -1,8 +1,23 @@
 from abc import ABC, abstractmethod
+from contextvars import ContextVar
 from typing import Any, Dict, Tuple, Optional
 from datetime import datetime
 import uuid
 from ..logging.base import StepLog
+from .call_policy import current_deadline, deadline_scope
+
+# Metadata of the step executing in this context. Components are shared by
+# concurrent requests, so per-call values must not live on the instance.
+_step_metadata: ContextVar[Optional[Dict[str, Any]]] = ContextVar("step_metadata", default=None)
+
+def record_metadata(**values: Any) -> None:
+    """Add values to the step log metadata of the component call running in this context.
+
+    Outside `BaseComponent.execute` (e.g. a method called directly) the values are dropped.
+    """
+    metadata = _step_metadata.get()
+    if metadata is not None:
+        metadata.update(values)
 
 class BaseComponent(ABC):
     """Base class for all RAG workflow components"""
@@ -16,12 +31,24 @@ class BaseComponent(ABC):
         pass
     
     def execute(self, *args, **kwargs) -> Tuple[Any, StepLog]:
-        """Execute with logging. Don't override this."""
+        """Execute with logging. Don't override this.
+        
+        An optional `deadline` keyword (call_policy.Deadline) bounds every
+        external call the step makes; it is not passed on to `_execute`.
+        The step log's metadata is `self.metadata` (static, shared by every
+        call) plus whatever the call added with `record_metadata`.
+        """
         start_time = datetime.now()
         step_id = str(uuid.uuid4())
+        deadline = kwargs.pop("deadline", None) or current_deadline()
+        call_metadata: Dict[str, Any] = {}
+        token = _step_metadata.set(call_metadata)
         
         try:
-            result = self._execute(*args, **kwargs)
+            if deadline:
+                deadline.check(f"step {self.name}")
+            with deadline_scope(deadline):
+                result = self._execute(*args, **kwargs)
             duration = (datetime.now() - start_time).total_seconds() * 1000
             
             log = StepLog(
@@ -29,7 +56,7 @@ class BaseComponent(ABC):
                 step_name=self.name,
                 input={"args": args, "kwargs": kwargs},
                 output={"result": result},
-                metadata=self.metadata,
+                metadata={**self.metadata, **call_metadata},
                 timestamp=start_time,
                 duration_ms=duration,
                 success=True
@@ -43,10 +70,12 @@ class BaseComponent(ABC):
                 step_name=self.name,
                 input={"args": args, "kwargs": kwargs},
                 output={},
-                metadata={"error_type": e.__class__.__name__},
+                metadata={**call_metadata, "error_type": e.__class__.__name__},
                 timestamp=start_time,
                 duration_ms=duration,
                 success=False,
                 error=str(e)
             )
-            raise e
\ No newline at end of file
+            raise e
+        finally:
+            _step_metadata.reset(token)
\ No newline at end of file
@@ -0,0 +1,520 @@
+import argparse
+import array
+import fcntl
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from ..models import SearchResult, RetrievalProfile
+from .retriever import BaseRetriever
+
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+def _grow(values: np.ndarray, size: int) -> np.ndarray:
+    """`values`, reallocated with doubled capacity if it holds fewer than `size` entries."""
+    if size <= len(values):
+        return values
+    grown = np.zeros(max(size, 2 * len(values)), dtype=values.dtype)
+    grown[:len(values)] = values
+    return grown
+
+def _current_snapshot(directory: Path) -> Optional[Path]:
+    """The snapshot directory the CURRENT pointer names, or None if nothing was saved."""
+    pointer = directory / "CURRENT"
+    if pointer.exists():
+        return directory / pointer.read_text().strip()
+    if (directory / "meta.json").exists():
+        return directory  # Saved before snapshots were versioned
+    return None
+
+class BM25Index:
+    """Okapi BM25 inverted index with array-packed postings.
+
+    The main segment stores every term's postings contiguously in two flat
+    arrays (document numbers and term frequencies) addressed by an offsets
+    array, so a term lookup is a slice and scoring is vectorized. New
+    documents go to a small in-memory delta that is folded into the packed
+    arrays once it holds `merge_threshold` documents. Re-adding a key
+    tombstones its previous version; tombstones are dropped on merge.
+
+    `save` writes the arrays as .npy files and `load` memory-maps them, so a
+    large index opens instantly and pages in only the postings queries touch.
+    Each save is a new `snapshot-<n>` directory that becomes visible when the
+    CURRENT file is atomically replaced to name it.
+
+    Several processes can share one index through `open`. The first becomes
+    the writer and holds `writer.lock`. The others are readers: they append
+    their additions to `spool.jsonl` for the writer to index, and reload when
+    the writer publishes a new snapshot. Both happen in `sync`.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75, merge_threshold: int = 10000,
+                 path: Optional[str] = None):
+        self.k1 = k1
+        self.b = b
+        self.merge_threshold = merge_threshold
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # Only the writer indexes and saves; readers spool additions (see open)
+        self.writer = True
+        self._writer_lock = None
+        self._snapshot: Optional[Path] = None
+        self._version = 0
+        self._saved_version = 0
+        # Term dictionary; ids of terms first seen in the delta are past the packed offsets
+        self.terms: Dict[str, int] = {}
+        # Packed main segment
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._freqs = np.zeros(0, dtype=np.uint16)
+        # Per document number (main segment and delta); the arrays have spare capacity
+        self._keys: List[str] = []
+        self._lengths: List[int] = []
+        self._length_array = np.zeros(0, dtype=np.float32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._key_to_doc: Dict[str, int] = {}
+        self._total_length = 0
+        # In-memory delta: term id -> (doc numbers, frequencies), readable by numpy without conversion
+        self._delta: Dict[int, Tuple[array.array, array.array]] = {}
+        self._delta_docs = 0
+
+    def __len__(self) -> int:
+        return len(self._key_to_doc)
+
+    def add(self, key: str, text: str) -> None:
+        self.add_many([(key, text)])
+
+    def add_many(self, documents: List[Tuple[str, str]]) -> None:
+        """Index (key, text) pairs, replacing earlier versions of the same keys."""
+        # Last version wins when a key repeats within the batch
+        documents = list(dict(documents).items())
+        if not documents:
+            return
+        if not self.writer:
+            self._spool([{"key": key, "text": text} for key, text in documents])
+            return
+        with self._lock:
+            start = len(self._keys)
+            for key, text in documents:
+                self._remove(key)
+                counts = Counter(tokenize(text))
+                doc = len(self._keys)
+                self._keys.append(key)
+                self._lengths.append(sum(counts.values()))
+                self._total_length += self._lengths[-1]
+                self._key_to_doc[key] = doc
+                for term, freq in counts.items():
+                    term_id = self.terms.setdefault(term, len(self.terms))
+                    docs, freqs = self._delta.get(term_id) or self._delta.setdefault(
+                        term_id, (array.array("i"), array.array("H"))
+                    )
+                    docs.append(doc)
+                    freqs.append(min(freq, 65535))
+                self._delta_docs += 1
+            size = len(self._keys)
+            self._length_array = _grow(self._length_array, size)
+            self._length_array[start:size] = self._lengths[start:]
+            self._deleted = _grow(self._deleted, size)
+            self._deleted[start:size] = False
+            self._version += 1
+            merge = self._delta_docs >= self.merge_threshold
+            if merge and not self.path:
+                self._merge()
+        if merge and self.path:
+            self.save()
+
+    def remove(self, key: str) -> None:
+        if not self.writer:
+            self._spool([{"key": key}])
+            return
+        with self._lock:
+            self._remove(key)
+            self._version += 1
+
+    def _remove(self, key: str) -> None:
+        doc = self._key_to_doc.pop(key, None)
+        if doc is not None:
+            self._deleted[doc] = True
+            self._total_length -= self._lengths[doc]
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (key, BM25 score) for the query's terms, best first.
+
+        The lock is only held to take the postings: merges replace the packed
+        arrays instead of modifying them, and the delta's postings are copied,
+        so scoring runs concurrently with other searches and additions.
+        """
+        tokens = set(tokenize(query))
+        if not tokens or top_k <= 0:
+            return []
+        with self._lock:
+            term_ids = [self.terms[t] for t in tokens if t in self.terms]
+            live = len(self._key_to_doc)
+            if not term_ids or not live:
+                return []
+            avg_length = self._total_length / live
+            postings = [self._term_postings(term_id) for term_id in term_ids]
+            lengths = self._length_array
+            size = len(self._keys)
+            deleted = self._deleted[:size]
+            keys = self._keys
+
+        docs_parts, score_parts = [], []
+        for parts in postings:
+            if not parts:
+                continue
+            docs = np.concatenate([d for d, _ in parts]) if len(parts) > 1 else parts[0][0]
+            freqs = np.concatenate([f for _, f in parts]).astype(np.float32)
+            idf = np.log(1 + (live - docs.size + 0.5) / (docs.size + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[docs] / avg_length)
+            docs_parts.append(docs)
+            score_parts.append(idf * freqs * (self.k1 + 1) / (freqs + norm))
+        if not docs_parts:
+            return []
+
+        docs = np.concatenate(docs_parts)
+        weights = np.concatenate(score_parts)
+        # BM25 contributions are positive, so a zero score means no match
+        if docs.size * 16 > size:
+            # Dense accumulation is cheaper than sorting once postings cover much of the corpus
+            scores = np.bincount(docs, weights=weights, minlength=size)
+            scores[deleted] = 0
+            doc_numbers = None
+        else:
+            doc_numbers, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+            scores[deleted[doc_numbers]] = 0
+        k = min(top_k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if doc_numbers is not None:
+            return [(keys[doc_numbers[i]], float(scores[i])) for i in top]
+        return [(keys[i], float(scores[i])) for i in top]
+
+    def _term_postings(self, term_id: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(document numbers, frequencies) parts of a term in the main segment and delta.
+
+        Main segment parts are views of arrays that are never modified; delta
+        parts are copies, since the delta keeps growing. Call with the lock held.
+        """
+        parts = []
+        if term_id < len(self._offsets) - 1:
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            if end > start:
+                parts.append((self._postings[start:end], self._freqs[start:end]))
+        if term_id in self._delta:
+            delta_docs, delta_freqs = self._delta[term_id]
+            parts.append((
+                np.array(delta_docs, dtype=np.int32),
+                np.array(delta_freqs, dtype=np.uint16)
+            ))
+        return parts
+
+    def merge(self) -> None:
+        """Fold the delta into the packed arrays and drop deleted documents."""
+        with self._lock:
+            self._merge()
+
+    def _merge(self) -> None:
+        live = ~self._deleted[:len(self._keys)]
+        # Old document number -> new one, or -1 if deleted
+        renumber = np.full(len(self._keys), -1, dtype=np.int64)
+        renumber[live] = np.arange(int(live.sum()))
+
+        # Flatten main segment and delta to (term, doc, freq) triples, main first
+        packed_terms = np.repeat(np.arange(len(self._offsets) - 1), np.diff(self._offsets))
+        delta_terms = [np.full(len(docs), term_id) for term_id, (docs, _) in self._delta.items()]
+        delta_docs = [np.frombuffer(docs, dtype=np.int32) for docs, _ in self._delta.values()]
+        delta_freqs = [np.frombuffer(freqs, dtype=np.uint16) for _, freqs in self._delta.values()]
+        terms = np.concatenate([packed_terms, *delta_terms]).astype(np.int64)
+        docs = renumber[np.concatenate([self._postings, *delta_docs]).astype(np.int64)]
+        freqs = np.concatenate([self._freqs, *delta_freqs]).astype(np.uint16)
+
+        keep = docs >= 0
+        terms, docs, freqs = terms[keep], docs[keep], freqs[keep]
+        # A stable sort keeps each term's postings in document order
+        order = np.argsort(terms, kind="stable")
+        counts = np.bincount(terms, minlength=len(self.terms))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self._postings = docs[order].astype(np.int32)
+        self._freqs = freqs[order]
+        self._keys = [key for key, alive in zip(self._keys, live) if alive]
+        self._lengths = [length for length, alive in zip(self._lengths, live) if alive]
+        self._length_array = np.asarray(self._lengths, dtype=np.float32)
+        self._deleted = np.zeros(len(self._keys), dtype=bool)
+        self._key_to_doc = {key: doc for doc, key in enumerate(self._keys)}
+        self._delta = {}
+        self._delta_docs = 0
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Merge and publish a snapshot of the index at `path` (or the index's own path).
+
+        Only the merge holds the index lock. The merged arrays are not modified
+        afterwards, so they are written while searches and additions go on.
+        """
+        target = Path(path) if path else self.path
+        if target is None:
+            raise ValueError("No path to save the index to")
+        if not self.writer:
+            raise ValueError(f"{target} is written by another process")
+        with self._save_lock:
+            with self._lock:
+                self._merge()
+                size = len(self._keys)
+                snapshot = (self._offsets, self._postings, self._freqs,
+                            self._length_array[:size].astype(np.int32), list(self.terms), list(self._keys))
+                version = self._version
+            self._save(target, *snapshot)
+            self._saved_version = version
+
+    def _save(self, target: Path, offsets: np.ndarray, postings: np.ndarray, freqs: np.ndarray,
+              lengths: np.ndarray, terms: List[str], keys: List[str]) -> None:
+        target.mkdir(parents=True, exist_ok=True)
+        for leftover in target.glob("snapshot-*.tmp"):
+            shutil.rmtree(leftover, ignore_errors=True)  # From a save that did not finish
+        name = f"snapshot-{time.time_ns()}"
+        tmp = target / f"{name}.tmp"
+        tmp.mkdir()
+        np.save(tmp / "offsets.npy", offsets)
+        np.save(tmp / "postings.npy", postings)
+        np.save(tmp / "freqs.npy", freqs)
+        np.save(tmp / "lengths.npy", lengths)
+        # Term ids are assigned in insertion order, so the list is ordered by id
+        with open(tmp / "terms.json", 'w') as f:
+            json.dump(terms, f)
+        with open(tmp / "keys.json", 'w') as f:
+            json.dump(keys, f)
+        with open(tmp / "meta.json", 'w') as f:
+            json.dump({"k1": self.k1, "b": self.b, "saved_at": time.time()}, f)
+        tmp.rename(target / name)
+        pointer = target / "CURRENT.tmp"
+        pointer.write_text(name)
+        os.replace(pointer, target / "CURRENT")
+        # Keep the previous snapshot for readers still loading it; open mmaps survive deletion
+        for old in sorted(target.glob("snapshot-*[0-9]"))[:-2]:
+            shutil.rmtree(old, ignore_errors=True)
+        if target == self.path:
+            self._snapshot = target / name
+
+    def _read(self, snapshot: Path, mmap: bool = True) -> None:
+        """Replace the index's contents with a saved snapshot."""
+        with open(snapshot / "meta.json") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        offsets = np.load(snapshot / "offsets.npy", mmap_mode=mode)
+        postings = np.load(snapshot / "postings.npy", mmap_mode=mode)
+        freqs = np.load(snapshot / "freqs.npy", mmap_mode=mode)
+        lengths = np.load(snapshot / "lengths.npy")
+        with open(snapshot / "terms.json") as f:
+            terms = {term: i for i, term in enumerate(json.load(f))}
+        with open(snapshot / "keys.json") as f:
+            keys = json.load(f)
+        with self._lock:
+            self.k1, self.b = meta["k1"], meta["b"]
+            self.terms = terms
+            self._offsets, self._postings, self._freqs = offsets, postings, freqs
+            self._keys = keys
+            self._lengths = lengths.tolist()
+            self._length_array = lengths.astype(np.float32)
+            self._deleted = np.zeros(len(keys), dtype=bool)
+            self._key_to_doc = {key: doc for doc, key in enumerate(keys)}
+            self._total_length = int(lengths.sum())
+            self._delta = {}
+            self._delta_docs = 0
+            self._snapshot = snapshot
+            self._saved_version = self._version
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, merge_threshold: int = 10000) -> "BM25Index":
+        """Open a saved index; with `mmap` the postings stay on disk until read."""
+        snapshot = _current_snapshot(Path(path))
+        if snapshot is None:
+            raise FileNotFoundError(f"No saved index at {path}")
+        index = cls(merge_threshold=merge_threshold, path=path)
+        index._read(snapshot, mmap)
+        return index
+
+    @classmethod
+    def open(cls, path: str, merge_threshold: int = 10000) -> "BM25Index":
+        """Open the index at `path`, shared with other processes.
+
+        Loads the current snapshot if there is one. The index is the writer if
+        no other process holds the writer lock, and a reader otherwise.
+        """
+        index = cls(merge_threshold=merge_threshold, path=path)
+        index.acquire_writer()
+        snapshot = _current_snapshot(index.path)
+        if snapshot is not None:
+            index._read(snapshot)
+        return index
+
+    def acquire_writer(self) -> bool:
+        """Become the index's writer, unless another process holds `writer.lock`."""
+        if self._writer_lock is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            lock = open(self.path / "writer.lock", "w")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                self.writer = False
+                return False
+            self._writer_lock = lock
+        self.writer = True
+        return True
+
+    def close(self) -> None:
+        """Release the writer lock, so another process can take over."""
+        if self._writer_lock is not None:
+            self._writer_lock.close()
+            self._writer_lock = None
+            self.writer = False
+
+    def sync(self) -> None:
+        """Catch up with the other processes sharing the index.
+
+        The writer indexes the documents readers spooled and saves if anything
+        changed. A reader takes over if the writer has exited, and otherwise
+        reloads the newest snapshot if it changed.
+        """
+        if not self.writer and self.acquire_writer():
+            self._reload()
+        if self.writer:
+            self._drain_spool()
+            if self._version != self._saved_version:
+                self.save()
+        else:
+            self._reload()
+
+    def _reload(self) -> None:
+        snapshot = _current_snapshot(self.path)
+        if snapshot is None or snapshot == self._snapshot:
+            return
+        try:
+            self._read(snapshot)
+        except (OSError, ValueError) as e:
+            # Pruned by the writer while loading; the next sync tries again
+            print(f"Could not reload keyword index {snapshot}: {e}", file=sys.stderr)
+
+    def _spool(self, entries: List[Dict[str, str]]) -> None:
+        with open(self.path / "spool.jsonl", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _drain_spool(self) -> None:
+        spool = self.path / "spool.jsonl"
+        if not spool.exists() or not spool.stat().st_size:
+            return
+        with open(spool, "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                lines = f.read().splitlines()
+                f.seek(0)
+                f.truncate()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        documents = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Cut short by a reader that exited mid-write
+            if "text" in entry:
+                documents.append((entry["key"], entry["text"]))
+                continue
+            self.add_many(documents)
+            documents = []
+            self.remove(entry["key"])
+        self.add_many(documents)
+
+class BM25Retriever(BaseRetriever):
+    """Keyword retriever ranking documents by BM25.
+
+    The index only holds keys; `fetch` turns the top keys into results (for
+    example by reading payloads from the vector store) and is called once per
+    query with every key, best first.
+    """
+    def __init__(self, index: BM25Index,
+                 fetch: Callable[[List[str], RetrievalProfile], List[Optional[SearchResult]]],
+                 default_profile: Optional[RetrievalProfile] = None):
+        super().__init__()
+        self.index = index
+        self.fetch = fetch
+        self.default_profile = default_profile or RetrievalProfile()
+
+    def retrieve(self, query: str, keywords: List[str],
+                 profile: Optional[RetrievalProfile] = None,
+                 variants: Optional[List[str]] = None) -> List[SearchResult]:
+        """Rank by the keywords, or by the query text when there are none."""
+        profile = profile or self.default_profile
+        if profile.keyword_top_k <= 0:
+            return []
+        hits = self.index.search(" ".join(keywords) if keywords else query, profile.keyword_top_k)
+        if not hits:
+            return []
+        fetched = self.fetch([key for key, _ in hits], profile)
+        results = []
+        for (_, score), result in zip(hits, fetched):
+            if result is not None:  # Deleted from the store since it was indexed
+                result.score = score
+                results.append(result)
+        return results
+
+def start_background_sync(index: BM25Index, interval_s: float) -> threading.Thread:
+    """Run `index.sync()` every `interval_s` seconds in a daemon thread."""
+    def loop() -> None:
+        while True:
+            time.sleep(interval_s)
+            try:
+                index.sync()
+            except Exception as e:
+                print(f"Keyword index sync failed: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=loop, name="keyword-index-sync", daemon=True)
+    thread.start()
+    return thread
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from ..config import Settings
+    from .retriever import VectorRetriever
+    from .embeddings import create_embedding_provider
+    settings = Settings()
+
+    parser = argparse.ArgumentParser(description="Build a BM25 keyword index from a Qdrant collection")
+    parser.add_argument("--output", default=settings.keyword_index_path or "keyword_index")
+    parser.add_argument("--collection", default=settings.qdrant_collection_name)
+    parser.add_argument("--qdrant-url", default=settings.qdrant_url)
+    args = parser.parse_args(argv)
+
+    # The collection's vector size must match the configured provider's
+    retriever = VectorRetriever(
+        collection_name=args.collection,
+        url=args.qdrant_url,
+        embedding_provider=create_embedding_provider(settings)
+    )
+    index = BM25Index(path=args.output)
+    if not index.acquire_writer():
+        raise SystemExit(f"{args.output} is being written by a running process; stop it first")
+    started = time.perf_counter()
+    count = retriever.rebuild_keyword_index(index)
+    index.save()
+    index.close()
+    print(f"Indexed {count} documents ({len(index.terms)} terms) in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
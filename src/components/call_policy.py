@@ -0,0 +1,286 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+import heapq
+import itertools
+import queue
+import random
+import threading
+import time
+import openai
+
+T = TypeVar("T")
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's time budget runs out"""
+    pass
+
+class Deadline:
+    """Absolute point in time by which a request must finish"""
+    def __init__(self, timeout_s: float):
+        self.timeout_s = timeout_s
+        self.expires_at = time.monotonic() + timeout_s
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, what: str = "request") -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline of {self.timeout_s:.2f}s exceeded before {what}")
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    """The deadline of the step currently executing in this context, if any."""
+    return _current_deadline.get()
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+# Transient failures worth another attempt
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    TimeoutError,
+    ConnectionError,
+)
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 1
+    base_delay_s: float = 0.1
+    max_delay_s: float = 2.0
+
+    def backoff_s(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt` (0-based)."""
+        return random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2 ** attempt))
+
+@dataclass
+class HedgePolicy:
+    quantile: float = 0.95      # Hedge once the primary is slower than this latency quantile
+    min_samples: int = 20       # Observed calls needed before hedging starts
+    min_delay_s: float = 0.05
+
+class LatencyTracker:
+    """Rolling window of recent successful call latencies"""
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class _Timer:
+    """Runs callbacks after a delay on one shared background thread"""
+    def __init__(self):
+        self._heap: list = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, delay_s: float, callback: Callable[[], None]) -> None:
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="call-policy-timer", daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, (time.monotonic() + delay_s, next(self._order), callback))
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._condition.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, callback = heapq.heappop(self._heap)
+            callback()
+
+# Attempts of hedged calls. Primaries and backups use separate pools so a
+# burst of primaries cannot starve the backups meant to overtake them.
+_primary_executor = ThreadPoolExecutor(max_workers=128, thread_name_prefix="hedge-primary")
+_hedge_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+_hedge_timer = _Timer()
+
+class CallPolicy:
+    """Timeout, retry and hedging policy for one kind of external call.
+
+    `call(fn)` passes each attempt the seconds it may take (bounded by the
+    current deadline and `attempt_timeout_s`; None means unbounded). With
+    hedging enabled, the primary attempt runs on a thread pool and a backup
+    attempt is sent once the primary has been running longer than the
+    observed latency quantile. Whichever attempt succeeds first is returned;
+    the other is left to finish and its result is discarded.
+    """
+    def __init__(self, retry: Optional[RetryPolicy] = None, hedge: Optional[HedgePolicy] = None,
+                 attempt_timeout_s: Optional[float] = None):
+        self.retry = retry or RetryPolicy()
+        self.hedge = hedge
+        self.attempt_timeout_s = attempt_timeout_s
+        self.latencies = LatencyTracker()
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "CallPolicy":
+        """Build from a settings dict, e.g. {"max_attempts": 3, "hedge": true}."""
+        retry = RetryPolicy(
+            max_attempts=config.get("max_attempts", 1),
+            base_delay_s=config.get("base_delay_s", 0.1),
+            max_delay_s=config.get("max_delay_s", 2.0)
+        )
+        hedge = None
+        if config.get("hedge"):
+            hedge = HedgePolicy(
+                quantile=config.get("hedge_quantile", 0.95),
+                min_samples=config.get("hedge_min_samples", 20),
+                min_delay_s=config.get("hedge_min_delay_s", 0.05)
+            )
+        return cls(retry=retry, hedge=hedge, attempt_timeout_s=config.get("attempt_timeout_s"))
+
+    def call(self, fn: Callable[[Optional[float]], T]) -> T:
+        deadline = current_deadline()
+        for attempt in range(self.retry.max_attempts):
+            timeout = self._attempt_timeout(deadline)
+            try:
+                return self._attempt(fn, timeout, deadline)
+            except RETRYABLE_ERRORS as e:
+                _raise_if_expired(deadline, e)
+                if attempt + 1 >= self.retry.max_attempts:
+                    raise
+                delay = self.retry.backoff_s(attempt)
+                if deadline and deadline.remaining() <= delay:
+                    raise
+                time.sleep(delay)
+
+    def _attempt_timeout(self, deadline: Optional[Deadline]) -> Optional[float]:
+        if deadline:
+            deadline.check("external call")
+        return self._time_limit(deadline)
+
+    def _time_limit(self, deadline: Optional[Deadline]) -> Optional[float]:
+        limits = [t for t in (self.attempt_timeout_s, deadline.remaining() if deadline else None) if t is not None]
+        return min(limits) if limits else None
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self.latencies) < self.hedge.min_samples:
+            return None
+        return max(self.hedge.min_delay_s, self.latencies.quantile(self.hedge.quantile))
+
+    def _attempt(self, fn: Callable[[Optional[float]], T], timeout: Optional[float],
+                 deadline: Optional[Deadline]) -> T:
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or (timeout is not None and hedge_delay >= timeout):
+            start = time.monotonic()
+            result = fn(timeout)
+            self.latencies.record(time.monotonic() - start)
+            return result
+
+        outcomes: queue.Queue = queue.Queue()
+        lock = threading.Lock()
+        launched = 1
+        finished = False
+        started: List[float] = []
+
+        def run(context: Context, attempt_timeout: Optional[float], is_backup: bool) -> None:
+            try:
+                outcomes.put((is_backup, True, context.run(fn, attempt_timeout)))
+            except BaseException as e:
+                outcomes.put((is_backup, False, e))
+
+        def send_backup() -> None:
+            nonlocal launched
+            with lock:
+                if finished:
+                    return
+                launched += 1
+                self.hedges_sent += 1
+            # A full attempt of its own, so it is not cut off together with the primary
+            _hedge_executor.submit(run, backup_context, self._time_limit(deadline), True)
+
+        def run_primary() -> None:
+            # The hedge delay counts from when the primary starts, not from queueing for the pool
+            started.append(time.monotonic())
+            _hedge_timer.schedule(hedge_delay, send_backup)
+            run(primary_context, timeout, False)
+
+        # Each attempt runs in its own copy of this context so both see the same deadline
+        primary_context = copy_context()
+        backup_context = copy_context()
+        _primary_executor.submit(run_primary)
+
+        received = 0
+        while True:
+            try:
+                is_backup, ok, value = outcomes.get(timeout=deadline.remaining() if deadline else None)
+            except queue.Empty:
+                with lock:
+                    finished = True
+                raise TimeoutError("Hedged call did not finish before the deadline")
+            received += 1
+            with lock:
+                # Stop on the first success, a non-transient error, or once every attempt failed
+                if ok or not isinstance(value, RETRYABLE_ERRORS) or received >= launched:
+                    finished = True
+            if ok:
+                if is_backup:
+                    self.hedges_won += 1
+                self.latencies.record(time.monotonic() - started[0])
+                return value
+            if finished:
+                raise value
+
+def _raise_if_expired(deadline: Optional[Deadline], error: BaseException) -> None:
+    """A timeout caused by the request deadline is reported as DeadlineExceeded."""
+    if deadline and deadline.expired():
+        raise DeadlineExceeded(f"Deadline of {deadline.timeout_s:.2f}s exceeded during external call") from error
+
+def call_with_policy(policy: Optional[CallPolicy], fn: Callable[[Optional[float]], T]) -> T:
+    """Run an external call under `policy`, or with just the current deadline as its timeout."""
+    if policy is not None:
+        return policy.call(fn)
+    deadline = current_deadline()
+    if deadline is None:
+        return fn(None)
+    deadline.check("external call")
+    try:
+        return fn(deadline.remaining())
+    except RETRYABLE_ERRORS as e:
+        _raise_if_expired(deadline, e)
+        raise
+
+def sdk_timeout(timeout: Optional[float]) -> Any:
+    """An attempt timeout for the OpenAI SDK. None leaves the SDK's default in place,
+    since passing None explicitly disables its timeout."""
+    return openai.NOT_GIVEN if timeout is None else timeout
+
+def sdk_max_retries(policy: Optional[CallPolicy]) -> int:
+    """The OpenAI SDK retries on its own; leave retrying to the policy when there is one."""
+    return 0 if policy is not None else openai.DEFAULT_MAX_RETRIES
+
+def policy_for_step(settings, step_name: str) -> Optional[CallPolicy]:
+    """CallPolicy for a workflow step from `settings.step_call_policies`, if configured."""
+    config = settings.step_call_policies.get(step_name)
+    return CallPolicy.from_config(config) if config else None
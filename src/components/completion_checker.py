@@ -1,9 +1,16 @@
 from abc import abstractmethod
 from openai import OpenAI
-from typing import List, Dict, Any
-from .base_component import BaseComponent
+from typing import List, Dict, Any, Optional, Tuple
+import random
+import threading
+import numpy as np
+from .base_component import BaseComponent, record_metadata
 from ..config import Settings
 from ..models import SearchResult
+from ..logging.json_logger import JsonLogger
+from .llm_cache import BaseLLMCache, cached_chat_completion
+from .call_policy import CallPolicy, sdk_max_retries
+from .bm25 import tokenize
 
 class BaseCompletionChecker(BaseComponent):
     """Base class for checking if query can be answered with context"""
@@ -19,20 +26,7 @@ class BaseCompletionChecker(BaseComponent):
         """Check if the query can be answered with the given context."""
         pass
 
-class LLMCompletionChecker(BaseCompletionChecker):
-    def __init__(self, model: str = "gpt-4-turbo-preview"):
-        super().__init__()
-        settings = Settings()
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        self.model = model
-    
-    def check_completion(self, query: str, context: List[SearchResult]) -> float:
-        formatted_context = "\n\n".join([
-            f"Context {i+1}:\n{result.text}"
-            for i, result in enumerate(context)
-        ])
-        
-        prompt = """Analyze if the given context contains sufficient information to answer the query.
+COMPLETION_CHECK_PROMPT = """Analyze if the given context contains sufficient information to answer the query.
         Return ONLY a float number between 0 and 1, where:
         - 1.0 means the context perfectly contains all needed information
         - 0.0 means the context has no relevant information
@@ -49,18 +43,272 @@ class LLMCompletionChecker(BaseCompletionChecker):
         Query: {query}
         
         Score (0.0-1.0):"""
+
+class LLMCompletionChecker(BaseCompletionChecker):
+    def __init__(self, model: str = "gpt-4-turbo-preview", cache: Optional[BaseLLMCache] = None,
+                 policy: Optional[CallPolicy] = None):
+        super().__init__()
+        settings = Settings()
+        self.client = OpenAI(api_key=settings.openai_api_key, max_retries=sdk_max_retries(policy))
+        self.model = model
+        self.cache = cache
+        self.policy = policy
+    
+    def check_completion(self, query: str, context: List[SearchResult]) -> float:
+        formatted_context = "\n\n".join([
+            f"Context {i+1}:\n{result.text}"
+            for i, result in enumerate(context)
+        ])
         
-        response = self.client.chat.completions.create(
+        content, cache_hit = cached_chat_completion(
+            self.client,
+            self.cache,
+            COMPLETION_CHECK_PROMPT,
+            policy=self.policy,
             model=self.model,
             messages=[{
                 "role": "user", 
-                "content": prompt.format(context=formatted_context, query=query)
+                "content": COMPLETION_CHECK_PROMPT.format(context=formatted_context, query=query)
             }],
             temperature=0,
             max_tokens=10
         )
+        record_metadata(cache_hit=cache_hit)
         
         try:
-            return float(response.choices[0].message.content.strip())
-        except ValueError:
-            return 0.0  # Default to 0 if we can't parse the response 
\ No newline at end of file
+            return float(content.strip())
+        except (ValueError, AttributeError):
+            return 0.0  # Default to 0 if we can't parse the response
+
+# Retrieval statistics the adaptive checker predicts sufficiency from
+FEATURE_NAMES = [
+    "log_results",
+    "semantic_max",
+    "semantic_top3_mean",
+    "semantic_gap",
+    "keyword_max_log",
+    "both_legs_fraction",
+    "fused_max",
+    "query_coverage",
+]
+
+def completion_features(query: str, context: List[SearchResult]) -> np.ndarray:
+    """Feature vector (FEATURE_NAMES) of a query's retrieval results.
+
+    Uses the per-leg raw scores that fusion leaves in `SearchResult.scores`,
+    and the fraction of the query's words that appear in the context.
+    """
+    semantic = sorted((r.scores.get("semantic", 0.0) for r in context if "semantic" in r.scores), reverse=True)
+    keyword = [r.scores["keyword"] for r in context if "keyword" in r.scores]
+    query_terms = {term for term in tokenize(query) if len(term) > 2}
+    context_terms = set(tokenize(" ".join(r.text for r in context))) if query_terms else set()
+    return np.array([
+        np.log1p(len(context)),
+        semantic[0] if semantic else 0.0,
+        float(np.mean(semantic[:3])) if semantic else 0.0,
+        semantic[0] - semantic[1] if len(semantic) > 1 else 0.0,
+        np.log1p(max(keyword)) if keyword else 0.0,
+        sum(len(r.scores) > 1 for r in context) / len(context) if context else 0.0,
+        max(r.score if r.fused_score is None else r.fused_score for r in context) if context else 0.0,
+        len(query_terms & context_terms) / len(query_terms) if query_terms else 0.0,
+    ], dtype=np.float32)
+
+def _sigmoid(logits: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-logits))
+
+class AdaptiveCompletionChecker(BaseCompletionChecker):
+    """Skips the LLM check when retrieval scores already decide it.
+
+    A logistic model, calibrated on logged LLM checks (see `fit_from_logs`),
+    estimates the probability that the LLM would score the context at or
+    above `threshold`. At `confidence` or above the check returns 1.0, at
+    1 - `confidence` or below it returns 0.0, and otherwise `fallback`
+    (normally an LLMCompletionChecker) decides. Without a model every check
+    goes to the fallback.
+
+    A `shadow_rate` fraction of confident decisions is still sent to the
+    fallback, to measure agreement; `stats` reports it with the skip rate.
+    Checks that reached the fallback are the training data for the next
+    calibration; skipped ones are marked `fast_path` in the step metadata.
+    """
+    def __init__(
+        self,
+        fallback: BaseCompletionChecker,
+        threshold: float = 0.7,
+        confidence: float = 0.95,
+        shadow_rate: float = 0.05,
+        model_path: Optional[str] = None
+    ):
+        super().__init__()
+        self.fallback = fallback
+        self.threshold = threshold
+        self.confidence = confidence
+        self.shadow_rate = shadow_rate
+        self.weights: Optional[np.ndarray] = None
+        self.bias = 0.0
+        self.mean: Optional[np.ndarray] = None
+        self.std: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.skipped = 0
+        self.shadow_checks = 0
+        self.shadow_agreements = 0
+        if model_path:
+            self.load(model_path)
+
+    def check_completion(self, query: str, context: List[SearchResult]) -> float:
+        if self.weights is None:
+            record_metadata(fast_path=False)
+            score = self.fallback.check_completion(query, context)
+            self._record(skipped=False)
+            return score
+
+        probability = self.predict_proba(completion_features(query, context)[None, :])[0]
+        verdict = None
+        if probability >= self.confidence:
+            verdict = 1.0
+        elif probability <= 1 - self.confidence:
+            verdict = 0.0
+        shadow = verdict is not None and random.random() < self.shadow_rate
+        record_metadata(predicted_sufficient=float(probability), fast_path=verdict is not None and not shadow)
+        if verdict is not None and not shadow:
+            self._record(skipped=True)
+            return verdict
+
+        # The fallback records its own values (e.g. cache_hit) into this call's step metadata
+        score = self.fallback.check_completion(query, context)
+        agreed = None
+        if shadow:
+            agreed = (score >= self.threshold) == (verdict >= self.threshold)
+            record_metadata(shadow=True, shadow_agreed=agreed)
+        self._record(skipped=False, agreed=agreed)
+        return score
+
+    def _record(self, skipped: bool, agreed: Optional[bool] = None) -> None:
+        with self._lock:
+            self.checks += 1
+            self.skipped += skipped
+            if agreed is not None:
+                self.shadow_checks += 1
+                self.shadow_agreements += agreed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calibrated": self.weights is not None,
+                "checks": self.checks,
+                "skipped": self.skipped,
+                "skip_rate": self.skipped / self.checks if self.checks else 0.0,
+                "shadow_checks": self.shadow_checks,
+                "agreement": self.shadow_agreements / self.shadow_checks if self.shadow_checks else None
+            }
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Probability that the LLM check passes, for each row of features."""
+        return _sigmoid(((features - self.mean) / self.std) @ self.weights + self.bias)
+
+    def fit(self, features: np.ndarray, scores: np.ndarray,
+            epochs: int = 500, learning_rate: float = 0.5, l2: float = 1e-3) -> None:
+        """Fit the logistic model to LLM scores with full-batch gradient descent."""
+        labels = (np.asarray(scores) >= self.threshold).astype(np.float32)
+        self.mean = features.mean(axis=0)
+        self.std = np.where(features.std(axis=0) > 0, features.std(axis=0), 1.0)
+        standardized = (features - self.mean) / self.std
+        weights = np.zeros(features.shape[1], dtype=np.float32)
+        bias = 0.0
+        for _ in range(epochs):
+            error = _sigmoid(standardized @ weights + bias) - labels
+            weights -= learning_rate * (standardized.T @ error / len(labels) + l2 * weights)
+            bias -= learning_rate * float(error.mean())
+        self.weights, self.bias = weights, bias
+
+    def evaluate(self, features: np.ndarray, scores: np.ndarray,
+                 confidence: Optional[float] = None) -> Dict[str, float]:
+        """Skip rate and agreement with the LLM on confident decisions, for held-out checks."""
+        confidence = self.confidence if confidence is None else confidence
+        probabilities = self.predict_proba(features)
+        confident = (probabilities >= confidence) | (probabilities <= 1 - confidence)
+        agreed = (probabilities >= 0.5) == (np.asarray(scores) >= self.threshold)
+        return {
+            "confidence": confidence,
+            "skip_rate": float(confident.mean()) if len(scores) else 0.0,
+            "agreement": float(agreed[confident].mean()) if confident.any() else None
+        }
+
+    def save(self, path: str) -> None:
+        if self.weights is None:
+            raise ValueError("Only a calibrated model can be saved")
+        np.savez(path, weights=self.weights, bias=self.bias, mean=self.mean, std=self.std,
+                 threshold=self.threshold, feature_names=np.array(FEATURE_NAMES))
+
+    def load(self, path: str) -> None:
+        data = np.load(path)
+        if list(data["feature_names"]) != FEATURE_NAMES:
+            raise ValueError(f"{path} was calibrated on different features; recalibrate it")
+        if not np.isclose(float(data["threshold"]), self.threshold):
+            raise ValueError(
+                f"{path} was calibrated for completion threshold {float(data['threshold'])}, not {self.threshold}"
+            )
+        self.weights = data["weights"]
+        self.bias = float(data["bias"])
+        self.mean = data["mean"]
+        self.std = data["std"]
+
+def load_completion_checks(log_dir: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Features and LLM scores of the completion checks in JsonLogger step logs.
+
+    Checks answered by the adaptive fast path are left out, since their
+    scores are the model's own verdicts.
+    """
+    features, scores = [], []
+    for step in JsonLogger(log_dir).iter_step_logs(step_names=["completion_checker"]):
+        if not step.success or (step.metadata or {}).get("fast_path"):
+            continue
+        args = (step.input or {}).get("args") or []
+        score = (step.output or {}).get("result")
+        if len(args) < 2 or not isinstance(score, (int, float)):
+            continue
+        context = [
+            SearchResult(
+                text=r.get("text", ""), metadata=r.get("metadata"), score=r.get("score", 0.0),
+                id=r.get("id"), scores=r.get("scores") or {}, fused_score=r.get("fused_score")
+            )
+            for r in args[1]
+        ]
+        features.append(completion_features(args[0], context))
+        scores.append(float(score))
+    if not features:
+        return np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32), np.zeros(0)
+    return np.stack(features), np.array(scores)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calibrate the adaptive completion checker on logged LLM checks")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--output", default="completion_model.npz")
+    parser.add_argument("--threshold", type=float, default=None, help="Defaults to COMPLETION_THRESHOLD")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of checks held out for evaluation")
+    args = parser.parse_args()
+
+    threshold = args.threshold if args.threshold is not None else Settings().completion_threshold
+    features, scores = load_completion_checks(args.log_dir)
+    labels = scores >= threshold
+    if len(scores) < 10 or labels.all() or not labels.any():
+        raise SystemExit(f"Need at least 10 logged checks with both outcomes, found {len(scores)}")
+
+    order = np.random.default_rng(0).permutation(len(scores))
+    split = int(len(scores) * (1 - args.holdout))
+    train, test = order[:split], order[split:]
+    checker = AdaptiveCompletionChecker(fallback=None, threshold=threshold)
+    checker.fit(features[train], scores[train])
+    print(f"Calibrated on {len(train)} checks, evaluated on {len(test)}")
+    for confidence in (0.8, 0.9, 0.95, 0.99):
+        result = checker.evaluate(features[test], scores[test], confidence)
+        agreement = "n/a" if result["agreement"] is None else f"{result['agreement']:.3f}"
+        print(f"  confidence={confidence:.2f}  skip_rate={result['skip_rate']:.3f}  agreement={agreement}")
+
+    checker.fit(features, scores)
+    checker.save(args.output)
+    print(f"Saved to {args.output}")
+
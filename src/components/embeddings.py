@@ -0,0 +1,177 @@
+import hashlib
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from openai import OpenAI
+from ..config import Settings
+from .call_policy import CallPolicy, call_with_policy, sdk_max_retries, sdk_timeout
+
+_TOKEN = re.compile(r"\w+")
+
+class BaseEmbeddingProvider(ABC):
+    """Turns texts into fixed-size vectors.
+
+    `name` identifies the model in cache keys, and `dimension` sizes the
+    vector collection, so switching providers never mixes vectors.
+    """
+    name: str
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        pass
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        """Embed a batch. Returns (float32 array of shape (len(texts), dimension), tokens used)."""
+        pass
+
+# Output sizes of the OpenAI embedding models
+OPENAI_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+class OpenAIEmbeddingProvider(BaseEmbeddingProvider):
+    """Embeddings from the OpenAI API, one request per batch.
+
+    `dimensions` shortens text-embedding-3 vectors server-side; for models
+    not in OPENAI_DIMENSIONS the size is found with one probe request.
+    """
+    def __init__(self, model: str = "text-embedding-3-small", policy: Optional[CallPolicy] = None,
+                 dimensions: Optional[int] = None):
+        settings = Settings()
+        self.client = OpenAI(api_key=settings.openai_api_key, max_retries=sdk_max_retries(policy))
+        self.model = model
+        self.name = f"{model}:{dimensions}" if dimensions else model
+        self.policy = policy
+        self.dimensions = dimensions
+        self._dimension = dimensions or OPENAI_DIMENSIONS.get(model)
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = self.embed(["dimension probe"])[0].shape[1]
+        return self._dimension
+
+    def embed(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        extra = {"dimensions": self.dimensions} if self.dimensions else {}
+        response = call_with_policy(self.policy, lambda timeout: self.client.embeddings.create(
+            model=self.model,
+            input=texts,
+            timeout=sdk_timeout(timeout),
+            **extra
+        ))
+        # The API does not guarantee ordering, so sort by the returned index
+        data = sorted(response.data, key=lambda d: d.index)
+        tokens = response.usage.total_tokens if response.usage else 0
+        return np.array([d.embedding for d in data], dtype=np.float32), tokens
+
+@lru_cache(maxsize=1 << 18)
+def _feature(token: str, dimension: int) -> Tuple[int, float]:
+    """Bucket and sign of a token; cached because natural text repeats tokens heavily."""
+    digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+    return int.from_bytes(digest[:4], "little") % dimension, 1.0 if digest[4] & 1 else -1.0
+
+class HashingEmbeddingProvider(BaseEmbeddingProvider):
+    """CPU-local embeddings by feature hashing, with no model or network.
+
+    Words (and, with `ngrams` > 1, word n-grams) are hashed to signed buckets
+    with sublinear term frequency, then L2-normalized. Similarity reflects
+    shared vocabulary only, not meaning: it suits air-gapped deployments,
+    tests and keyword-heavy corpora rather than paraphrase-heavy ones.
+    """
+    def __init__(self, dimension: int = 1024, ngrams: int = 1):
+        self._dimension = dimension
+        self.ngrams = ngrams
+        self.name = f"hashing-{dimension}-{ngrams}"
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN.findall(text.lower())
+        features = list(words)
+        for n in range(2, self.ngrams + 1):
+            features.extend(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+        return features
+
+    def embed(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        rows: List[int] = []
+        buckets: List[int] = []
+        values: List[float] = []
+        tokens = 0
+        for row, text in enumerate(texts):
+            counts: Dict[int, float] = {}
+            features = self._features(text)
+            tokens += len(features)
+            for feature in features:
+                bucket, sign = _feature(feature, self._dimension)
+                counts[bucket] = counts.get(bucket, 0.0) + sign
+            rows.extend([row] * len(counts))
+            buckets.extend(counts.keys())
+            values.extend(counts.values())
+        vectors = np.zeros((len(texts), self._dimension), dtype=np.float32)
+        signed = np.asarray(values, dtype=np.float32)
+        vectors[rows, buckets] = np.sign(signed) * np.log1p(np.abs(signed))
+        return _normalize(vectors), tokens
+
+class StaticEmbeddingProvider(BaseEmbeddingProvider):
+    """Embeddings from a locally stored static model: the weighted mean of token vectors.
+
+    The .npz file holds `vocab` (N strings), `vectors` (N x dimension) and
+    optionally `weights` (N, e.g. IDF). Word2vec/GloVe exports and distilled
+    static models can be converted to this format. Out-of-vocabulary tokens
+    are ignored. Encoding a batch is one gather and one segmented sum.
+    """
+    def __init__(self, path: str):
+        data = np.load(path, allow_pickle=False)
+        self.vectors = data["vectors"].astype(np.float32)
+        self.weights = data["weights"].astype(np.float32) if "weights" in data else None
+        self.vocab = {str(token): i for i, token in enumerate(data["vocab"])}
+        self.name = f"static:{path}"
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1]
+
+    def embed(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        ids, lengths, tokens = [], [], 0
+        for text in texts:
+            words = _TOKEN.findall(text.lower())
+            tokens += len(words)
+            known = [self.vocab[w] for w in words if w in self.vocab]
+            ids.extend(known)
+            lengths.append(len(known))
+
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if ids:
+            ids_array = np.asarray(ids, dtype=np.int64)
+            gathered = self.vectors[ids_array]
+            if self.weights is not None:
+                gathered = gathered * self.weights[ids_array, None]
+            lengths_array = np.asarray(lengths)
+            nonempty = lengths_array > 0
+            starts = np.concatenate([[0], np.cumsum(lengths_array)[:-1]])[nonempty]
+            vectors[nonempty] = np.add.reduceat(gathered, starts, axis=0)
+        return _normalize(vectors), tokens
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def create_embedding_provider(settings: Settings, policy: Optional[CallPolicy] = None) -> BaseEmbeddingProvider:
+    """Build the provider selected by EMBEDDING_PROVIDER."""
+    if settings.embedding_provider == "openai":
+        return OpenAIEmbeddingProvider(settings.embedding_model, policy, settings.embedding_dimension)
+    if settings.embedding_provider == "hashing":
+        return HashingEmbeddingProvider(settings.embedding_dimension or 1024, settings.embedding_hashing_ngrams)
+    if settings.embedding_provider == "static":
+        if not settings.embedding_model_path:
+            raise ValueError("EMBEDDING_MODEL_PATH is required for the static embedding provider")
+        return StaticEmbeddingProvider(settings.embedding_model_path)
+    raise ValueError(f"Unknown embedding provider: {settings.embedding_provider}")
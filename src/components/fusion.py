@@ -0,0 +1,136 @@
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from ..models import SearchResult, RetrievalProfile
+
+# Rank offset in reciprocal rank fusion; 60 is the value from the original RRF paper
+RRF_K = 60
+
+def _result_key(result: SearchResult) -> str:
+    """Dedup key: the point id, or the text for results from backends without ids."""
+    return result.id if result.id is not None else result.text
+
+def rrf_scores(scores: np.ndarray, ranks: np.ndarray, present: np.ndarray,
+               rrf_k: int = RRF_K) -> np.ndarray:
+    """1 / (k + rank) per leg, with rank 1 for the first result a leg returned; 0 where absent.
+
+    Ranks are list positions, not score order, so a leg that was itself
+    fused (e.g. query variants) keeps its order.
+    """
+    return np.where(present, 1.0 / (rrf_k + ranks), 0.0)
+
+def minmax_scores(scores: np.ndarray, ranks: np.ndarray, present: np.ndarray,
+                  rrf_k: int = RRF_K) -> np.ndarray:
+    """Each leg's scores rescaled to [0, 1]; 0 where absent, 1 if all its scores are equal."""
+    low = np.where(present, scores, np.inf).min(axis=1, keepdims=True)
+    high = np.where(present, scores, -np.inf).max(axis=1, keepdims=True)
+    span = high - low
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normalized = np.where(span > 0, (scores - low) / np.where(span > 0, span, 1), 1.0)
+    return np.where(present, normalized, 0.0)
+
+def zscore_scores(scores: np.ndarray, ranks: np.ndarray, present: np.ndarray,
+                  rrf_k: int = RRF_K) -> np.ndarray:
+    """Each leg's scores as standard scores; absent results get the leg's lowest."""
+    counts = present.sum(axis=1, keepdims=True)
+    safe_counts = np.maximum(counts, 1)
+    mean = np.where(present, scores, 0.0).sum(axis=1, keepdims=True) / safe_counts
+    variance = np.where(present, (scores - mean) ** 2, 0.0).sum(axis=1, keepdims=True) / safe_counts
+    std = np.sqrt(variance)
+    normalized = np.where(std > 0, (scores - mean) / np.where(std > 0, std, 1), 0.0)
+    floor = np.where(present, normalized, np.inf).min(axis=1, keepdims=True)
+    floor = np.where(np.isfinite(floor), floor, 0.0)
+    return np.where(present, normalized, floor)
+
+# Per-leg score normalizations, selected by RetrievalProfile.fusion. Each takes
+# (legs x results) score, rank (1-based list position) and presence matrices
+# and returns normalized scores.
+FUSION_METHODS: Dict[str, Callable[[np.ndarray, np.ndarray, np.ndarray, int], np.ndarray]] = {
+    "rrf": rrf_scores,
+    "minmax": minmax_scores,
+    "zscore": zscore_scores,
+}
+
+def fuse(legs: Dict[str, List[SearchResult]], method: str = "rrf",
+         weights: Optional[Dict[str, float]] = None, rrf_k: int = RRF_K,
+         limit: Optional[int] = None) -> List[SearchResult]:
+    """Merge ranked result lists into one, best first.
+
+    Results are deduplicated by id. Each leg's scores are normalized with
+    `method` and combined as a weighted sum (legs missing from `weights`
+    weigh 1.0). Fused results are ordered by the fused value, kept in
+    `fused_score`. `score` stays the raw score from the first leg that
+    returned the result (the similarity, for the semantic leg), and `scores`
+    holds each leg's raw score.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method: {method}")
+    names = [name for name, results in legs.items() if results]
+    if not names:
+        return []
+
+    positions: Dict[str, int] = {}
+    merged: List[SearchResult] = []
+    for name in names:
+        for result in legs[name]:
+            key = _result_key(result)
+            if key not in positions:
+                positions[key] = len(merged)
+                merged.append(SearchResult(
+                    text=result.text, metadata=result.metadata, score=0.0, id=result.id
+                ))
+
+    scores = np.zeros((len(names), len(merged)))
+    ranks = np.zeros((len(names), len(merged)))
+    present = np.zeros((len(names), len(merged)), dtype=bool)
+    for leg, name in enumerate(names):
+        for rank, result in enumerate(legs[name], start=1):
+            position = positions[_result_key(result)]
+            # A leg may return the same result twice; keep its best score and first rank
+            if not present[leg, position]:
+                ranks[leg, position] = rank
+                scores[leg, position] = result.score
+                present[leg, position] = True
+            elif result.score > scores[leg, position]:
+                scores[leg, position] = result.score
+
+    leg_weights = np.array([(weights or {}).get(name, 1.0) for name in names])[:, None]
+    fused = (FUSION_METHODS[method](scores, ranks, present, rrf_k) * leg_weights).sum(axis=0)
+    order = np.argsort(-fused, kind="stable")[:limit]
+    results = []
+    for position in order:
+        result = merged[position]
+        result.score = float(scores[present[:, position].argmax(), position])
+        result.fused_score = float(fused[position])
+        result.scores = {
+            name: float(scores[leg, position]) for leg, name in enumerate(names) if present[leg, position]
+        }
+        results.append(result)
+    return results
+
+def fuse_for_profile(legs: Dict[str, List[SearchResult]], profile: RetrievalProfile,
+                     limit: Optional[int] = None) -> List[SearchResult]:
+    return fuse(legs, profile.fusion, profile.fusion_weights, profile.rrf_k, limit)
+
+def reciprocal_rank_fusion(rankings: List[List[SearchResult]], limit: int,
+                           rrf_k: int = RRF_K, merge_scores: bool = False) -> List[SearchResult]:
+    """Fuse rankings of the same kind (e.g. one per query variant) by RRF.
+
+    Results keep their best original score across the rankings, so score
+    thresholds and relevance mean the same as for a single query. With
+    `merge_scores`, results also keep the best raw score per retrieval leg
+    from the inputs' `scores`, for fusing rankings that were already fused
+    across legs.
+    """
+    legs = {str(i): ranking for i, ranking in enumerate(rankings)}
+    fused = fuse(legs, "rrf", rrf_k=rrf_k, limit=limit)
+    leg_scores: Dict[str, Dict[str, float]] = {}
+    if merge_scores:
+        for ranking in rankings:
+            for result in ranking:
+                merged = leg_scores.setdefault(_result_key(result), {})
+                for leg, score in result.scores.items():
+                    merged[leg] = max(score, merged.get(leg, score))
+    for result in fused:
+        result.score = max(result.scores.values())
+        result.scores = leg_scores.get(_result_key(result), {})
+    return fused
@@ -0,0 +1,216 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from .call_policy import CallPolicy, call_with_policy, sdk_timeout
+
+def template_version(template: str) -> str:
+    """Short hash of a prompt template. Part of every cache key, so editing a
+    template automatically stops serving responses cached for the old one."""
+    return hashlib.sha256(template.encode()).hexdigest()[:16]
+
+def cache_key(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any],
+              template: str) -> str:
+    payload = json.dumps({
+        "model": model,
+        "messages": messages,
+        "params": params,
+        "template": template_version(template)
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class BaseLLMCache(ABC):
+    """Cache of chat completion contents keyed by model, prompt and parameters"""
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached content, or None if missing or expired."""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        """Store content, evicting the least recently used entries beyond max_entries."""
+        pass
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+class InMemoryLLMCache(BaseLLMCache):
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: int = 10000):
+        super().__init__(ttl_seconds, max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[0]):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class SQLiteLLMCache(BaseLLMCache):
+    """Persistent cache shared by every process that opens the same file.
+
+    Hits don't write: access times are buffered and written in one
+    transaction every `flush_interval_s` or `flush_batch` hits. Eviction
+    runs only after every `max_entries // 10` inserts, and then trims the
+    table to 90% of `max_entries` in one statement. The cache can therefore
+    briefly hold up to a tenth more entries per process, and access times
+    not yet flushed are lost on exit; both only affect which entries are
+    evicted.
+    """
+    def __init__(self, path: str = "llm_cache.sqlite3",
+                 ttl_seconds: Optional[float] = None, max_entries: int = 10000,
+                 flush_interval_s: float = 5.0, flush_batch: int = 256):
+        super().__init__(ttl_seconds, max_entries)
+        self.flush_interval_s = flush_interval_s
+        self.flush_batch = flush_batch
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+        self._accessed: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        self._evict_every = max(1, max_entries // 10)
+        self._inserts = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1]):
+                self.misses += 1
+                return None  # Expired rows are replaced by the next set or evicted
+            self.hits += 1
+            self._accessed[key] = time.time()
+            if (len(self._accessed) >= self.flush_batch
+                    or time.monotonic() - self._last_flush >= self.flush_interval_s):
+                self._flush_accesses()
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._accessed.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._inserts += 1
+            if self._inserts >= self._evict_every:
+                self._inserts = 0
+                self._flush_accesses()
+                self._evict()
+
+    def flush(self) -> None:
+        """Write buffered access times now, e.g. before shutdown."""
+        with self._lock:
+            self._flush_accesses()
+
+    def _flush_accesses(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._accessed:
+            return
+        accessed, self._accessed = self._accessed, {}
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "UPDATE llm_cache SET last_access = ? WHERE key = ?",
+                [(at, key) for key, at in accessed.items()]
+            )
+            self._conn.execute("COMMIT")
+        except sqlite3.Error:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # Trim below the limit so the next eviction is another batch away
+        self._conn.execute(
+            """DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?
+            )""",
+            (count - int(self.max_entries * 0.9),)
+        )
+
+def cached_chat_completion(client, cache: Optional[BaseLLMCache], template: str,
+                           policy: Optional[CallPolicy] = None, **request) -> Tuple[str, bool]:
+    """Run a chat completion, serving repeated deterministic requests from `cache`.
+
+    Only temperature-0 requests are cached. Misses go through `policy` (retries,
+    hedging) and are bounded by the current deadline. Returns (content, cache_hit).
+    """
+    cacheable = cache is not None and request.get("temperature") == 0
+    if cacheable:
+        params = {k: v for k, v in request.items() if k not in ("model", "messages")}
+        key = cache_key(request["model"], request["messages"], params, template)
+        content = cache.get(key)
+        if content is not None:
+            return content, True
+
+    response = call_with_policy(
+        policy, lambda timeout: client.chat.completions.create(timeout=sdk_timeout(timeout), **request)
+    )
+    content = response.choices[0].message.content
+    if cacheable and content is not None:
+        cache.set(key, content)
+    return content, False
+
+def create_llm_cache(settings) -> Optional[BaseLLMCache]:
+    """Build the cache selected by `settings.llm_cache_backend`."""
+    if settings.llm_cache_backend == "memory":
+        return InMemoryLLMCache(settings.llm_cache_ttl_seconds, settings.llm_cache_max_entries)
+    if settings.llm_cache_backend == "sqlite":
+        return SQLiteLLMCache(
+            settings.llm_cache_path, settings.llm_cache_ttl_seconds, settings.llm_cache_max_entries
+        )
+    if settings.llm_cache_backend == "shared":
+        from .shared_cache import SharedMemoryLLMCache
+        return SharedMemoryLLMCache(
+            os.path.join(settings.shared_cache_dir, "llm.cache"),
+            settings.llm_cache_ttl_seconds, settings.llm_cache_max_entries
+        )
+    if settings.llm_cache_backend == "none":
+        return None
+    raise ValueError(f"Unknown LLM cache backend: {settings.llm_cache_backend}")
@@ -1,15 +1,18 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from openai import OpenAI
 import json
-from .base_component import BaseComponent
+from .base_component import BaseComponent, record_metadata
 from ..config import Settings
+from .llm_cache import BaseLLMCache, cached_chat_completion
+from .call_policy import CallPolicy, sdk_max_retries
 
 @dataclass
 class ReformulatedQuery:
     refined_text: str
     keywords: List[str]
+    variants: List[str] = field(default_factory=list)  # Alternative phrasings searched alongside refined_text
 
 class BaseQueryReformulator(BaseComponent, ABC):
     """Base class for query reformulation"""
@@ -25,15 +28,7 @@ class BaseQueryReformulator(BaseComponent, ABC):
         """Reformulate the query and generate keywords."""
         pass
 
-class LLMQueryReformulator(BaseQueryReformulator):
-    def __init__(self, model: str = "gpt-4-turbo-preview"):
-        super().__init__()
-        settings = Settings()
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        self.model = model
-    
-    def reformulate(self, query: str) -> ReformulatedQuery:
-        prompt = f"""Given the user query, reformulate it to be more precise and extract key search terms.
+REFORMULATION_PROMPT = """Given the user query, reformulate it to be more precise and extract key search terms.
 Return your response in this JSON format:
 {{
     "refined_query": "reformulated question",
@@ -43,8 +38,47 @@ Return your response in this JSON format:
 Only return the JSON object, no other text.
 
 User Query: {query}"""
-        
-        response = self.client.chat.completions.create(
+
+MULTI_QUERY_REFORMULATION_PROMPT = """Given the user query, reformulate it to be more precise, write {num_variants} alternative phrasings that could match relevant documents in different words, and extract key search terms.
+Return your response in this JSON format:
+{{
+    "refined_query": "reformulated question",
+    "variants": ["alternative phrasing", "another alternative phrasing"],
+    "keywords": ["key1", "key2", "key3"]
+}}
+
+Only return the JSON object, no other text.
+
+User Query: {query}"""
+
+class LLMQueryReformulator(BaseQueryReformulator):
+    """Refines the query with one LLM call.
+
+    With `num_variants` > 0 the same call also returns that many alternative
+    phrasings, which the retriever searches together to improve recall.
+    """
+    def __init__(self, model: str = "gpt-4-turbo-preview", cache: Optional[BaseLLMCache] = None,
+                 policy: Optional[CallPolicy] = None, num_variants: int = 0):
+        super().__init__()
+        settings = Settings()
+        self.client = OpenAI(api_key=settings.openai_api_key, max_retries=sdk_max_retries(policy))
+        self.model = model
+        self.cache = cache
+        self.policy = policy
+        self.num_variants = num_variants
+    
+    def reformulate(self, query: str) -> ReformulatedQuery:
+        if self.num_variants > 0:
+            template = MULTI_QUERY_REFORMULATION_PROMPT
+            prompt = template.format(query=query, num_variants=self.num_variants)
+        else:
+            template = REFORMULATION_PROMPT
+            prompt = template.format(query=query)
+        content, cache_hit = cached_chat_completion(
+            self.client,
+            self.cache,
+            template,
+            policy=self.policy,
             model=self.model,
             messages=[{
                 "role": "user",
@@ -53,9 +87,17 @@ User Query: {query}"""
             temperature=0,
             response_format={ "type": "json_object" }
         )
+        # The prompt depends on num_variants, so record it for rebuilding the prompt from the logs
+        record_metadata(cache_hit=cache_hit, num_variants=self.num_variants)
         
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
+        refined = result["refined_query"]
+        variants = [
+            v for v in result.get("variants", [])
+            if isinstance(v, str) and v.strip() and v != refined
+        ]
         return ReformulatedQuery(
-            refined_text=result["refined_query"],
-            keywords=result["keywords"]
+            refined_text=refined,
+            keywords=result["keywords"],
+            variants=list(dict.fromkeys(variants))[:self.num_variants]
         ) 
\ No newline at end of file
@@ -1,26 +1,42 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, TYPE_CHECKING
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 from qdrant_client.http.models import Filter, FieldCondition, MatchText
-from openai import OpenAI
 import numpy as np
-from ..models import SearchResult, Document
-from ..config import Settings
-from .base_component import BaseComponent
+import math
+import threading
+import uuid
+from collections import OrderedDict
+from ..models import SearchResult, Document, RetrievalProfile
+from .base_component import BaseComponent, record_metadata
+from .call_policy import CallPolicy, current_deadline
+from .embeddings import BaseEmbeddingProvider, OpenAIEmbeddingProvider
+from .shared_cache import SharedEmbeddingCache, SharedResultCache
+from .fusion import fuse_for_profile, reciprocal_rank_fusion
+if TYPE_CHECKING:
+    from .bm25 import BM25Index
 
 class BaseRetriever(BaseComponent):
     """Base class for retrieving relevant context"""
     def __init__(self):
         super().__init__(name="retriever")
     
-    def _execute(self, query: str, keywords: List[str]) -> List[SearchResult]:
+    def _execute(self, query: str, keywords: List[str],
+                 profile: Optional[RetrievalProfile] = None,
+                 variants: Optional[List[str]] = None) -> List[SearchResult]:
         """Execute retrieval"""
-        return self.retrieve(query, keywords)
+        return self.retrieve(query, keywords, profile, variants)
     
     @abstractmethod
-    def retrieve(self, query: str, keywords: List[str]) -> List[SearchResult]:
-        """Retrieve relevant context based on query and keywords."""
+    def retrieve(self, query: str, keywords: List[str],
+                 profile: Optional[RetrievalProfile] = None,
+                 variants: Optional[List[str]] = None) -> List[SearchResult]:
+        """Retrieve relevant context based on query and keywords.
+        
+        `profile` overrides the retriever's default search settings for this query.
+        `variants` are alternative phrasings of the query to search as well.
+        """
         pass
 
 class VectorRetriever(BaseRetriever):
@@ -28,46 +44,101 @@ class VectorRetriever(BaseRetriever):
         self,
         collection_name: str,
         embedding_model: str = "text-embedding-3-small",
-        url: Optional[str] = None
+        url: Optional[str] = None,
+        default_profile: Optional[RetrievalProfile] = None,
+        embedding_cache_size: int = 1024,
+        policy: Optional[CallPolicy] = None,
+        shared_embedding_cache: Optional[SharedEmbeddingCache] = None,
+        result_cache: Optional[SharedResultCache] = None,
+        keyword_index: Optional["BM25Index"] = None,
+        embedding_provider: Optional[BaseEmbeddingProvider] = None
     ):
         super().__init__()
-        settings = Settings()
+        self.default_profile = default_profile or RetrievalProfile()
+        self.policy = policy
+        
+        # Recent query embeddings, shared with other components (e.g. the embedding router)
+        self.embedding_cache_size = embedding_cache_size
+        self._embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._embedding_cache_lock = threading.Lock()
+        # Optional cross-process tiers behind the per-process LRU
+        self.shared_embedding_cache = shared_embedding_cache
+        self.result_cache = result_cache
         
-        self.client = QdrantClient(url=url)
-        self.openai_client = OpenAI(api_key=settings.openai_api_key)
-        self.embedding_model = embedding_model
+        # `location` accepts ":memory:" for an in-process instance as well as a URL
+        self.client = QdrantClient(location=url)
+        self.embedding_provider = embedding_provider or OpenAIEmbeddingProvider(embedding_model, policy)
+        self.embedding_model = self.embedding_provider.name
         self.collection_name = collection_name
         
-        # Create collection if it doesn't exist
-        self.client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=rest.VectorParams(
-                size=1536,  # OpenAI embedding dimension
-                distance=rest.Distance.COSINE
+        # BM25 keyword leg; without an index, keyword search falls back to Qdrant text matching
+        self.keyword_index = keyword_index
+        self.keyword_retriever = None
+        if keyword_index is not None:
+            from .bm25 import BM25Retriever
+            self.keyword_retriever = BM25Retriever(keyword_index, self._fetch_points, self.default_profile)
+        
+        # Create collection if it doesn't exist, sized for the embedding provider
+        dimension = self.embedding_provider.dimension
+        if not self.client.collection_exists(collection_name):
+            self.client.create_collection(
+                collection_name=collection_name,
+                vectors_config=rest.VectorParams(
+                    size=dimension,
+                    distance=rest.Distance.COSINE
+                )
             )
-        )
+        else:
+            existing = self.client.get_collection(collection_name).config.params.vectors
+            if isinstance(existing, rest.VectorParams) and existing.size != dimension:
+                raise ValueError(
+                    f"Collection {collection_name} holds {existing.size}-dimensional vectors, but "
+                    f"{self.embedding_provider.name} produces {dimension}; use another collection"
+                )
     
-    def retrieve(self, query: str, keywords: List[str]) -> List[SearchResult]:
+    def retrieve(self, query: str, keywords: List[str],
+                 profile: Optional[RetrievalProfile] = None,
+                 variants: Optional[List[str]] = None) -> List[SearchResult]:
         """Combine semantic and keyword search results."""
-        semantic_results =  self.semantic_search(query)
-        keyword_results =  self.keyword_search(keywords)
-        return self.rerank(semantic_results, keyword_results)
+        profile = profile or self.default_profile
+        # Cache under the full query set, so the same query with other variants isn't a hit
+        cache_query = "\n".join([query, *(variants or [])])
+        if self.result_cache:
+            cached = self.result_cache.get(self.collection_name, cache_query, keywords, profile)
+            record_metadata(result_cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+        
+        if variants:
+            semantic_results = self.multi_query_search([query, *variants], profile)
+        else:
+            semantic_results = self.semantic_search(query, profile)
+        keyword_results =  self.keyword_search(keywords, profile)
+        results = fuse_for_profile({"semantic": semantic_results, "keyword": keyword_results}, profile)
+        if self.result_cache:
+            self.result_cache.set(self.collection_name, cache_query, keywords, profile, results)
+        return results
     
-    def add_documents(self, documents: List[Document]) -> None:
-        # Get embeddings for all texts
-        embeddings = [self._get_embedding(doc.text) for doc in documents]
+    def add_documents(self, documents: List[Document]) -> int:
+        """Embed and upsert documents. Returns the number of embedding tokens used."""
+        if not documents:
+            return 0
+        
+        # Get embeddings for all texts in a single request
+        embeddings, tokens = self._get_embeddings([doc.text for doc in documents])
         
         # Prepare points for Qdrant
+        point_ids = [self._point_id(doc) for doc in documents]
         points = [
             rest.PointStruct(
-                id=i,
+                id=point_id,
                 vector=embedding.tolist(),
                 payload={
                     "text": doc.text,
                     **(doc.metadata or {})
                 }
             )
-            for i, (doc, embedding) in enumerate(zip(documents, embeddings))
+            for point_id, doc, embedding in zip(point_ids, documents, embeddings)
         ]
         
         # Upload to Qdrant
@@ -75,26 +146,128 @@ class VectorRetriever(BaseRetriever):
             collection_name=self.collection_name,
             points=points
         )
+        if self.keyword_index is not None:
+            self.keyword_index.add_many([(point_id, doc.text) for point_id, doc in zip(point_ids, documents)])
+        return tokens
     
-    def semantic_search(self, query: str, top_k: int = 5) -> List[SearchResult]:
-        query_vector = self._get_embedding(query)
+    def rebuild_keyword_index(self, index: Optional["BM25Index"] = None, batch_size: int = 1000) -> int:
+        """Index every document in the collection into `index` (the retriever's own by default).
         
-        results = self.client.search(
+        Returns the number of documents indexed.
+        """
+        index = index if index is not None else self.keyword_index
+        if index is None:
+            raise ValueError("No keyword index to rebuild")
+        count = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=["text"]
+            )
+            index.add_many([(str(point.id), point.payload["text"]) for point in points])
+            count += len(points)
+            if offset is None:
+                return count
+    
+    def merge_duplicates(self, canonical_id: str, duplicate_ids: List[str]) -> None:
+        """Record near-duplicates on the canonical document's `duplicate_ids` payload."""
+        point_id = self._point_id(Document(text="", id=canonical_id))
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=[point_id],
+            with_payload=["duplicate_ids"]
+        )
+        if not points:
+            return
+        existing = (points[0].payload or {}).get("duplicate_ids", [])
+        self.client.set_payload(
             collection_name=self.collection_name,
-            query_vector=query_vector,
-            limit=top_k
+            payload={"duplicate_ids": existing + [d for d in duplicate_ids if d not in existing]},
+            points=[point_id]
         )
+    
+    def semantic_search(self, query: str,
+                        profile: Optional[RetrievalProfile] = None) -> List[SearchResult]:
+        profile = profile or self.default_profile
+        if profile.semantic_top_k <= 0:
+            return []
+        query_vector = self.embed_query(query)
         
+        results = self.client.query_points(
+            collection_name=self.collection_name,
+            query=query_vector,
+            limit=profile.semantic_top_k,
+            search_params=self._search_params(profile),
+            score_threshold=profile.score_threshold,
+            with_payload=self._payload_selector(profile),
+            timeout=self._qdrant_timeout()
+        ).points
+        
+        return [self._to_result(hit) for hit in results]
+    
+    def multi_query_search(self, queries: List[str],
+                           profile: Optional[RetrievalProfile] = None) -> List[SearchResult]:
+        """Semantic search for several phrasings of a query, fused with reciprocal rank fusion.
+        
+        Uncached queries are embedded in one request and all queries are
+        searched in one Qdrant batch call, so extra variants add no round trips.
+        """
+        profile = profile or self.default_profile
+        if profile.semantic_top_k <= 0:
+            return []
+        vectors = self.embed_queries(queries)
+        search_params = self._search_params(profile)
+        payload = self._payload_selector(profile)
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[
+                rest.QueryRequest(
+                    query=vector.tolist(),
+                    limit=profile.semantic_top_k,
+                    params=search_params,
+                    score_threshold=profile.score_threshold,
+                    with_payload=payload
+                )
+                for vector in vectors
+            ],
+            timeout=self._qdrant_timeout()
+        )
+        rankings = [[self._to_result(hit) for hit in response.points] for response in responses]
+        return reciprocal_rank_fusion(rankings, profile.semantic_top_k, profile.rrf_k)
+    
+    def _fetch_points(self, point_ids: List[str], profile: RetrievalProfile) -> List[Optional[SearchResult]]:
+        """Payloads for keyword hits in one request, in the order asked for."""
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=point_ids,
+            with_payload=self._payload_selector(profile),
+            timeout=self._qdrant_timeout()
+        )
+        by_id = {str(point.id): point for point in points}
         return [
-            SearchResult(
-                text=hit.payload["text"],
-                metadata={k: v for k, v in hit.payload.items() if k != "text"},
-                score=hit.score
-            )
-            for hit in results
+            self._to_result(by_id[point_id]) if point_id in by_id else None
+            for point_id in point_ids
         ]
     
-    def keyword_search(self, keywords: List[str], top_k: int = 5) -> List[SearchResult]:
+    @staticmethod
+    def _to_result(hit) -> SearchResult:
+        return SearchResult(
+            text=hit.payload["text"],
+            metadata={k: v for k, v in hit.payload.items() if k != "text"},
+            score=getattr(hit, "score", 0.0),
+            id=str(hit.id)
+        )
+    
+    def keyword_search(self, keywords: List[str],
+                       profile: Optional[RetrievalProfile] = None) -> List[SearchResult]:
+        profile = profile or self.default_profile
+        if profile.keyword_top_k <= 0 or not keywords:
+            return []
+        if self.keyword_retriever is not None:
+            return self.keyword_retriever.retrieve("", keywords, profile)
         keyword_conditions = [
             FieldCondition(
                 key="text",
@@ -108,35 +281,111 @@ class VectorRetriever(BaseRetriever):
             scroll_filter=Filter(
                 should=keyword_conditions
             ),
-            limit=top_k
+            limit=profile.keyword_top_k,
+            with_payload=self._payload_selector(profile),
+            timeout=self._qdrant_timeout()
         ))[0]
         
-        return [
-            SearchResult(
-                text=point.payload["text"],
-                metadata={k: v for k, v in point.payload.items() if k != "text"},
-                score=1.0
-            )
-            for point in results
-        ]
+        # Unranked text matches, so every hit gets the same score
+        results = [self._to_result(point) for point in results]
+        for result in results:
+            result.score = 1.0
+        return results
     
-    def _get_embedding(self, text: str) -> np.ndarray:
-        response = self.openai_client.embeddings.create(
-            model=self.embedding_model,
-            input=text
+    @staticmethod
+    def _search_params(profile: RetrievalProfile) -> Optional[rest.SearchParams]:
+        if profile.hnsw_ef is None and not profile.exact and profile.rescore is None:
+            return None
+        return rest.SearchParams(
+            hnsw_ef=profile.hnsw_ef,
+            exact=profile.exact,
+            quantization=(
+                rest.QuantizationSearchParams(rescore=profile.rescore)
+                if profile.rescore is not None else None
+            )
         )
-        return np.array(response.data[0].embedding)
     
-    def rerank(self, semantic_results: List[SearchResult], 
-                      keyword_results: List[SearchResult]) -> List[SearchResult]:
-        """Merge results using a simple score-based approach."""
-        merged = {}
-        
-        for result in semantic_results:
-            merged[result.text] = result
+    @staticmethod
+    def _payload_selector(profile: RetrievalProfile):
+        """The text is always needed; other payload fields only when selected."""
+        if profile.payload_fields is None:
+            return True
+        return ["text", *profile.payload_fields]
+    
+    @staticmethod
+    def _qdrant_timeout() -> Optional[int]:
+        """Whole seconds left on the current deadline; Qdrant only takes integer timeouts."""
+        deadline = current_deadline()
+        if deadline is None:
+            return None
+        deadline.check("vector search")
+        return max(1, math.ceil(deadline.remaining()))
+    
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed a query, reusing the embedding if this text was embedded recently."""
+        with self._embedding_cache_lock:
+            if text in self._embedding_cache:
+                self._embedding_cache.move_to_end(text)
+                return self._embedding_cache[text]
         
-        for result in keyword_results:
-            if result.text not in merged or result.score > merged[result.text].score:
-                merged[result.text] = result
+        embedding = None
+        if self.shared_embedding_cache:
+            embedding = self.shared_embedding_cache.get(text)
+        if embedding is None:
+            embedding = self._get_embedding(text)
+            if self.shared_embedding_cache:
+                self.shared_embedding_cache.set(text, embedding)
+        if self.embedding_cache_size > 0:
+            with self._embedding_cache_lock:
+                self._embedding_cache[text] = embedding
+                while len(self._embedding_cache) > self.embedding_cache_size:
+                    self._embedding_cache.popitem(last=False)
+        return embedding
+    
+    def embed_queries(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed several queries, fetching every cache miss in a single request."""
+        embeddings: Dict[str, np.ndarray] = {}
+        with self._embedding_cache_lock:
+            for text in texts:
+                if text in self._embedding_cache:
+                    self._embedding_cache.move_to_end(text)
+                    embeddings[text] = self._embedding_cache[text]
+        if self.shared_embedding_cache:
+            for text in texts:
+                if text not in embeddings:
+                    shared = self.shared_embedding_cache.get(text)
+                    if shared is not None:
+                        embeddings[text] = shared
         
-        return sorted(merged.values(), key=lambda x: x.score, reverse=True) 
+        missing = [text for text in dict.fromkeys(texts) if text not in embeddings]
+        if missing:
+            fetched, _ = self._get_embeddings(missing)
+            for text, embedding in zip(missing, fetched):
+                embeddings[text] = embedding
+                if self.shared_embedding_cache:
+                    self.shared_embedding_cache.set(text, embedding)
+        if self.embedding_cache_size > 0:
+            with self._embedding_cache_lock:
+                for text in texts:
+                    self._embedding_cache[text] = embeddings[text]
+                    self._embedding_cache.move_to_end(text)
+                while len(self._embedding_cache) > self.embedding_cache_size:
+                    self._embedding_cache.popitem(last=False)
+        return [embeddings[text] for text in texts]
+    
+    def _get_embedding(self, text: str) -> np.ndarray:
+        return self.embedding_provider.embed([text])[0][0]
+    
+    def _get_embeddings(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        """Embed a batch of texts with the provider. Returns (embeddings, total_tokens)."""
+        return self.embedding_provider.embed(texts)
+    
+    @staticmethod
+    def _point_id(doc: Document) -> str:
+        """Qdrant point ids must be UUIDs; derive a stable one from the document id."""
+        if doc.id is None:
+            return str(uuid.uuid4())
+        try:
+            return str(uuid.UUID(str(doc.id)))
+        except ValueError:
+            return str(uuid.uuid5(uuid.NAMESPACE_URL, str(doc.id)))
@@ -0,0 +1,216 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+import time
+import numpy as np
+from ..models import SearchResult, RetrievalProfile
+from .base_component import BaseComponent, record_metadata
+from .reformulator import ReformulatedQuery
+from .fusion import reciprocal_rank_fusion
+
+@dataclass
+class SessionTurn:
+    """One answered query of a conversation, with what it retrieved"""
+    query: str
+    embedding: np.ndarray           # Normalized embedding of `query`
+    reformulated: ReformulatedQuery
+    results: List[SearchResult]
+    profile: Optional[RetrievalProfile] = None  # Retrieval profile the results were found with
+    created_at: float = field(default_factory=time.time)
+
+    def nbytes(self) -> int:
+        """Approximate memory footprint, counting text lengths rather than object overhead."""
+        texts = len(self.query) + len(self.reformulated.refined_text)
+        texts += sum(len(keyword) for keyword in self.reformulated.keywords)
+        texts += sum(len(variant) for variant in self.reformulated.variants)
+        texts += sum(len(result.text) + len(repr(result.metadata)) for result in self.results)
+        return self.embedding.nbytes + texts
+
+@dataclass
+class SessionMatch:
+    """How a query relates to its session's earlier turns.
+
+    `mode` is "new" (retrieve from scratch), "extend" (retrieve for the raw
+    query and merge with the prior context) or "reuse" (use the prior
+    context as is). `reformulated` and `context` come from the most similar
+    earlier turn.
+    """
+    mode: str = "new"
+    similarity: float = 0.0
+    reformulated: Optional[ReformulatedQuery] = None
+    context: List[SearchResult] = field(default_factory=list)
+
+class SessionStore:
+    """Recent turns per session, bounded by TTL, session count and memory.
+
+    Sessions expire `ttl_seconds` after their last use. Beyond `max_sessions`
+    or `max_bytes` (see SessionTurn.nbytes) the least recently used sessions
+    are dropped. Each session keeps its last `max_turns` turns.
+    """
+    def __init__(self, ttl_seconds: Optional[float] = 1800, max_sessions: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024, max_turns: int = 8):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        # session id -> (last access, turns); least recently used first
+        self._sessions: "OrderedDict[str, Tuple[float, List[SessionTurn]]]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def turns(self, session_id: str) -> List[SessionTurn]:
+        """The session's turns, oldest first; empty if unknown or expired."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def append(self, session_id: str, turn: SessionTurn) -> None:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            turns = self._sessions.pop(session_id, (now, []))[1]
+            turns = [*turns, turn][-self.max_turns:]
+            self._sessions[session_id] = (now, turns)
+            size = sum(t.nbytes() for t in turns)
+            self._total_bytes += size - self._bytes.get(session_id, 0)
+            self._bytes[session_id] = size
+            while len(self._sessions) > 1 and (
+                len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes
+            ):
+                self._drop(next(iter(self._sessions)))
+                self.evictions += 1
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._drop(session_id)
+            return True
+
+    def _expire(self, now: float) -> None:
+        # Ordered by last access, so expired sessions are all at the front
+        while self._sessions and self.ttl_seconds is not None:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl_seconds:
+                break
+            self._drop(session_id)
+
+    def _drop(self, session_id: str) -> None:
+        del self._sessions[session_id]
+        self._total_bytes -= self._bytes.pop(session_id, 0)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._expire(time.time())
+            return {
+                "sessions": len(self._sessions),
+                "turns": sum(len(turns) for _, turns in self._sessions.values()),
+                "bytes": self._total_bytes,
+                "evictions": self.evictions
+            }
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SessionLookup(BaseComponent):
+    """Matches a query against its session's earlier turns by embedding similarity.
+
+    A follow-up at least `reuse_threshold` similar to an earlier query
+    reuses that turn's context without reformulation or retrieval; one at
+    least `extend_threshold` similar skips reformulation and extends the
+    earlier context with a search for the raw query. Only turns retrieved
+    with the same retrieval profile are matched. `embed` should be cached
+    (e.g. VectorRetriever.embed_query), since SessionContext embeds the query
+    again to record the turn.
+    """
+    def __init__(self, store: SessionStore, embed: Callable[[str], np.ndarray],
+                 reuse_threshold: float = 0.92, extend_threshold: float = 0.75):
+        super().__init__(name="session_lookup")
+        self.store = store
+        self.embed = embed
+        self.reuse_threshold = reuse_threshold
+        self.extend_threshold = extend_threshold
+
+    def _execute(self, query: str, session_id: Optional[str] = None,
+                 profile: Optional[RetrievalProfile] = None) -> SessionMatch:
+        turns = self.store.turns(session_id) if session_id else []
+        record_metadata(session_turns=len(turns))
+        turns = [turn for turn in turns if turn.profile == profile]
+        if not turns:
+            record_metadata(session_mode="new")
+            return SessionMatch()
+
+        similarities = np.stack([turn.embedding for turn in turns]) @ _normalize(self.embed(query))
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity >= self.reuse_threshold:
+            mode = "reuse"
+        elif similarity >= self.extend_threshold:
+            mode = "extend"
+        else:
+            mode = "new"
+        record_metadata(session_mode=mode, session_similarity=similarity)
+        if mode == "new":
+            return SessionMatch(similarity=similarity)
+        return SessionMatch(mode, similarity, turns[best].reformulated, list(turns[best].results))
+
+class SessionContext(BaseComponent):
+    """Builds a query's context from the session match and records the turn.
+
+    `retrieved` is the full retrieval result for "new" queries and
+    `followup` the raw-query search for "extend" ones; the other is None.
+    Extended context is the earlier context fused with the follow-up
+    results by RRF. Reused context is not recorded again.
+    """
+    def __init__(self, lookup: SessionLookup):
+        super().__init__(name="session_context")
+        self.lookup = lookup
+
+    def _execute(self, query: str, session_id: Optional[str], match: SessionMatch,
+                 retrieved: Optional[List[SearchResult]] = None,
+                 followup: Optional[List[SearchResult]] = None,
+                 reformulated: Optional[ReformulatedQuery] = None,
+                 profile: Optional[RetrievalProfile] = None) -> List[SearchResult]:
+        record_metadata(session_mode=match.mode)
+        if match.mode == "reuse":
+            return match.context
+        if match.mode == "extend":
+            followup = followup or []
+            context = reciprocal_rank_fusion(
+                [followup, match.context], limit=max(len(followup), len(match.context)), merge_scores=True
+            )
+            reformulated = match.reformulated
+        else:
+            context = retrieved or []
+        if session_id and reformulated is not None:
+            self.lookup.store.append(session_id, SessionTurn(
+                query=query,
+                embedding=_normalize(self.lookup.embed(query)),
+                reformulated=reformulated,
+                results=context,
+                profile=profile
+            ))
+        return context
+
+def create_session_lookup(settings, embed: Callable[[str], np.ndarray]) -> Optional[SessionLookup]:
+    """Build the session lookup from the session_* settings, or None if sessions are disabled."""
+    if not settings.sessions_enabled:
+        return None
+    store = SessionStore(
+        settings.session_ttl_seconds,
+        settings.session_max_sessions,
+        int(settings.session_max_mb * 1024 * 1024),
+        settings.session_max_turns
+    )
+    return SessionLookup(store, embed, settings.session_reuse_threshold, settings.session_extend_threshold)
@@ -0,0 +1,260 @@
+from contextlib import contextmanager
+from dataclasses import asdict, astuple
+from typing import Any, Dict, List, Optional
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from ..models import SearchResult, RetrievalProfile
+from .llm_cache import BaseLLMCache
+
+# File header: magic, layout version, slot size, slot count, ways per set
+_FILE_HEADER = struct.Struct("<8sIIII")
+_MAGIC = b"RAGSHMC1"
+_VERSION = 1
+_HEADER_SIZE = 64
+# Slot header: sequence (odd while being written), key digest, created, value length, value crc32
+_SLOT_HEADER = struct.Struct("<I32sdII")
+_SLOT_HEADER_SIZE = 64
+_SEQ = struct.Struct("<I")
+
+class SharedMemoryCache:
+    """Fixed-size key/value cache in a memory-mapped file shared by processes.
+
+    Every uvicorn worker (or any other process) that opens the same `path`
+    sees the same entries. The file is a set-associative hash table of
+    fixed-size slots; when a set is full the oldest entry is replaced.
+
+    Reads take no locks. Each slot carries a sequence number that writers make
+    odd while they update it (a seqlock), plus a crc32 of the value: a read
+    that overlaps a write sees a changed sequence or a bad checksum and is
+    treated as a miss. Writes are serialized across processes with `flock`,
+    so this is POSIX-only.
+    """
+    def __init__(self, path: str, max_entries: int = 10000, slot_size: int = 4096,
+                 ttl_seconds: Optional[float] = None, ways: int = 8):
+        if slot_size <= _SLOT_HEADER_SIZE:
+            raise ValueError(f"slot_size must be larger than {_SLOT_HEADER_SIZE} bytes")
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.ways = ways
+        self.slot_size = slot_size
+        self.num_slots = max(ways, -(-max_entries // ways) * ways)
+        self.max_value_size = slot_size - _SLOT_HEADER_SIZE
+        self.hits = 0
+        self.misses = 0
+        self.oversized = 0
+        self._lock = threading.Lock()
+        # Counters only; separate from the write lock so reads never wait on writers
+        self._stats_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = _HEADER_SIZE + self.num_slots * slot_size
+        with self._write_lock():
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _FILE_HEADER.pack(
+                    _MAGIC, _VERSION, slot_size, self.num_slots, ways
+                ), 0)
+            else:
+                self._check_layout()
+        self._mm = mmap.mmap(self._fd, size)
+
+    def _check_layout(self) -> None:
+        magic, version, slot_size, num_slots, ways = _FILE_HEADER.unpack(
+            os.pread(self._fd, _FILE_HEADER.size, 0)
+        )
+        if (magic, version, slot_size, num_slots, ways) != (
+            _MAGIC, _VERSION, self.slot_size, self.num_slots, self.ways
+        ):
+            raise ValueError(
+                f"{self.path} has a different cache layout; delete it or use matching settings"
+            )
+
+    @contextmanager
+    def _write_lock(self):
+        # flock excludes other processes; the thread lock excludes threads sharing our fd
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return hashlib.sha256(key.encode()).digest()
+
+    def _set_offsets(self, digest: bytes) -> range:
+        first = (int.from_bytes(digest[:8], "little") % (self.num_slots // self.ways)) * self.ways
+        return range(
+            _HEADER_SIZE + first * self.slot_size,
+            _HEADER_SIZE + (first + self.ways) * self.slot_size,
+            self.slot_size
+        )
+
+    def _read_slot(self, offset: int, digest: bytes) -> Optional[bytes]:
+        """Value stored under `digest` at `offset`, or None if absent, expired or torn."""
+        for _ in range(3):
+            seq, slot_digest, created, length, crc = _SLOT_HEADER.unpack_from(self._mm, offset)
+            if seq & 1:
+                continue  # Being written; retry
+            if slot_digest != digest or length == 0:
+                return None
+            start = offset + _SLOT_HEADER_SIZE
+            value = self._mm[start:start + length]
+            if _SEQ.unpack_from(self._mm, offset)[0] != seq or zlib.crc32(value) != crc:
+                continue
+            if self._expired(created):
+                return None
+            return value
+        return None
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[bytes]:
+        digest = self._digest(key)
+        for offset in self._set_offsets(digest):
+            value = self._read_slot(offset, digest)
+            if value is not None:
+                with self._stats_lock:
+                    self.hits += 1
+                return value
+        with self._stats_lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: bytes) -> bool:
+        """Store `value`; returns False if it is too large for a slot."""
+        if len(value) > self.max_value_size:
+            with self._stats_lock:
+                self.oversized += 1
+            return False
+        digest = self._digest(key)
+        with self._write_lock():
+            offset = self._choose_slot(digest)
+            seq = _SEQ.unpack_from(self._mm, offset)[0]
+            _SEQ.pack_into(self._mm, offset, seq + 1)
+            start = offset + _SLOT_HEADER_SIZE
+            self._mm[start:start + len(value)] = value
+            _SLOT_HEADER.pack_into(
+                self._mm, offset, seq + 1, digest, time.time(), len(value), zlib.crc32(value)
+            )
+            _SEQ.pack_into(self._mm, offset, seq + 2)
+        return True
+
+    def _choose_slot(self, digest: bytes) -> int:
+        """Same key, else an empty or expired slot, else the oldest in the set."""
+        oldest, oldest_created = None, float("inf")
+        for offset in self._set_offsets(digest):
+            _, slot_digest, created, length, _ = _SLOT_HEADER.unpack_from(self._mm, offset)
+            if slot_digest == digest or length == 0 or self._expired(created):
+                return offset
+            if created < oldest_created:
+                oldest, oldest_created = offset, created
+        return oldest
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            hits, misses, oversized = self.hits, self.misses, self.oversized
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "oversized": oversized,
+            "slots": self.num_slots
+        }
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+class SharedMemoryLLMCache(BaseLLMCache):
+    """BaseLLMCache backed by a SharedMemoryCache, for multi-worker deployments"""
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None,
+                 max_entries: int = 10000, slot_size: int = 4096):
+        super().__init__(ttl_seconds, max_entries)
+        self.store = SharedMemoryCache(path, max_entries, slot_size, ttl_seconds)
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.store.get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return value.decode()
+
+    def set(self, key: str, value: str) -> None:
+        self.store.set(key, value.encode())
+
+class SharedEmbeddingCache:
+    """Query embeddings stored as float32 in a SharedMemoryCache, keyed by model and text"""
+    def __init__(self, path: str, model: str, max_entries: int = 16384, dimension: int = 1536):
+        self.model = model
+        self.store = SharedMemoryCache(path, max_entries, _SLOT_HEADER_SIZE + dimension * 4)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        value = self.store.get(f"{self.model}\0{text}")
+        return None if value is None else np.frombuffer(value, dtype=np.float32)
+
+    def set(self, text: str, embedding: np.ndarray) -> None:
+        self.store.set(f"{self.model}\0{text}", np.asarray(embedding, dtype=np.float32).tobytes())
+
+class SharedResultCache:
+    """Retrieval results keyed by query, keywords and profile, for a limited time.
+
+    Results go stale as documents are added, so this is opt-in and should use
+    a short TTL.
+    """
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int = 4096,
+                 slot_size: int = 65536):
+        self.store = SharedMemoryCache(path, max_entries, slot_size, ttl_seconds)
+
+    @staticmethod
+    def _key(collection: str, query: str, keywords: List[str], profile: RetrievalProfile) -> str:
+        return json.dumps([collection, query, keywords, astuple(profile)], sort_keys=True)
+
+    def get(self, collection: str, query: str, keywords: List[str],
+            profile: RetrievalProfile) -> Optional[List[SearchResult]]:
+        value = self.store.get(self._key(collection, query, keywords, profile))
+        if value is None:
+            return None
+        return [SearchResult(**r) for r in json.loads(value)]
+
+    def set(self, collection: str, query: str, keywords: List[str],
+            profile: RetrievalProfile, results: List[SearchResult]) -> None:
+        self.store.set(
+            self._key(collection, query, keywords, profile),
+            json.dumps([asdict(r) for r in results]).encode()
+        )
+
+def create_shared_caches(settings, dimension: int = 1536,
+                         embedding_model: Optional[str] = None) -> Dict[str, Any]:
+    """Embedding and retrieval-result caches enabled in settings, as VectorRetriever kwargs.
+
+    Pass the embedding provider's `dimension` and `name` as `embedding_model`
+    when it is not the configured OpenAI model.
+    """
+    caches: Dict[str, Any] = {}
+    if settings.shared_embedding_cache:
+        caches["shared_embedding_cache"] = SharedEmbeddingCache(
+            os.path.join(settings.shared_cache_dir, "embeddings.cache"),
+            embedding_model or settings.embedding_model, settings.shared_embedding_cache_entries, dimension
+        )
+    if settings.retrieval_cache_ttl_seconds:
+        caches["result_cache"] = SharedResultCache(
+            os.path.join(settings.shared_cache_dir, "retrieval.cache"),
+            settings.retrieval_cache_ttl_seconds, settings.retrieval_cache_max_entries
+        )
+    return caches
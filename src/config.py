@@ -1,4 +1,6 @@
+from typing import Any, Dict, List, Optional
 from pydantic_settings import BaseSettings
+from .models import RetrievalProfile
 
 class Settings(BaseSettings):
     # OpenAI
@@ -14,9 +16,118 @@ class Settings(BaseSettings):
     completion_model: str = "gpt-4-turbo-preview"
     answer_model: str = "gpt-4-turbo-preview"
     embedding_model: str = "text-embedding-3-small"
+    embedding_provider: str = "openai"  # "openai", "hashing" (local feature hashing) or "static" (local .npz model)
+    embedding_dimension: Optional[int] = None  # Hashing size, or shortened OpenAI vectors; None uses the default
+    embedding_hashing_ngrams: int = 1
+    embedding_model_path: Optional[str] = None  # .npz file for the static provider
+    reformulator_num_variants: int = 0  # Extra query phrasings searched together and fused with RRF
+    
+    # LLM response cache for the temperature-0 components (router, reformulator, completion checker)
+    llm_cache_backend: str = "none"  # "none", "memory", "sqlite" or "shared"
+    llm_cache_path: str = "llm_cache.sqlite3"
+    llm_cache_ttl_seconds: Optional[float] = 86400
+    llm_cache_max_entries: int = 10000
+    
+    # Caches in memory-mapped files under shared_cache_dir, shared by all worker processes
+    shared_cache_dir: str = "cache"
+    shared_embedding_cache: bool = False
+    shared_embedding_cache_entries: int = 16384
+    retrieval_cache_ttl_seconds: Optional[float] = None  # Caching retrieval results is opt-in
+    retrieval_cache_max_entries: int = 4096
+    
+    # Router Settings
+    router_strategy: str = "llm"  # "llm" or "embedding"
+    router_confidence_threshold: float = 0.6  # Below this the embedding router asks the LLM
+    router_model_path: Optional[str] = None  # Trained embedding router model (.npz)
     
     # RAG Settings
     completion_threshold: float = 0.7
+    completion_strategy: str = "llm"  # "llm" or "adaptive" (skip the LLM when retrieval scores decide)
+    completion_model_path: Optional[str] = None  # Calibrated adaptive checker model (.npz)
+    completion_fast_path_confidence: float = 0.95  # Predicted probability needed to skip the LLM
+    completion_shadow_rate: float = 0.05  # Fraction of skippable checks still sent to the LLM
+    workflow_engine: str = "linear"  # "linear" (RAGWorkflow) or "dag" (router and reformulator in parallel)
+    
+    # Conversation sessions: follow-ups reuse or extend the context of similar earlier turns
+    sessions_enabled: bool = True
+    session_ttl_seconds: Optional[float] = 1800  # Since last use; None keeps sessions until evicted
+    session_max_sessions: int = 10000
+    session_max_mb: float = 64  # Approximate memory budget across all sessions
+    session_max_turns: int = 8
+    session_reuse_threshold: float = 0.92  # Query similarity to reuse an earlier turn's context
+    session_extend_threshold: float = 0.75  # Query similarity to extend it with a new search
+    
+    # Deadlines and per-step call policies. Step keys: router, reformulator, retriever,
+    # completion_checker, answer_generator. Fields: max_attempts, base_delay_s, max_delay_s,
+    # attempt_timeout_s, hedge, hedge_quantile, hedge_min_samples, hedge_min_delay_s.
+    # Hedging is opt-in, since every backup is an extra paid request.
+    request_timeout_seconds: Optional[float] = 30.0  # End-to-end budget for /query; None disables
+    step_call_policies: Dict[str, Dict[str, Any]] = {
+        "router": {"max_attempts": 2, "hedge": False},
+        "reformulator": {"max_attempts": 2, "hedge": False},
+        "retriever": {"max_attempts": 3},
+        "completion_checker": {"max_attempts": 2, "hedge": False},
+        "answer_generator": {"max_attempts": 2},
+    }
+    
+    # Admission control for /query: adaptive concurrency limit plus bounded per-priority queues.
+    # Opt-in, since it answers overload with 429/503 instead of queueing. Priorities above
+    # default_priority require the admin token.
+    admission_enabled: bool = False
+    admission_limiter: str = "gradient"  # "gradient" or "aimd"
+    admission_initial_limit: int = 16
+    admission_min_limit: int = 2
+    admission_max_limit: int = 128
+    admission_latency_target_seconds: Optional[float] = 10.0  # AIMD backs off above this
+    admission_priorities: List[str] = ["high", "normal", "low"]  # Highest first
+    admission_queue_sizes: Dict[str, int] = {"high": 64, "normal": 32, "low": 8}
+    admission_queue_timeout_seconds: float = 5.0
+    default_priority: str = "normal"
+    
+    # Retrieval profiles, selected per query by name. Fields are RetrievalProfile's.
+    retrieval_profiles: Dict[str, Dict[str, Any]] = {
+        "default": {},
+        "fast": {"semantic_top_k": 3, "keyword_top_k": 3, "hnsw_ef": 32, "payload_fields": []},
+        "accurate": {"semantic_top_k": 10, "keyword_top_k": 10, "hnsw_ef": 256, "rescore": True},
+    }
+    default_retrieval_profile: str = "default"
+    
+    # BM25 keyword index for the keyword leg; None falls back to Qdrant text matching
+    keyword_index_path: Optional[str] = None
+    keyword_index_merge_threshold: int = 10000  # Delta documents before repacking and saving
+    keyword_index_sync_interval_seconds: float = 30.0  # Writer saves new documents, readers reload
+    
+    # Logging
+    log_dir: str = "logs"
+    log_compaction_interval_seconds: Optional[float] = None  # Compact in the API process; None disables
+    log_compaction_min_age_hours: float = 1.0
+    log_retention_days: Optional[float] = 30
+    log_max_size_mb: Optional[float] = None
+    
+    # Request profiling around workflow execution; results are served by the /admin endpoints
+    admin_token: Optional[str] = None  # Required by /admin and the X-Profile header; None disables both
+    profiling_sample_rate: float = 0.0  # Fraction of /query requests to profile
+    profiling_mode: str = "sampling"  # "sampling" (stack samples) or "cprofile" (deterministic)
+    profiling_interval_ms: float = 5.0
+    profiling_dir: str = "profiles"
+    profiling_max_profiles: int = 100
+    
+    # Ingestion Settings
+    ingestion_workers: int = 1
+    ingestion_batch_size: int = 64
+    ingestion_max_queued_jobs: int = 100
+    ingestion_jobs_path: Optional[str] = "ingestion_jobs.sqlite3"  # Job status shared by all workers; None keeps it per process
+    dedup_mode: str = "off"  # "off", "skip" or "merge" near-duplicates before embedding
+    dedup_threshold: float = 0.85  # Estimated Jaccard similarity of word shingles
+    dedup_num_perm: int = 128
+    dedup_index_path: str = "dedup_index.sqlite3"
     
     class Config:
-        env_file = ".env" 
\ No newline at end of file
+        env_file = ".env"
+    
+    def get_retrieval_profile(self, name: Optional[str] = None) -> RetrievalProfile:
+        """Build the named retrieval profile (the default one if no name is given)."""
+        name = name or self.default_retrieval_profile
+        if name not in self.retrieval_profiles:
+            raise ValueError(f"Unknown retrieval profile: {name}")
+        return RetrievalProfile(**self.retrieval_profiles[name]) 
\ No newline at end of file
@@ -2,5 +2,6 @@ from .base import BaseEvaluator
 from .llm_evaluator import LLMEvaluator
 from .manual_evaluator import ManualEvaluator
 from .script_evaluator import ScriptEvaluator
+from .runner import EvaluationRunner
 
-__all__ = ['BaseEvaluator', 'LLMEvaluator', 'ManualEvaluator', 'ScriptEvaluator'] 
\ No newline at end of file
+__all__ = ['BaseEvaluator', 'LLMEvaluator', 'ManualEvaluator', 'ScriptEvaluator', 'EvaluationRunner'] 
\ No newline at end of file
@@ -1,12 +1,13 @@
 from typing import Dict, Any
-from openai import OpenAI
+from openai import AsyncOpenAI
+import json
 from .base import BaseEvaluator, EvaluationResult
 from ..config import Settings
 
 class LLMEvaluator(BaseEvaluator):
     def __init__(self, model: str = "gpt-4-turbo-preview"):
         settings = Settings()
-        self.client = OpenAI(api_key=settings.openai_api_key)
+        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
         self.model = model
         
         # Component-specific evaluation prompts
@@ -30,19 +31,63 @@ class LLMEvaluator(BaseEvaluator):
                 Input: {input}
                 Output: {output}
                 
+                Provide:
+                1. Score (0-1)
+                2. Detailed feedback
+                Return as JSON: {{"score": float, "feedback": "string"}}
+                """,
+            "retriever": """Evaluate the retrieved context. Consider:
+                1. Are the results relevant to the query?
+                2. Is anything obviously needed missing or duplicated?
+                
+                Input: {input}
+                Output: {output}
+                
+                Provide:
+                1. Score (0-1)
+                2. Detailed feedback
+                Return as JSON: {{"score": float, "feedback": "string"}}
+                """,
+            "completion_checker": """Evaluate the completion check. Consider:
+                1. Does the score reflect whether the context can answer the query?
+                
+                Input: {input}
+                Output: {output}
+                
+                Provide:
+                1. Score (0-1)
+                2. Detailed feedback
+                Return as JSON: {{"score": float, "feedback": "string"}}
+                """,
+            "answer_generator": """Evaluate the generated answer. Consider:
+                1. Is the answer correct and supported by the context?
+                2. Are the citations accurate quotes from the context?
+                
+                Input: {input}
+                Output: {output}
+                
                 Provide:
                 1. Score (0-1)
                 2. Detailed feedback
                 Return as JSON: {{"score": float, "feedback": "string"}}
                 """
-            # ... other component prompts ...
         }
+        self.default_prompt = """Evaluate the component execution.
+                
+                Input: {input}
+                Output: {output}
+                
+                Provide:
+                1. Score (0-1)
+                2. Detailed feedback
+                Return as JSON: {{"score": float, "feedback": "string"}}
+                """
     
     async def evaluate(self,
                       component_name: str,
                       input_data: Dict[str, Any],
                       output_data: Dict[str, Any]) -> EvaluationResult:
-        prompt = self.prompts.get(component_name, "Evaluate the component execution")
+        prompt = self.prompts.get(component_name, self.default_prompt)
         
         response = await self.client.chat.completions.create(
             model=self.model,
@@ -53,12 +98,13 @@ class LLMEvaluator(BaseEvaluator):
                     output=str(output_data)
                 )
             }],
+            temperature=0,
             response_format={ "type": "json_object" }
         )
         
-        result = response.choices[0].message.content
+        result = json.loads(response.choices[0].message.content)
         return EvaluationResult(
-            score=result["score"],
-            feedback=result["feedback"],
+            score=min(1.0, max(0.0, float(result["score"]))),
+            feedback=result.get("feedback", ""),
             metadata={"model": self.model}
         ) 
\ No newline at end of file
@@ -0,0 +1,45 @@
+from typing import Dict, Any, Callable
+import asyncio
+import json
+from .base import BaseEvaluator, EvaluationResult
+
+class ManualEvaluator(BaseEvaluator):
+    """Evaluator that asks a human to score each component execution"""
+
+    def __init__(self, input_fn: Callable[[str], str] = input,
+                 output_fn: Callable[[str], None] = print):
+        """
+        `input_fn` prompts for and returns a line of text (the built-in `input` by default).
+        It is blocking, so it runs in a worker thread to keep the event loop free.
+        """
+        self.input_fn = input_fn
+        self.output_fn = output_fn
+
+    async def evaluate(self,
+                      component_name: str,
+                      input_data: Dict[str, Any],
+                      output_data: Dict[str, Any]) -> EvaluationResult:
+        return await asyncio.to_thread(self._ask, component_name, input_data, output_data)
+
+    def _ask(self, component_name: str, input_data: Dict[str, Any],
+             output_data: Dict[str, Any]) -> EvaluationResult:
+        self.output_fn(f"\n=== {component_name} ===")
+        self.output_fn(f"Input: {json.dumps(input_data, indent=2, default=str)}")
+        self.output_fn(f"Output: {json.dumps(output_data, indent=2, default=str)}")
+
+        while True:
+            try:
+                score = float(self.input_fn("Score (0-1): "))
+            except ValueError:
+                self.output_fn("Please enter a number between 0 and 1")
+                continue
+            if 0.0 <= score <= 1.0:
+                break
+            self.output_fn("Please enter a number between 0 and 1")
+        feedback = self.input_fn("Feedback: ")
+
+        return EvaluationResult(
+            score=score,
+            feedback=feedback,
+            metadata={"evaluation_type": "manual"}
+        )
@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from .base import BaseEvaluator
+from ..logging.base import StepLog
+from ..logging.json_logger import JsonLogger
+
+# Pseudo component name under which whole workflows (query -> final response) are evaluated
+WORKFLOW_COMPONENT = "workflow"
+
+@dataclass
+class EvaluationItem:
+    """One logged execution to score"""
+    item_id: str  # step_id, or workflow_id for whole workflows
+    component: str
+    input: Dict[str, Any]
+    output: Dict[str, Any]
+    workflow_id: Optional[str] = None
+
+@dataclass
+class EvaluationRecord:
+    item_id: str
+    component: str
+    evaluator: str
+    workflow_id: Optional[str]
+    score: Optional[float]
+    feedback: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    evaluated_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+class TokenBucket:
+    """Async rate limiter: at most `rate` acquisitions per second, bursts up to `burst`"""
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = float(burst or max(1, int(rate)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def iter_workflow_items(logger: JsonLogger,
+                        start_time: Optional[datetime] = None,
+                        end_time: Optional[datetime] = None,
+                        components: Optional[Iterable[str]] = None) -> Iterator[EvaluationItem]:
+    """Stream successful steps (and optionally whole workflows) from logged workflows."""
+    wanted = set(components) if components else None
+    for workflow in logger.iter_workflow_logs(start_time, end_time):
+        if wanted is None or WORKFLOW_COMPONENT in wanted:
+            if workflow.success:
+                yield EvaluationItem(
+                    item_id=workflow.workflow_id,
+                    component=WORKFLOW_COMPONENT,
+                    input={"query": workflow.query},
+                    output={"final_response": workflow.final_response},
+                    workflow_id=workflow.workflow_id
+                )
+        for step_id in workflow.step_ids:
+            step = logger.get_step_log(step_id)
+            if step is None or not step.success:
+                continue
+            if wanted is not None and step.step_name not in wanted:
+                continue
+            yield step_item(step, workflow.workflow_id)
+
+def step_item(step: StepLog, workflow_id: Optional[str] = None) -> EvaluationItem:
+    return EvaluationItem(
+        item_id=step.step_id,
+        component=step.step_name,
+        input=step.input,
+        output=step.output,
+        workflow_id=workflow_id
+    )
+
+def iter_checkpoint(path: Optional[str]) -> Iterator[EvaluationRecord]:
+    """Records written by a previous (possibly interrupted) run, one at a time."""
+    if not path or not Path(path).exists():
+        return
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                try:
+                    yield EvaluationRecord(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue  # Partially written last line
+
+def load_checkpoint(path: Optional[str]) -> List[EvaluationRecord]:
+    """Records written by a previous (possibly interrupted) run."""
+    return list(iter_checkpoint(path))
+
+class ScoreSummary:
+    """Running score statistics and error counts per component.
+
+    Scores are counted per value rounded to three decimals, so memory is
+    bounded by the number of distinct scores (at most 1001 for 0-1 scores)
+    rather than the number of records, and quantiles are exact to that
+    precision.
+    """
+    def __init__(self):
+        self._counts: Dict[str, Counter] = {}
+        self._totals: Dict[str, float] = {}
+        self._errors: Dict[str, int] = {}
+
+    def add(self, record: EvaluationRecord) -> None:
+        counts = self._counts.setdefault(record.component, Counter())
+        if record.error is not None or record.score is None:
+            self._errors[record.component] = self._errors.get(record.component, 0) + 1
+            return
+        counts[round(record.score, 3)] += 1
+        self._totals[record.component] = self._totals.get(record.component, 0.0) + record.score
+
+    @staticmethod
+    def _quantile(counts: Counter, q: float) -> Optional[float]:
+        total = sum(counts.values())
+        if not total:
+            return None
+        target = int(q * (total - 1))
+        seen = 0
+        for value in sorted(counts):
+            seen += counts[value]
+            if seen > target:
+                return value
+        return None
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        summary = {}
+        for component, counts in sorted(self._counts.items()):
+            count = sum(counts.values())
+            summary[component] = {
+                "count": count,
+                "errors": self._errors.get(component, 0),
+                "mean": self._totals[component] / count if count else None,
+                "p10": self._quantile(counts, 0.1),
+                "p50": self._quantile(counts, 0.5),
+                "min": min(counts) if counts else None,
+                "max": max(counts) if counts else None
+            }
+        return summary
+
+def aggregate(records: Iterable[EvaluationRecord]) -> Dict[str, Dict[str, Any]]:
+    """Score statistics and error counts per component"""
+    summary = ScoreSummary()
+    for record in records:
+        summary.add(record)
+    return summary.summary()
+
+class EvaluationRunner:
+    """Scores logged executions with an evaluator under bounded concurrency.
+
+    Items are pulled from an iterator as workers free up, and results are
+    folded into a running `ScoreSummary` instead of being kept, so memory
+    stays flat however many logs there are. Each result is appended to
+    `checkpoint_path` as it completes; on restart, items that already have a
+    successful record from the same evaluator are skipped and failed ones
+    are retried. Only the item ids of earlier results are held in memory.
+    """
+    def __init__(self, evaluator: BaseEvaluator, concurrency: int = 8,
+                 rate_per_second: Optional[float] = None,
+                 checkpoint_path: Optional[str] = None,
+                 max_retries: int = 2):
+        self.evaluator = evaluator
+        self.evaluator_name = evaluator.__class__.__name__
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(rate_per_second) if rate_per_second else None
+        self.checkpoint_path = checkpoint_path
+        self.max_retries = max_retries
+
+    async def run(self, items: Iterable[EvaluationItem]) -> Dict[str, Dict[str, Any]]:
+        """Evaluate every item not already done; returns the per-component summary."""
+        # Earlier successful results of this evaluator count towards the summary
+        summary = ScoreSummary()
+        done: Set[str] = set()
+        for record in iter_checkpoint(self.checkpoint_path):
+            if record.evaluator == self.evaluator_name and record.error is None:
+                done.add(record.item_id)
+                summary.add(record)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        checkpoint = open(self.checkpoint_path, 'a') if self.checkpoint_path else None
+
+        async def worker() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                record = await self._evaluate(item)
+                summary.add(record)
+                if checkpoint:
+                    checkpoint.write(json.dumps(asdict(record), default=str) + "\n")
+                    checkpoint.flush()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for item in items:
+                if item.item_id in done:
+                    continue
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            if checkpoint:
+                checkpoint.close()
+        return summary.summary()
+
+    async def _evaluate(self, item: EvaluationItem) -> EvaluationRecord:
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+            try:
+                result = await self.evaluator.evaluate(item.component, item.input, item.output)
+                return EvaluationRecord(
+                    item_id=item.item_id,
+                    component=item.component,
+                    evaluator=self.evaluator_name,
+                    workflow_id=item.workflow_id,
+                    score=result.score,
+                    feedback=result.feedback,
+                    metadata=result.metadata
+                )
+            except Exception as e:
+                error = f"{e.__class__.__name__}: {e}"
+                if attempt < self.max_retries:
+                    await asyncio.sleep(2 ** attempt)
+        return EvaluationRecord(
+            item_id=item.item_id,
+            component=item.component,
+            evaluator=self.evaluator_name,
+            workflow_id=item.workflow_id,
+            score=None,
+            feedback="",
+            error=error
+        )
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate logged workflows")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--evaluator", choices=["llm", "manual"], default="llm")
+    parser.add_argument("--model", default=None, help="Model for the LLM evaluator")
+    parser.add_argument("--components", default=None,
+                        help=f"Comma-separated step names to evaluate; '{WORKFLOW_COMPONENT}' "
+                             "scores whole workflows (default: all)")
+    parser.add_argument("--days", type=float, default=None, help="Only workflows from the last N days")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=None, help="Max evaluations started per second")
+    parser.add_argument("--checkpoint", default="evaluation_results.jsonl",
+                        help="JSONL results file; rerunning resumes from it")
+    parser.add_argument("--output", default=None, help="Write the summary as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.evaluator == "manual":
+        from .manual_evaluator import ManualEvaluator
+        evaluator: BaseEvaluator = ManualEvaluator()
+        args.concurrency = 1  # One prompt at a time
+    else:
+        from .llm_evaluator import LLMEvaluator
+        evaluator = LLMEvaluator(model=args.model) if args.model else LLMEvaluator()
+
+    start_time = datetime.now() - timedelta(days=args.days) if args.days else None
+    components = args.components.split(",") if args.components else None
+    items = iter_workflow_items(JsonLogger(args.log_dir), start_time, None, components)
+
+    runner = EvaluationRunner(evaluator, args.concurrency, args.rate, args.checkpoint)
+    started = time.perf_counter()
+    summary = asyncio.run(runner.run(items))
+    elapsed = time.perf_counter() - started
+
+    print(f"Finished in {elapsed:.1f}s")
+    print(f"{'component':<20} {'count':>7} {'errors':>7} {'mean':>6} {'p10':>6} {'p50':>6}")
+    for component, stats in summary.items():
+        fmt = lambda v: f"{v:6.2f}" if v is not None else f"{'-':>6}"
+        print(f"{component:<20} {stats['count']:>7} {stats['errors']:>7} "
+              f"{fmt(stats['mean'])} {fmt(stats['p10'])} {fmt(stats['p50'])}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+from .bulk import BulkIngestor, IngestionCheckpoint, IngestionStats
+from .dedup import Deduplicator, MinHasher, SignatureIndex, create_deduplicator
+from .jobs import IngestionJob, IngestionJobManager, JobQueueFull, JobStatus, JobStore, QueryPriorityGate
+
+__all__ = [
+    'BulkIngestor',
+    'IngestionCheckpoint',
+    'IngestionStats',
+    'Deduplicator',
+    'MinHasher',
+    'SignatureIndex',
+    'create_deduplicator',
+    'IngestionJob',
+    'IngestionJobManager',
+    'JobQueueFull',
+    'JobStatus',
+    'JobStore',
+    'QueryPriorityGate'
+]
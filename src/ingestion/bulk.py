@@ -0,0 +1,302 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from ..models import Document
+from ..components import VectorRetriever, create_embedding_provider
+from .dedup import Deduplicator, MinHasher, SignatureIndex
+
+@dataclass
+class IngestionCheckpoint:
+    source: str
+    offset: int = 0        # Byte offset of the first line not yet committed
+    documents: int = 0
+    tokens: int = 0
+    duplicates: int = 0
+
+@dataclass
+class IngestionStats:
+    documents: int = 0     # Stored documents; near-duplicates are counted separately
+    tokens: int = 0
+    duplicates: int = 0
+    skipped_lines: int = 0
+    batches: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def dedup_ratio(self) -> float:
+        total = self.documents + self.duplicates
+        return self.duplicates / total if total else 0.0
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.documents / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.tokens / self.elapsed_s if self.elapsed_s else 0.0
+
+def load_checkpoint(path: Path, source: str) -> IngestionCheckpoint:
+    """Load the checkpoint for `source`, or start from the beginning of the file."""
+    if not path.exists():
+        return IngestionCheckpoint(source=source)
+    with open(path) as f:
+        checkpoint = IngestionCheckpoint(**json.load(f))
+    if checkpoint.source != source:
+        raise ValueError(
+            f"Checkpoint {path} belongs to {checkpoint.source}, not {source}"
+        )
+    return checkpoint
+
+def save_checkpoint(path: Path, checkpoint: IngestionCheckpoint) -> None:
+    """Write the checkpoint atomically so a crash never leaves a torn file."""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(asdict(checkpoint), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def record_to_document(record: dict, source: str, offset: int,
+                       text_field: str = "text",
+                       id_field: Optional[str] = None) -> Document:
+    """Map a JSONL record to a Document.
+
+    Records with a `metadata` object use it as-is; otherwise every field other
+    than the text and id fields becomes metadata. Without an id field the id is
+    derived from the line's byte offset, so re-ingesting after a crash
+    overwrites points instead of duplicating them.
+    """
+    text = record[text_field]
+    if isinstance(record.get("metadata"), dict):
+        metadata = record["metadata"]
+    else:
+        metadata = {k: v for k, v in record.items() if k not in (text_field, id_field)}
+
+    if id_field and record.get(id_field) is not None:
+        doc_id = str(record[id_field])
+    else:
+        doc_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}:{offset}"))
+    return Document(text=text, metadata=metadata, id=doc_id)
+
+def iter_jsonl_batches(path: Path, start_offset: int, batch_size: int,
+                       text_field: str = "text",
+                       id_field: Optional[str] = None,
+                       stats: Optional[IngestionStats] = None
+                       ) -> Iterator[Tuple[int, int, List[Document]]]:
+    """Stream (start_offset, end_offset, documents) batches from a JSONL file.
+
+    Only one batch is held in memory at a time. Offsets are byte positions so a
+    checkpoint can seek straight back to the first uncommitted line.
+    """
+    source = str(path.resolve())
+    with open(path, 'rb') as f:
+        f.seek(start_offset)
+        batch: List[Document] = []
+        batch_start = offset = start_offset
+        for line in iter(f.readline, b''):
+            line_offset = offset
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                batch.append(record_to_document(record, source, line_offset, text_field, id_field))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping line at offset {line_offset}: {e}", file=sys.stderr)
+                if stats is not None:
+                    stats.skipped_lines += 1
+                continue
+            if len(batch) >= batch_size:
+                yield batch_start, offset, batch
+                batch = []
+                batch_start = offset
+        if batch:
+            yield batch_start, offset, batch
+
+class BulkIngestor:
+    """Streams a JSONL file into a retriever with parallel workers.
+
+    At most `max_pending` batches are in flight, so reading blocks while the
+    embedding/upsert workers catch up. Batches may finish out of order; the
+    checkpoint only advances past a batch once every batch before it has been
+    committed.
+
+    With a `deduplicator`, near-duplicates are filtered out of each batch
+    before it is embedded; `report_batches` prints every batch's dedup ratio.
+    """
+    def __init__(
+        self,
+        retriever: VectorRetriever,
+        workers: int = 4,
+        batch_size: int = 64,
+        max_pending: Optional[int] = None,
+        checkpoint_path: Optional[str] = None,
+        text_field: str = "text",
+        id_field: Optional[str] = None,
+        report_interval_s: float = 10.0,
+        deduplicator: Optional[Deduplicator] = None,
+        report_batches: bool = False
+    ):
+        self.retriever = retriever
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_pending = max_pending or workers * 2
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.text_field = text_field
+        self.id_field = id_field
+        self.report_interval_s = report_interval_s
+        self.deduplicator = deduplicator
+        self.report_batches = report_batches
+
+    def run(self, path: str) -> IngestionStats:
+        source_path = Path(path)
+        source = str(source_path.resolve())
+        checkpoint = (
+            load_checkpoint(self.checkpoint_path, source)
+            if self.checkpoint_path else IngestionCheckpoint(source=source)
+        )
+        if checkpoint.offset:
+            print(f"Resuming {source} from offset {checkpoint.offset} "
+                  f"({checkpoint.documents} documents already ingested)", file=sys.stderr)
+
+        stats = IngestionStats()
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(self.max_pending)
+        # start_offset -> (end_offset, documents, tokens, duplicates) for finished but uncommitted batches
+        finished = {}
+        errors: List[BaseException] = []
+        start = time.monotonic()
+        last_report = start
+
+        def ingest(documents: List[Document]) -> Tuple[int, int]:
+            """Returns (tokens, duplicates dropped)."""
+            if self.deduplicator is None:
+                return self.retriever.add_documents(documents), 0
+            tokens, result = self.deduplicator.ingest(self.retriever, documents)
+            return tokens, len(result.duplicates)
+
+        def on_done(future, batch_start: int, batch_end: int, count: int) -> None:
+            nonlocal last_report
+            try:
+                with lock:
+                    if future.exception() is not None:
+                        errors.append(future.exception())
+                        return
+                    tokens, duplicates = future.result()
+                    stored = count - duplicates
+                    stats.documents += stored
+                    stats.tokens += tokens
+                    stats.duplicates += duplicates
+                    stats.batches += 1
+                    finished[batch_start] = (batch_end, stored, tokens, duplicates)
+                    if self.report_batches and self.deduplicator:
+                        print(f"Batch at offset {batch_start}: {count} docs, {duplicates} duplicates "
+                              f"(dedup ratio {duplicates / count:.1%})", file=sys.stderr)
+                    # Advance the committed offset over the contiguous prefix
+                    advanced = False
+                    while checkpoint.offset in finished:
+                        end, committed_docs, committed_tokens, committed_dups = finished.pop(checkpoint.offset)
+                        checkpoint.offset = end
+                        checkpoint.documents += committed_docs
+                        checkpoint.tokens += committed_tokens
+                        checkpoint.duplicates += committed_dups
+                        advanced = True
+                    if advanced and self.checkpoint_path:
+                        save_checkpoint(self.checkpoint_path, checkpoint)
+
+                    now = time.monotonic()
+                    if now - last_report >= self.report_interval_s:
+                        last_report = now
+                        stats.elapsed_s = now - start
+                        self._report(stats)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for batch_start, batch_end, documents in iter_jsonl_batches(
+                source_path, checkpoint.offset, self.batch_size,
+                self.text_field, self.id_field, stats
+            ):
+                slots.acquire()
+                if errors:
+                    slots.release()
+                    break
+                future = executor.submit(ingest, documents)
+                future.add_done_callback(
+                    lambda f, s=batch_start, e=batch_end, n=len(documents): on_done(f, s, e, n)
+                )
+
+        stats.elapsed_s = time.monotonic() - start
+        self._report(stats)
+        if errors:
+            raise errors[0]
+        return stats
+
+    @staticmethod
+    def _report(stats: IngestionStats) -> None:
+        print(
+            f"{stats.documents} docs, {stats.tokens} tokens in {stats.elapsed_s:.1f}s "
+            f"({stats.docs_per_sec:.1f} docs/sec, {stats.tokens_per_sec:.1f} tokens/sec)"
+            + (f", {stats.duplicates} duplicates (dedup ratio {stats.dedup_ratio:.1%})"
+               if stats.duplicates else ""),
+            file=sys.stderr
+        )
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from ..config import Settings
+    settings = Settings()
+
+    parser = argparse.ArgumentParser(description="Bulk-ingest a JSONL file into the vector store")
+    parser.add_argument("path", help="JSONL file with one document per line")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--id-field", default=None,
+                        help="Field holding a stable document id (defaults to the line offset)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Maximum batches in flight (defaults to 2x workers)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint file (defaults to <path>.checkpoint.json)")
+    parser.add_argument("--collection", default=settings.qdrant_collection_name)
+    parser.add_argument("--qdrant-url", default=settings.qdrant_url)
+    parser.add_argument("--dedup", choices=["off", "skip", "merge"], default=settings.dedup_mode,
+                        help="Skip near-duplicates, or merge their ids into the document they duplicate")
+    parser.add_argument("--dedup-threshold", type=float, default=settings.dedup_threshold)
+    parser.add_argument("--dedup-index", default=settings.dedup_index_path,
+                        help="SQLite signature index, shared across runs")
+    parser.add_argument("--report-batches", action="store_true",
+                        help="Print the dedup ratio of every batch")
+    args = parser.parse_args(argv)
+
+    retriever = VectorRetriever(
+        collection_name=args.collection,
+        embedding_provider=create_embedding_provider(settings),
+        url=args.qdrant_url
+    )
+    deduplicator = None
+    if args.dedup != "off":
+        index = SignatureIndex(args.dedup_index, settings.dedup_num_perm, args.dedup_threshold)
+        deduplicator = Deduplicator(index, args.dedup, MinHasher(settings.dedup_num_perm))
+    ingestor = BulkIngestor(
+        retriever,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_pending=args.max_pending,
+        checkpoint_path=args.checkpoint or f"{args.path}.checkpoint.json",
+        text_field=args.text_field,
+        id_field=args.id_field,
+        deduplicator=deduplicator,
+        report_batches=args.report_batches
+    )
+    ingestor.run(args.path)
+
+if __name__ == "__main__":
+    main()
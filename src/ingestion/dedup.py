@@ -0,0 +1,200 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from ..models import Document
+
+_PRIME = np.uint64(4294967291)  # Largest prime below 2**32
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+
+def shingles(text: str, k: int = 5) -> List[str]:
+    """Overlapping k-word shingles of the normalized text.
+
+    Case, punctuation and whitespace are ignored, so boilerplate that differs
+    only in formatting still matches. Texts shorter than k words are one shingle.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= k:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + k]) for i in range(len(words) - k + 1)]
+
+class MinHasher:
+    """MinHash signatures whose agreement rate estimates Jaccard similarity of shingle sets"""
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # a * h + b stays below 2**64 for 32-bit a, b and h, so uint64 never overflows
+        self._a = rng.randint(1, 2**32 - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2**32 - 1, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array([
+            int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little")
+            for s in shingles(text, self.shingle_size)
+        ], dtype=np.uint64)
+        if hashes.size == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(a == b))
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) whose LSH candidate threshold (1/bands)**(1/rows) is closest to `threshold`."""
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+class SignatureIndex:
+    """Persistent MinHash LSH index in SQLite.
+
+    Signatures are split into bands; documents sharing any band hash are
+    candidates, and candidates are confirmed by comparing full signatures.
+    Lookups touch only the matching band rows, not every stored signature.
+    """
+    def __init__(self, path: str = "dedup_index.sqlite3", num_perm: int = 128, threshold: float = 0.85):
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures (doc_id TEXT PRIMARY KEY, signature BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS lsh_bands (band_key INTEGER NOT NULL, doc_id TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS lsh_bands_key ON lsh_bands (band_key)")
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(band.to_bytes(2, "little") + chunk, digest_size=8).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    def query(self, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Most similar indexed document at or above the threshold, as (doc_id, similarity)."""
+        keys = self._band_keys(signature)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT s.doc_id, s.signature FROM signatures s WHERE s.doc_id IN (
+                    SELECT doc_id FROM lsh_bands WHERE band_key IN ({",".join("?" * len(keys))})
+                )""",
+                keys
+            ).fetchall()
+        best = None
+        for doc_id, blob in rows:
+            score = similarity(signature, np.frombuffer(blob, dtype=np.uint32))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (doc_id, score)
+        return best
+
+    def add(self, entries: List[Tuple[str, np.ndarray]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for doc_id, signature in entries:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO signatures (doc_id, signature) VALUES (?, ?)",
+                        (doc_id, signature.tobytes())
+                    )
+                    self._conn.execute("DELETE FROM lsh_bands WHERE doc_id = ?", (doc_id,))
+                    self._conn.executemany(
+                        "INSERT INTO lsh_bands (band_key, doc_id) VALUES (?, ?)",
+                        [(key, doc_id) for key in self._band_keys(signature)]
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+@dataclass
+class Duplicate:
+    document: Document
+    canonical_id: str
+    similarity: float
+
+@dataclass
+class DedupResult:
+    unique: List[Document] = field(default_factory=list)
+    duplicates: List[Duplicate] = field(default_factory=list)
+    signatures: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Fraction of the batch that was a near-duplicate"""
+        total = len(self.unique) + len(self.duplicates)
+        return len(self.duplicates) / total if total else 0.0
+
+class Deduplicator:
+    """Drops near-duplicate documents before they are embedded.
+
+    mode "skip" discards duplicates; "merge" records their ids on the
+    canonical point's `duplicate_ids` payload instead. Re-ingesting a document
+    with the same id is not treated as a duplicate, so resumed or retried
+    ingestion still overwrites its own points.
+    """
+    def __init__(self, index: SignatureIndex, mode: str = "skip", hasher: Optional[MinHasher] = None):
+        if mode not in ("skip", "merge"):
+            raise ValueError(f"Unknown dedup mode: {mode}")
+        self.index = index
+        self.mode = mode
+        self.hasher = hasher or MinHasher(num_perm=index.num_perm)
+
+    def filter(self, documents: List[Document]) -> DedupResult:
+        """Split a batch into unique documents and duplicates of indexed or earlier batch documents."""
+        result = DedupResult()
+        for doc in documents:
+            if doc.id is None:
+                # A known id lets merges find this document's point later
+                doc.id = str(uuid.uuid4())
+            signature = self.hasher.signature(doc.text)
+            match = self.index.query(signature)
+            if match is None or match[0] == doc.id:
+                match = self._match_in_batch(signature, result)
+            if match is not None and match[0] != doc.id:
+                result.duplicates.append(Duplicate(doc, match[0], match[1]))
+            else:
+                result.unique.append(doc)
+                result.signatures[doc.id] = signature
+        return result
+
+    def _match_in_batch(self, signature: np.ndarray, result: DedupResult) -> Optional[Tuple[str, float]]:
+        best = None
+        for doc_id, other in result.signatures.items():
+            score = similarity(signature, other)
+            if score >= self.index.threshold and (best is None or score > best[1]):
+                best = (doc_id, score)
+        return best
+
+    def ingest(self, retriever, documents: List[Document]) -> Tuple[int, DedupResult]:
+        """Dedup a batch, store the unique documents and index them. Returns (tokens, result)."""
+        result = self.filter(documents)
+        tokens = retriever.add_documents(result.unique)
+        # Index only after the documents are stored, so a failed batch can't shadow later copies
+        self.index.add(list(result.signatures.items()))
+        if self.mode == "merge" and result.duplicates:
+            by_canonical: Dict[str, List[str]] = {}
+            for dup in result.duplicates:
+                by_canonical.setdefault(dup.canonical_id, []).append(dup.document.id)
+            for canonical_id, duplicate_ids in by_canonical.items():
+                retriever.merge_duplicates(canonical_id, duplicate_ids)
+        return tokens, result
+
+def create_deduplicator(settings) -> Optional[Deduplicator]:
+    """Build the deduplicator configured by the `dedup_*` settings, or None if disabled."""
+    if settings.dedup_mode == "off":
+        return None
+    index = SignatureIndex(settings.dedup_index_path, settings.dedup_num_perm, settings.dedup_threshold)
+    return Deduplicator(index, settings.dedup_mode)
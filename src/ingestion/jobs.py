@@ -0,0 +1,244 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields, asdict
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from ..models import Document
+from ..components import VectorRetriever
+from .dedup import Deduplicator
+
+class JobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    PARTIAL = "partial"    # Some batches were stored and some failed; see failed_ranges
+    FAILED = "failed"
+
+@dataclass
+class IngestionJob:
+    job_id: str
+    total_documents: int
+    status: JobStatus = JobStatus.QUEUED
+    processed_documents: int = 0
+    failed_documents: int = 0
+    duplicate_documents: int = 0
+    batch_dedup_ratios: List[float] = field(default_factory=list)
+    tokens: int = 0
+    errors: List[str] = field(default_factory=list)
+    failed_ranges: List[List[int]] = field(default_factory=list)  # [start, end) document indexes to resubmit
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @property
+    def elapsed_s(self) -> float:
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or datetime.now()
+        return (end - self.started_at).total_seconds()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        elapsed = self.elapsed_s
+        data["status"] = self.status.value
+        data["docs_per_sec"] = self.processed_documents / elapsed if elapsed else 0.0
+        data["tokens_per_sec"] = self.tokens / elapsed if elapsed else 0.0
+        data["dedup_ratio"] = (
+            self.duplicate_documents / self.processed_documents if self.processed_documents else 0.0
+        )
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IngestionJob":
+        """Inverse of `to_dict`, for jobs read back from a JobStore."""
+        names = {f.name for f in fields(cls)}
+        values = {k: v for k, v in data.items() if k in names}
+        values["status"] = JobStatus(values["status"])
+        for name in ("created_at", "started_at", "finished_at"):
+            if values.get(name):
+                values[name] = datetime.fromisoformat(values[name])
+        return cls(**values)
+
+class JobStore:
+    """Job status in SQLite, so every API worker process can report any job.
+
+    Keeps the `max_retained_jobs` most recently updated jobs.
+    """
+    def __init__(self, path: str = "ingestion_jobs.sqlite3", max_retained_jobs: int = 1000):
+        self.max_retained_jobs = max_retained_jobs
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated)")
+
+    def put(self, job: IngestionJob) -> None:
+        data = json.dumps(job.to_dict(), default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, data, updated) VALUES (?, ?, ?)",
+                (job.job_id, data, time.time())
+            )
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return IngestionJob.from_dict(json.loads(row[0])) if row else None
+
+    def evict(self) -> None:
+        with self._lock:
+            self._conn.execute(
+                """DELETE FROM jobs WHERE job_id IN (
+                    SELECT job_id FROM jobs ORDER BY updated DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_retained_jobs,)
+            )
+
+class JobQueueFull(Exception):
+    """Raised when too many ingestion jobs are already waiting"""
+    pass
+
+class QueryPriorityGate:
+    """Lets background ingestion yield to query traffic.
+
+    Queries hold the gate while they run; ingestion workers wait for it to be
+    idle between batches. Waiting is capped at `max_wait_s` so a steady stream
+    of queries cannot starve ingestion completely.
+    """
+    def __init__(self, max_wait_s: float = 2.0):
+        self.max_wait_s = max_wait_s
+        self._active_queries = 0
+        self._idle = threading.Condition()
+
+    @contextmanager
+    def query(self):
+        with self._idle:
+            self._active_queries += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._active_queries -= 1
+                if self._active_queries == 0:
+                    self._idle.notify_all()
+
+    def wait_for_idle(self) -> None:
+        with self._idle:
+            self._idle.wait_for(lambda: self._active_queries == 0, timeout=self.max_wait_s)
+
+class IngestionJobManager:
+    """Runs document ingestion in a bounded background worker pool.
+
+    Jobs are split into batches so progress can be reported while they run.
+    A batch that fails is recorded in `failed_ranges` and the job goes on;
+    the job ends `partial` if other batches were stored. Finished jobs are
+    kept for status queries until `max_retained_jobs` is exceeded, oldest
+    first. With a `store`, status is also written there after every batch,
+    so other worker processes can report it. With a `deduplicator`,
+    near-duplicates are dropped (or merged) before embedding and each
+    batch's dedup ratio is recorded.
+    """
+    def __init__(
+        self,
+        retriever: VectorRetriever,
+        workers: int = 1,
+        batch_size: int = 64,
+        max_queued_jobs: int = 100,
+        max_retained_jobs: int = 1000,
+        priority_gate: Optional[QueryPriorityGate] = None,
+        deduplicator: Optional[Deduplicator] = None,
+        store: Optional[JobStore] = None
+    ):
+        self.retriever = retriever
+        self.batch_size = batch_size
+        self.max_queued_jobs = max_queued_jobs
+        self.max_retained_jobs = max_retained_jobs
+        self.priority_gate = priority_gate
+        self.deduplicator = deduplicator
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingestion")
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queued = 0
+        self._lock = threading.Lock()
+
+    def submit(self, documents: List[Document]) -> IngestionJob:
+        """Enqueue documents for ingestion and return the job immediately."""
+        with self._lock:
+            if self._queued >= self.max_queued_jobs:
+                raise JobQueueFull(f"{self._queued} ingestion jobs already queued")
+            job = IngestionJob(job_id=str(uuid.uuid4()), total_documents=len(documents))
+            self._jobs[job.job_id] = job
+            self._queued += 1
+            self._evict()
+        self._save(job)
+        self._executor.submit(self._run, job, documents)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """The job, from this process if it runs here, otherwise from the store."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store:
+            job = self.store.get(job_id)
+        return job
+
+    def _save(self, job: IngestionJob) -> None:
+        if self.store:
+            self.store.put(job)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: IngestionJob, documents: List[Document]) -> None:
+        with self._lock:
+            self._queued -= 1
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.now()
+        self._save(job)
+
+        for i in range(0, len(documents), self.batch_size):
+            batch = documents[i:i + self.batch_size]
+            if self.priority_gate:
+                self.priority_gate.wait_for_idle()
+            try:
+                if self.deduplicator:
+                    tokens, result = self.deduplicator.ingest(self.retriever, batch)
+                    job.duplicate_documents += len(result.duplicates)
+                    job.batch_dedup_ratios.append(result.dedup_ratio)
+                else:
+                    tokens = self.retriever.add_documents(batch)
+                job.tokens += tokens
+                job.processed_documents += len(batch)
+            except Exception as e:
+                job.failed_documents += len(batch)
+                job.errors.append(f"Documents {i}-{i + len(batch) - 1}: {e}")
+                job.failed_ranges.append([i, i + len(batch)])
+            self._save(job)
+
+        job.finished_at = datetime.now()
+        if not job.errors:
+            job.status = JobStatus.SUCCEEDED
+        else:
+            job.status = JobStatus.PARTIAL if job.processed_documents else JobStatus.FAILED
+        self._save(job)
+        if self.store:
+            self.store.evict()
+
+    def _evict(self) -> None:
+        """Drop the oldest finished jobs beyond the retention limit. Caller holds the lock."""
+        excess = len(self._jobs) - self.max_retained_jobs
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].finished_at is not None:
+                del self._jobs[job_id]
+                excess -= 1
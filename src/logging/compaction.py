@@ -0,0 +1,408 @@
+import argparse
+import fcntl
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Record kinds, named after the JsonLogger directories they are compacted from
+KINDS = ("steps", "workflows")
+_TIME_FIELDS = {"steps": "timestamp", "workflows": "start_time"}
+_ID_FIELDS = {"steps": "step_id", "workflows": "workflow_id"}
+
+# Per-segment lookup table: fixed-width (id hash, offset, length) entries sorted by hash
+_ID_ENTRY = struct.Struct("<QQI")
+_OPEN_ID_TABLES = 256
+
+def id_hash(record_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(record_id.encode(), digest_size=8).digest(), "little")
+
+def write_id_table(path: Path, entries: List[Tuple[str, int, int]]) -> None:
+    """Write (id, offset, length) entries as a sorted id table, atomically."""
+    rows = sorted((id_hash(record_id), offset, length) for record_id, offset, length in entries)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        for row in rows:
+            f.write(_ID_ENTRY.pack(*row))
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.rename(path)
+
+class SegmentStore:
+    """Read access to compacted logs.
+
+    Compacted records live under `segments/<YYYY-MM-DD>/` in `<kind>-<n>.seg`
+    files, one gzip member per record, with a `.idx` JSONL sidecar giving each
+    record's id, sort key, byte offset and length. A `.ids` table holds the
+    same locations sorted by a hash of the id, so a record is found by
+    bisecting the memory-mapped tables of the segments, newest partition
+    first, and read with one seek and a small decompress. Only the list of
+    segments is kept in memory, never their ids. A segment only becomes
+    visible once its index exists, so a half-written segment is never read.
+    """
+    def __init__(self, log_dir: str):
+        self.segment_dir = Path(log_dir) / "segments"
+        # Per kind: (partition day, segment path) newest first
+        self._segments: Dict[str, List[Tuple[str, Path]]] = {kind: [] for kind in KINDS}
+        self._tables: "OrderedDict[Path, mmap.mmap]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index_files(self) -> List[Path]:
+        if not self.segment_dir.exists():
+            return []
+        return sorted(self.segment_dir.glob("*/*.idx"))
+
+    def refresh(self) -> None:
+        """Pick up segments written or deleted since the last refresh."""
+        segments: Dict[str, List[Tuple[str, Path]]] = {kind: [] for kind in KINDS}
+        for index_path in self._index_files():
+            kind = index_path.stem.split("-", 1)[0]
+            if kind in segments:
+                segments[kind].append((index_path.parent.name, index_path.with_suffix(".seg")))
+        for kind in KINDS:
+            segments[kind].sort(key=lambda item: (item[0], item[1].name), reverse=True)
+        with self._lock:
+            self._segments = segments
+
+    def contains(self, kind: str, record_id: str, day: Optional[str] = None) -> bool:
+        """Whether the record was compacted; `day` limits the search to one partition."""
+        return self._find(kind, record_id, day, refresh=False) is not None
+
+    def get(self, kind: str, record_id: str, mtime_ns: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """The compacted record, or None. `mtime_ns` of its original file narrows the search."""
+        day = _day(mtime_ns) if mtime_ns is not None else None
+        found = day is not None and self._find(kind, record_id, day, refresh=False)
+        return found or self._find(kind, record_id, None, refresh=True)
+
+    def _find(self, kind: str, record_id: str, day: Optional[str], refresh: bool) -> Optional[Dict[str, Any]]:
+        target = id_hash(record_id)
+        for attempt in range(2):
+            with self._lock:
+                segments = self._segments[kind]
+            for segment_day, segment in segments:
+                if day is not None and segment_day != day:
+                    continue
+                for offset, length in self._locations(segment, target):
+                    record = self._read(segment, offset, length)
+                    # Hashes can collide, so confirm the id when the record carries one
+                    if record is not None and record.get(_ID_FIELDS[kind], record_id) == record_id:
+                        return record
+            if not refresh or attempt:
+                return None
+            self.refresh()
+        return None
+
+    def _locations(self, segment: Path, target: int) -> Iterator[Tuple[int, int]]:
+        """(offset, length) of the entries in a segment's id table with hash `target`."""
+        table = self._table(segment)
+        if table is None:
+            return
+        count = len(table) // _ID_ENTRY.size
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if _ID_ENTRY.unpack_from(table, mid * _ID_ENTRY.size)[0] < target:
+                low = mid + 1
+            else:
+                high = mid
+        while low < count:
+            hashed, offset, length = _ID_ENTRY.unpack_from(table, low * _ID_ENTRY.size)
+            if hashed != target:
+                return
+            yield offset, length
+            low += 1
+
+    def _table(self, segment: Path) -> Optional[mmap.mmap]:
+        """The segment's memory-mapped id table, built from its .idx if it predates id tables."""
+        with self._lock:
+            table = self._tables.get(segment)
+            if table is not None:
+                self._tables.move_to_end(segment)
+                return table
+        path = segment.with_suffix(".ids")
+        try:
+            if not path.exists():
+                with open(segment.with_suffix(".idx")) as f:
+                    entries = [json.loads(line) for line in f]
+                write_id_table(path, [(e["id"], e["offset"], e["length"]) for e in entries])
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return None
+                table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None  # Removed by retention
+        with self._lock:
+            self._tables[segment] = table
+            while len(self._tables) > _OPEN_ID_TABLES:
+                self._tables.popitem(last=False)[1].close()
+        return table
+
+    @staticmethod
+    def _read(segment: Path, offset: int, length: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(segment, "rb") as f:
+                f.seek(offset)
+                return json.loads(gzip.decompress(f.read(length)))
+        except FileNotFoundError:
+            return None  # Removed by retention since the segment was listed
+
+    def keys(self, kind: str) -> Iterator[Tuple[str, str]]:
+        """(sort key, id) for every compacted record of `kind`, streamed from the index files."""
+        for index_path in self._index_files():
+            if not index_path.stem.startswith(kind + "-"):
+                continue
+            try:
+                with open(index_path) as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        yield entry["key"], entry["id"]
+            except FileNotFoundError:
+                continue
+
+    def iter_records(self, kind: str, since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Stream records partition by partition, skipping partitions older than `since`."""
+        first_partition = since.strftime("%Y-%m-%d") if since else None
+        for index_path in self._index_files():
+            if not index_path.stem.startswith(kind + "-"):
+                continue
+            if first_partition and index_path.parent.name < first_partition:
+                continue
+            segment = index_path.with_suffix(".seg")
+            try:
+                with open(segment, "rb") as f, open(index_path) as index:
+                    for line in index:
+                        entry = json.loads(line)
+                        f.seek(entry["offset"])
+                        yield json.loads(gzip.decompress(f.read(entry["length"])))
+            except FileNotFoundError:
+                continue
+
+def _day(mtime_ns: int) -> str:
+    """Partition of a file with this mtime; compaction partitions by local date."""
+    return datetime.fromtimestamp(mtime_ns / 1e9).strftime("%Y-%m-%d")
+
+class LogCompactor:
+    """Rolls loose JsonLogger files into compressed daily segments and enforces retention.
+
+    Files younger than `min_age` stay loose so active requests are unaffected.
+    Partitions older than `retention` are deleted, then the oldest partitions
+    go until the log directory fits in `max_bytes`. `run` holds an exclusive
+    lock on `segments/.lock`, so API workers and the CLI sharing a log
+    directory never compact at the same time; a run that finds the lock held
+    is skipped.
+    """
+    def __init__(self, log_dir: str, min_age: timedelta = timedelta(hours=1),
+                 retention: Optional[timedelta] = None, max_bytes: Optional[int] = None,
+                 max_segment_records: int = 50000):
+        self.log_dir = Path(log_dir)
+        self.segment_dir = self.log_dir / "segments"
+        self.min_age = min_age
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.max_segment_records = max_segment_records
+
+    def run(self) -> Dict[str, int]:
+        """Compact and enforce retention, unless another process is already doing so."""
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.segment_dir / ".lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return {"skipped": 1}
+            try:
+                stats = self.compact()
+                stats.update(self.enforce_retention())
+                return stats
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def compact(self) -> Dict[str, int]:
+        """Move loose files older than `min_age` into segments. Returns counts per kind."""
+        self._remove_incomplete_segments()
+        store = SegmentStore(str(self.log_dir))
+        store.refresh()
+        cutoff_ns = time.time_ns() - int(self.min_age.total_seconds() * 1e9)
+        stats = {}
+        for kind in KINDS:
+            source_dir = self.log_dir / kind
+            if not source_dir.exists():
+                continue
+            # Group eligible files by day partition
+            partitions: Dict[str, List[Tuple[int, Path]]] = {}
+            with os.scandir(source_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    mtime_ns = entry.stat().st_mtime_ns
+                    if mtime_ns > cutoff_ns:
+                        continue
+                    path = Path(entry.path)
+                    day = _day(mtime_ns)
+                    # A file is compacted into the partition of its mtime, so only that one is searched
+                    if store.contains(kind, path.stem, day):
+                        path.unlink(missing_ok=True)  # Compacted before a crash; drop the leftover
+                        continue
+                    partitions.setdefault(day, []).append((mtime_ns, path))
+
+            compacted = 0
+            for day, files in sorted(partitions.items()):
+                files.sort()
+                for start in range(0, len(files), self.max_segment_records):
+                    compacted += self._write_segment(kind, day, files[start:start + self.max_segment_records])
+            stats[f"compacted_{kind}"] = compacted
+        return stats
+
+    def _write_segment(self, kind: str, day: str, files: List[Tuple[int, Path]]) -> int:
+        partition = self.segment_dir / day
+        partition.mkdir(parents=True, exist_ok=True)
+        name = f"{kind}-{time.time_ns()}"
+        segment_tmp = partition / f"{name}.seg.tmp"
+        index_tmp = partition / f"{name}.idx.tmp"
+
+        written = []
+        locations = []
+        with open(segment_tmp, "wb") as segment, open(index_tmp, "w") as index:
+            for mtime_ns, path in files:
+                try:
+                    with open(path) as f:
+                        record = json.load(f)
+                except (OSError, ValueError):
+                    continue  # Deleted or still being written; leave it for the next run
+                data = gzip.compress(
+                    json.dumps(record, separators=(",", ":")).encode(), compresslevel=6
+                )
+                offset = segment.tell()
+                segment.write(data)
+                record_id = record.get(_ID_FIELDS[kind], path.stem)
+                locations.append((record_id, offset, len(data)))
+                index.write(json.dumps({
+                    "id": record_id,
+                    "key": f"{mtime_ns}_{path.stem}",
+                    "time": record.get(_TIME_FIELDS[kind]),
+                    "offset": offset,
+                    "length": len(data)
+                }) + "\n")
+                written.append(path)
+            segment.flush()
+            os.fsync(segment.fileno())
+            index.flush()
+            os.fsync(index.fileno())
+
+        if not written:
+            segment_tmp.unlink()
+            index_tmp.unlink()
+            return 0
+        # The index is renamed last: it is what makes the segment visible to readers
+        write_id_table(partition / f"{name}.ids", locations)
+        segment_tmp.rename(partition / f"{name}.seg")
+        index_tmp.rename(partition / f"{name}.idx")
+        for path in written:
+            path.unlink(missing_ok=True)
+        return len(written)
+
+    def _remove_incomplete_segments(self) -> None:
+        if not self.segment_dir.exists():
+            return
+        for path in self.segment_dir.glob("*/*.tmp"):
+            path.unlink(missing_ok=True)
+        for pattern in ("*/*.seg", "*/*.ids"):
+            for path in self.segment_dir.glob(pattern):
+                if not path.with_suffix(".idx").exists():
+                    path.unlink(missing_ok=True)
+
+    def enforce_retention(self) -> Dict[str, int]:
+        """Delete partitions (and loose files) past the age limit, then oldest-first past the size limit."""
+        removed_partitions = 0
+        removed_files = 0
+        if self.retention is not None:
+            cutoff = datetime.now() - self.retention
+            oldest_kept = cutoff.strftime("%Y-%m-%d")
+            for partition in self._partitions():
+                if partition.name < oldest_kept:
+                    shutil.rmtree(partition, ignore_errors=True)
+                    removed_partitions += 1
+            cutoff_ns = int(cutoff.timestamp() * 1e9)
+            for kind in KINDS:
+                for path in self._loose_files(kind):
+                    if path.stat().st_mtime_ns < cutoff_ns:
+                        path.unlink(missing_ok=True)
+                        removed_files += 1
+
+        if self.max_bytes is not None:
+            total = self.size_bytes()
+            for partition in self._partitions():
+                if total <= self.max_bytes:
+                    break
+                size = sum(p.stat().st_size for p in partition.iterdir())
+                shutil.rmtree(partition, ignore_errors=True)
+                total -= size
+                removed_partitions += 1
+        return {"removed_partitions": removed_partitions, "removed_files": removed_files}
+
+    def _partitions(self) -> List[Path]:
+        """Day partitions, oldest first."""
+        if not self.segment_dir.exists():
+            return []
+        return sorted(p for p in self.segment_dir.iterdir() if p.is_dir())
+
+    def _loose_files(self, kind: str) -> Iterator[Path]:
+        source_dir = self.log_dir / kind
+        if source_dir.exists():
+            yield from source_dir.glob("*.json")
+
+    def size_bytes(self) -> int:
+        """Total size of loose files and segments."""
+        total = 0
+        for root, _, files in os.walk(self.log_dir):
+            for name in files:
+                try:
+                    total += os.stat(os.path.join(root, name)).st_size
+                except FileNotFoundError:
+                    continue
+        return total
+
+def start_background_compaction(compactor: LogCompactor, interval_s: float) -> threading.Thread:
+    """Run the compactor every `interval_s` seconds in a daemon thread."""
+    def loop() -> None:
+        while True:
+            try:
+                compactor.run()
+            except Exception as e:
+                print(f"Log compaction failed: {e}")
+            time.sleep(interval_s)
+
+    thread = threading.Thread(target=loop, name="log-compaction", daemon=True)
+    thread.start()
+    return thread
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compact JsonLogger files into segments and enforce retention")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--min-age-hours", type=float, default=1.0,
+                        help="Leave files younger than this loose")
+    parser.add_argument("--retention-days", type=float, default=None)
+    parser.add_argument("--max-size-mb", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    compactor = LogCompactor(
+        args.log_dir,
+        min_age=timedelta(hours=args.min_age_hours),
+        retention=timedelta(days=args.retention_days) if args.retention_days else None,
+        max_bytes=int(args.max_size_mb * 1024 * 1024) if args.max_size_mb else None
+    )
+    before = compactor.size_bytes()
+    stats = compactor.run()
+    after = compactor.size_bytes()
+    print(f"{stats}; size {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
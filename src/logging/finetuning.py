@@ -0,0 +1,100 @@
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .base import StepLog, WorkflowLog
+from .json_logger import JsonLogger
+from ..components.router import ROUTER_PROMPT, is_llm_decision
+from ..components.reformulator import REFORMULATION_PROMPT, MULTI_QUERY_REFORMULATION_PROMPT
+from ..components.completion_checker import COMPLETION_CHECK_PROMPT
+from ..components.answer_generator import ANSWER_PROMPT
+from ..models import QueryIntent
+
+def _format_context(context: List[Dict[str, Any]]) -> str:
+    """Same layout the completion checker and answer generator use for their prompts."""
+    return "\n\n".join([
+        f"Context {i+1}:\n{result['text']}"
+        for i, result in enumerate(context)
+    ])
+
+def _router(args: List[Any], result: Any, metadata: Dict[str, Any]) -> Tuple[str, str]:
+    return ROUTER_PROMPT.format(query=args[0]), QueryIntent(result).name
+
+def _reformulator(args: List[Any], result: Any, metadata: Dict[str, Any]) -> Tuple[str, str]:
+    variants = result.get("variants") or []
+    # The reformulator returns at most num_variants distinct phrasings, possibly fewer;
+    # older logs without the setting fall back to the number returned
+    num_variants = metadata.get("num_variants", len(variants))
+    if num_variants:
+        prompt = MULTI_QUERY_REFORMULATION_PROMPT.format(query=args[0], num_variants=num_variants)
+        return prompt, json.dumps({
+            "refined_query": result["refined_text"],
+            "variants": variants,
+            "keywords": result["keywords"]
+        })
+    return REFORMULATION_PROMPT.format(query=args[0]), json.dumps({
+        "refined_query": result["refined_text"],
+        "keywords": result["keywords"]
+    })
+
+def _completion_checker(args: List[Any], result: Any, metadata: Dict[str, Any]) -> Tuple[str, str]:
+    prompt = COMPLETION_CHECK_PROMPT.format(context=_format_context(args[1]), query=args[0])
+    return prompt, f"{float(result):.2f}"
+
+def _answer_generator(args: List[Any], result: Any, metadata: Dict[str, Any]) -> Tuple[str, str]:
+    prompt = ANSWER_PROMPT.format(context=_format_context(args[1]), query=args[0])
+    return prompt, json.dumps({
+        "answer": result["answer"],
+        "citations": [
+            {"text": c["text"], "relevance_score": c["relevance_score"]}
+            for c in result["citations"]
+        ],
+        "confidence_score": result["confidence_score"]
+    })
+
+# Rebuilds (prompt, completion) from a logged LLM step's input args, result and metadata
+EXAMPLE_BUILDERS: Dict[str, Callable[[List[Any], Any, Dict[str, Any]], Tuple[str, str]]] = {
+    "router": _router,
+    "reformulator": _reformulator,
+    "completion_checker": _completion_checker,
+    "answer_generator": _answer_generator,
+}
+
+def step_to_example(step: StepLog) -> Optional[Dict[str, Any]]:
+    """OpenAI chat fine-tuning example for a logged step, or None if it has no LLM prompt."""
+    builder = EXAMPLE_BUILDERS.get(step.step_name)
+    if builder is None or not step.success:
+        return None
+    if (step.metadata or {}).get("fast_path"):
+        return None  # Decided by the adaptive completion checker's model, not the LLM
+    if step.step_name == "router" and not is_llm_decision(step.metadata):
+        return None  # The embedding router's own prediction
+    try:
+        prompt, completion = builder(step.input["args"], step.output["result"], step.metadata or {})
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None  # Logged with an older or custom component
+    return {
+        "messages": [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": completion}
+        ]
+    }
+
+def iter_finetuning_examples(logger: JsonLogger,
+                             workflows: Iterable[WorkflowLog],
+                             steps: Iterable[str] = ("answer_generator",),
+                             answered_only: bool = True) -> Iterator[Dict[str, Any]]:
+    """Join workflows with their step logs into chat-format examples, one at a time.
+
+    With `answered_only`, only workflows that produced a final response
+    contribute, so the examples come from runs that went end to end.
+    """
+    wanted = set(steps)
+    for workflow in workflows:
+        if answered_only and not workflow.final_response:
+            continue
+        for step_id in workflow.step_ids:
+            step = logger.get_step_log(step_id)
+            if step is None or step.step_name not in wanted:
+                continue
+            example = step_to_example(step)
+            if example is not None:
+                yield example
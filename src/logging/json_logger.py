@@ -1,10 +1,21 @@
 import json
-from datetime import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
 from enum import Enum
 from dataclasses import asdict, is_dataclass
 from .base import BaseLogger, StepLog, WorkflowLog
+from .compaction import SegmentStore
+
+# A workflow's file is written right after it ends, so one written much later can't have ended earlier
+_MAX_LOG_DELAY = timedelta(minutes=1)
+# Sorted listings of paginations in progress, by their next cursor
+_PAGE_CACHE_SIZE = 32
+_PAGE_CACHE_TTL_S = 300.0
 
 class LoggingEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -25,6 +36,13 @@ class JsonLogger(BaseLogger):
         # Create directories if they don't exist
         self.step_dir.mkdir(parents=True, exist_ok=True)
         self.workflow_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Older logs compacted into compressed segments (see compaction.py)
+        self.segments = SegmentStore(log_dir)
+        
+        # (cursor, time bounds) -> (created, sorted listing, position of the cursor in it)
+        self._page_cache: "OrderedDict[Tuple, Tuple[float, List[Tuple[int, str]], int]]" = OrderedDict()
+        self._page_lock = threading.Lock()
     
     def log_step(self, step_log: StepLog) -> None:
         """Log a single step to a JSON file"""
@@ -64,37 +82,192 @@ class JsonLogger(BaseLogger):
                          end_time: Optional[datetime] = None) -> List[WorkflowLog]:
         """Get workflow logs with optional filtering"""
         if workflow_id:
-            workflow_files = [self.workflow_dir / f"{workflow_id}.json"]
+            records = [self._load("workflows", workflow_id)]
         else:
-            workflow_files = list(self.workflow_dir.glob("*.json"))
+            records = self._iter_all("workflows", start_time)
+        return list(self._to_workflow_logs(records, start_time, end_time))
+    
+    def iter_workflow_logs(self,
+                           start_time: Optional[datetime] = None,
+                           end_time: Optional[datetime] = None) -> Iterator[WorkflowLog]:
+        """Stream workflow logs one at a time instead of loading them all"""
+        return self._to_workflow_logs(self._iter_all("workflows", start_time), start_time, end_time)
+    
+    def page_workflow_logs(self,
+                           cursor: Optional[str] = None,
+                           limit: int = 100,
+                           start_time: Optional[datetime] = None,
+                           end_time: Optional[datetime] = None) -> Tuple[Iterator[WorkflowLog], Optional[str]]:
+        """One page of workflow logs in the order they were written, plus the next page's cursor.
         
-        workflows = []
-        for wf_file in workflow_files:
-            if wf_file.exists():
-                try:
-                    with open(wf_file) as f:
-                        data = json.load(f)
-                        # Convert ISO format strings back to datetime
-                        start = datetime.fromisoformat(data["start_time"])
-                        end = datetime.fromisoformat(data["end_time"])
-                        
-                        # Apply time filters if specified
-                        if start_time and start < start_time:
-                            continue
-                        if end_time and end > end_time:
-                            continue
-                            
-                        workflows.append(WorkflowLog(
-                            workflow_id=data["workflow_id"],
-                            query=data["query"],
-                            step_ids=data["step_ids"],
-                            start_time=start,
-                            end_time=end,
-                            success=data["success"],
-                            final_response=data.get("final_response")
-                        ))
-                except Exception as e:
-                    print(f"Error reading workflow log {wf_file}: {e}")
-                    continue
+        Only file names, modification times and segment indexes are listed up
+        front; logs are read as the iterator is consumed. A page covers up to
+        `limit` workflows and time filters apply within it, so a page can hold
+        fewer items. The returned cursor is None on the last page.
         
-        return workflows 
\ No newline at end of file
+        The sorted listing is kept for the next page's cursor, so following
+        the cursors lists the logs once rather than once per page. A page that
+        reaches the end of a kept listing lists again, to include newer logs.
+        """
+        # A workflow is logged after it ends, so files older than start_time can be skipped unread
+        min_mtime_ns = int(start_time.timestamp() * 1e9) if start_time else None
+        max_mtime_ns = int((end_time + _MAX_LOG_DELAY).timestamp() * 1e9) if end_time else None
+        after = self._parse_cursor(cursor) if cursor else None
+        
+        listing = self._cached_listing((cursor, min_mtime_ns, max_mtime_ns), limit) if cursor else None
+        if listing is None:
+            listing = (self._list_workflows(min_mtime_ns, max_mtime_ns, after), 0)
+        entries, position = listing
+        page = entries[position:position + limit]
+        next_cursor = None
+        if position + limit < len(entries):
+            next_cursor = f"{page[-1][0]}_{page[-1][1]}"
+            self._cache_listing((next_cursor, min_mtime_ns, max_mtime_ns), entries, position + limit)
+        records = (self._load("workflows", workflow_id, mtime_ns) for mtime_ns, workflow_id in page)
+        return self._to_workflow_logs(records, start_time, end_time), next_cursor
+    
+    def _list_workflows(self, min_mtime_ns: Optional[int], max_mtime_ns: Optional[int],
+                        after: Optional[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        """(mtime, id) of loose and compacted workflows within the bounds and past `after`, sorted."""
+        def wanted(mtime_ns: int, workflow_id: str) -> bool:
+            if min_mtime_ns is not None and mtime_ns < min_mtime_ns:
+                return False
+            if max_mtime_ns is not None and mtime_ns > max_mtime_ns:
+                return False
+            return after is None or (mtime_ns, workflow_id) > after
+        
+        entries: List[Tuple[int, str]] = []
+        with os.scandir(self.workflow_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                mtime_ns = entry.stat().st_mtime_ns
+                workflow_id = entry.name[:-len(".json")]
+                if wanted(mtime_ns, workflow_id):
+                    entries.append((mtime_ns, workflow_id))
+        # Compacted workflows keep the key of the file they came from, so cursors stay valid
+        for key, workflow_id in self.segments.keys("workflows"):
+            mtime_ns = self._parse_cursor(key)[0]
+            if wanted(mtime_ns, workflow_id):
+                entries.append((mtime_ns, workflow_id))
+        entries.sort()
+        return entries
+    
+    def _cached_listing(self, key: Tuple, limit: int) -> Optional[Tuple[List[Tuple[int, str]], int]]:
+        with self._page_lock:
+            cached = self._page_cache.pop(key, None)
+        if cached is None:
+            return None
+        created, entries, position = cached
+        if time.monotonic() - created > _PAGE_CACHE_TTL_S or position + limit >= len(entries):
+            return None
+        return entries, position
+    
+    def _cache_listing(self, key: Tuple, entries: List[Tuple[int, str]], position: int) -> None:
+        with self._page_lock:
+            self._page_cache[key] = (time.monotonic(), entries, position)
+            while len(self._page_cache) > _PAGE_CACHE_SIZE:
+                self._page_cache.popitem(last=False)
+    
+    @staticmethod
+    def _parse_cursor(cursor: str) -> Tuple[int, str]:
+        mtime_ns, _, workflow_id = cursor.partition("_")
+        if not mtime_ns.isdigit() or not workflow_id:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        return int(mtime_ns), workflow_id
+    
+    def _load(self, kind: str, record_id: str, mtime_ns: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """A record from its loose file, or from the segments once compacted.
+
+        `mtime_ns` of the original file, when known, narrows the segment search.
+        """
+        path = self.log_dir / kind / f"{record_id}.json"
+        if path.exists():
+            record = self._read_file(path)
+            if record is not None:
+                return record
+        return self.segments.get(kind, record_id, mtime_ns)
+    
+    def _iter_all(self, kind: str, since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Loose records first, then compacted ones."""
+        for path in (self.log_dir / kind).glob("*.json"):
+            record = self._read_file(path)
+            if record is not None:
+                yield record
+        yield from self.segments.iter_records(kind, since)
+    
+    @staticmethod
+    def _read_file(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None  # Compacted or deleted in the meantime
+        except Exception as e:
+            print(f"Error reading log {path}: {e}")
+            return None
+    
+    def _to_workflow_logs(self, records: Iterable[Optional[Dict[str, Any]]],
+                          start_time: Optional[datetime],
+                          end_time: Optional[datetime]) -> Iterator[WorkflowLog]:
+        for data in records:
+            if data is None:
+                continue
+            try:
+                # Convert ISO format strings back to datetime
+                start = datetime.fromisoformat(data["start_time"])
+                end = datetime.fromisoformat(data["end_time"])
+                
+                # Apply time filters if specified
+                if start_time and start < start_time:
+                    continue
+                if end_time and end > end_time:
+                    continue
+                    
+                yield WorkflowLog(
+                    workflow_id=data["workflow_id"],
+                    query=data["query"],
+                    step_ids=data["step_ids"],
+                    start_time=start,
+                    end_time=end,
+                    success=data["success"],
+                    final_response=data.get("final_response")
+                )
+            except Exception as e:
+                print(f"Error reading workflow log {data.get('workflow_id')}: {e}")
+                continue
+    
+    def get_step_log(self, step_id: str) -> Optional[StepLog]:
+        """Get a single step log, or None if it doesn't exist"""
+        data = self._load("steps", step_id)
+        return self._to_step_log(data) if data is not None else None
+    
+    def iter_step_logs(self,
+                       start_time: Optional[datetime] = None,
+                       end_time: Optional[datetime] = None,
+                       step_names: Optional[Iterable[str]] = None) -> Iterator[StepLog]:
+        """Stream step logs, optionally filtered by time and step name"""
+        names = set(step_names) if step_names else None
+        for data in self._iter_all("steps", start_time):
+            if names and data["step_name"] not in names:
+                continue
+            step = self._to_step_log(data)
+            if start_time and step.timestamp < start_time:
+                continue
+            if end_time and step.timestamp > end_time:
+                continue
+            yield step
+    
+    @staticmethod
+    def _to_step_log(data: Dict[str, Any]) -> StepLog:
+        return StepLog(
+            step_id=data["step_id"],
+            step_name=data["step_name"],
+            input=data["input"],
+            output=data["output"],
+            metadata=data["metadata"],
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            duration_ms=data["duration_ms"],
+            success=data["success"],
+            error=data.get("error")
+        )
@@ -40,15 +40,17 @@ class LogVisualizer:
         data = []
         for wf in workflows:
             for step_id in wf.step_ids:
-                with open(self.logger.step_dir / f"{step_id}.json") as f:
-                    step = json.load(f)
-                    data.append({
-                        'workflow_id': wf.workflow_id,
-                        'step_name': step['step_name'],
-                        'success': step['success'],
-                        'duration_ms': step['duration_ms'],
-                        'timestamp': datetime.fromisoformat(step['timestamp'])
-                    })
+                # Reads loose and compacted step logs alike
+                step = self.logger.get_step_log(step_id)
+                if step is None:
+                    continue
+                data.append({
+                    'workflow_id': wf.workflow_id,
+                    'step_name': step.step_name,
+                    'success': step.success,
+                    'duration_ms': step.duration_ms,
+                    'timestamp': step.timestamp
+                })
         
         return pd.DataFrame(data)
 
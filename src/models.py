@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Dict, Optional
 import numpy as np
 from enum import Enum
@@ -7,12 +7,30 @@ from enum import Enum
 class Document:
     text: str
     metadata: Dict = None
+    id: Optional[str] = None
 
 @dataclass
 class SearchResult:
     text: str
     metadata: Dict
     score: float
+    id: Optional[str] = None                                 # Point id, used to dedup across legs
+    scores: Dict[str, float] = field(default_factory=dict)  # Raw score per retrieval leg after fusion
+    fused_score: Optional[float] = None                      # Fusion's ranking value; `score` stays raw
+
+@dataclass
+class RetrievalProfile:
+    """Per-query search settings. A top_k of 0 disables that retrieval leg."""
+    semantic_top_k: int = 5
+    keyword_top_k: int = 5
+    hnsw_ef: Optional[int] = None               # None uses the collection default
+    exact: bool = False                         # Exhaustive search instead of HNSW
+    rescore: Optional[bool] = None              # Rescore quantized hits with original vectors
+    score_threshold: Optional[float] = None     # Drop semantic hits below this score
+    payload_fields: Optional[List[str]] = None  # Metadata fields to return; None returns all
+    fusion: str = "rrf"                         # Leg fusion: "rrf", "minmax" or "zscore"
+    fusion_weights: Optional[Dict[str, float]] = None  # Per leg ("semantic", "keyword"); default 1.0
+    rrf_k: int = 60                             # Rank offset for RRF
 
 @dataclass
 class Citation:
@@ -0,0 +1,311 @@
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import cProfile
+import json
+import os
+import pstats
+import random
+import shutil
+import sys
+import threading
+import time
+import uuid
+
+# (function name, file, first line)
+Frame = Tuple[str, str, int]
+
+# Artifacts a profile directory may hold, by download name
+ARTIFACTS = {
+    "speedscope": "profile.speedscope.json",
+    "collapsed": "stacks.collapsed",
+    "pstats": "profile.prof",
+    "report": "report.json",
+}
+
+def _frame_label(frame: Frame) -> str:
+    name, filename, line = frame
+    return f"{name} ({filename}:{line})"
+
+def _idle(stack: Tuple[Frame, ...]) -> bool:
+    # A pool worker blocked on its work queue has _worker as its innermost Python frame
+    name, filename, _ = stack[-1]
+    return name == "_worker" and filename.endswith(os.path.join("concurrent", "futures", "thread.py"))
+
+class StackSampler:
+    """Wall-clock sampling profiler for a set of threads.
+
+    Every `interval_s` a background thread records the Python stack of the
+    target threads: the thread that started the sampler, plus any thread
+    whose name starts with one of `thread_prefixes` (by default the DAG
+    node and hedged-call pools). Those pools are shared, so concurrent
+    requests' work there is sampled too. Idle pool workers are not recorded.
+    Identical stacks are counted rather than stored, so memory depends on the
+    number of distinct stacks.
+    """
+    def __init__(self, interval_s: float = 0.005,
+                 thread_prefixes: Tuple[str, ...] = ("dag-node", "hedge")):
+        self.interval_s = interval_s
+        self.thread_prefixes = thread_prefixes
+        self.samples: "Counter[Tuple[str, Tuple[Frame, ...]]]" = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._target = 0
+
+    def start(self) -> None:
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _threads(self) -> Dict[int, str]:
+        threads = {}
+        for thread in threading.enumerate():
+            if thread.ident == self._target or thread.name.startswith(self.thread_prefixes):
+                threads[thread.ident] = "request" if thread.ident == self._target else thread.name
+        return threads
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            threads = self._threads()
+            for ident, frame in sys._current_frames().items():
+                if ident not in threads:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                if stack and not _idle(tuple(stack)):
+                    self.samples[(threads[ident], tuple(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Folded stacks ("thread;outer;...;inner count"), the input format of flamegraph.pl."""
+        lines = [
+            ";".join([thread, *map(_frame_label, stack)]) + f" {count}"
+            for (thread, stack), count in sorted(self.samples.items())
+        ]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """A speedscope "sampled" profile per thread, weighted in milliseconds."""
+        frames: Dict[Frame, int] = {}
+        profiles: Dict[str, Dict[str, Any]] = {}
+        for (thread, stack), count in self.samples.items():
+            indices = [frames.setdefault(frame, len(frames)) for frame in stack]
+            profile = profiles.setdefault(thread, {
+                "type": "sampled", "name": thread, "unit": "milliseconds",
+                "startValue": 0, "endValue": 0, "samples": [], "weights": []
+            })
+            weight = count * self.interval_s * 1000
+            profile["samples"].append(indices)
+            profile["weights"].append(weight)
+            profile["endValue"] += weight
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "legit-rag",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [
+                {"name": frame[0], "file": frame[1], "line": frame[2]} for frame in frames
+            ]},
+            "profiles": sorted(profiles.values(), key=lambda profile: profile["name"] != "request"),
+        }
+
+    def hot_functions(self) -> List[Dict[str, Any]]:
+        """Self and total (inclusive) time per function, in milliseconds."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for (_, stack), count in self.samples.items():
+            own[stack[-1]] += count
+            for frame in set(stack):
+                total[frame] += count
+        interval_ms = self.interval_s * 1000
+        return [
+            {"function": _frame_label(frame), "self_ms": own[frame] * interval_ms,
+             "total_ms": total[frame] * interval_ms}
+            for frame in total
+        ]
+
+def _pstats_hot_functions(profile: cProfile.Profile) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profile).stats
+    return [
+        {"function": _frame_label((name, filename, line)), "self_ms": tottime * 1000,
+         "total_ms": cumtime * 1000, "calls": calls}
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.items()
+    ]
+
+def _top(rows: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    return sorted(rows, key=lambda row: (-row["self_ms"], -row["total_ms"]))[:limit]
+
+class RequestProfiler:
+    """Profiles a sample of requests and keeps the results on disk.
+
+    `mode` is "sampling" (StackSampler: wall-clock stacks of the request and
+    DAG node threads, written as speedscope and collapsed-stack files) or
+    "cprofile" (deterministic cProfile of the calling thread only, written as
+    a pstats file). Both also write a hot-function report. Only
+    `max_concurrent` profiles run at once; further requests run unprofiled.
+    The newest `max_profiles` profile directories are kept.
+    """
+    def __init__(self, output_dir: str = "profiles", sample_rate: float = 0.0,
+                 mode: str = "sampling", interval_ms: float = 5.0,
+                 max_profiles: int = 100, max_concurrent: int = 1, report_limit: int = 50):
+        if mode not in ("sampling", "cprofile"):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval_s = interval_ms / 1000
+        self.max_profiles = max_profiles
+        self.report_limit = report_limit
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._prune_lock = threading.Lock()
+
+    def should_profile(self, flagged: bool = False) -> bool:
+        return flagged or random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[Optional[str]]:
+        """Profile the enclosed block. Yields the profile id, or None if all slots are busy."""
+        if not self._slots.acquire(blocking=False):
+            yield None
+            return
+        profile_id = f"{datetime.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        sampler = StackSampler(self.interval_s) if self.mode == "sampling" else None
+        profiler = cProfile.Profile() if self.mode == "cprofile" else None
+        started = time.perf_counter()
+        error = None
+        if sampler:
+            sampler.start()
+        else:
+            profiler.enable()
+        try:
+            yield profile_id
+        except BaseException as e:
+            error = e.__class__.__name__
+            raise
+        finally:
+            if sampler:
+                sampler.stop()
+            else:
+                profiler.disable()
+            duration_ms = (time.perf_counter() - started) * 1000
+            try:
+                self._write(profile_id, label, duration_ms, error, sampler, profiler)
+            except OSError as e:
+                # Never fail the request because its profile could not be stored
+                print(f"Could not write profile {profile_id}: {e}", file=sys.stderr)
+            finally:
+                self._slots.release()
+
+    def _write(self, profile_id: str, label: str, duration_ms: float, error: Optional[str],
+               sampler: Optional[StackSampler], profiler: Optional[cProfile.Profile]) -> None:
+        directory = self.output_dir / profile_id
+        directory.mkdir()
+        if sampler:
+            (directory / ARTIFACTS["collapsed"]).write_text(sampler.collapsed())
+            (directory / ARTIFACTS["speedscope"]).write_text(json.dumps(sampler.speedscope(label)))
+            functions = sampler.hot_functions()
+        else:
+            profiler.dump_stats(str(directory / ARTIFACTS["pstats"]))
+            functions = _pstats_hot_functions(profiler)
+        report = {
+            "profile_id": profile_id,
+            "label": label,
+            "mode": self.mode,
+            "created_at": datetime.now().isoformat(),
+            "duration_ms": duration_ms,
+            "error": error,
+            "samples": sum(sampler.samples.values()) if sampler else None,
+            "functions": _top(functions, self.report_limit),
+        }
+        (directory / ARTIFACTS["report"]).write_text(json.dumps(report))
+        self._prune()
+
+    def _prune(self) -> None:
+        with self._prune_lock:
+            for directory in self._profile_dirs()[self.max_profiles:]:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def _profile_dirs(self) -> List[Path]:
+        """Completed profile directories, newest first. Ids sort by creation time."""
+        return sorted(
+            (path.parent for path in self.output_dir.glob(f"*/{ARTIFACTS['report']}")),
+            key=lambda path: path.name, reverse=True
+        )
+
+    def list_profiles(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Summaries of the newest profiles, without their function tables."""
+        summaries = []
+        for directory in self._profile_dirs()[:limit]:
+            report = self.report(directory.name)
+            if report is None:
+                continue
+            report.pop("functions")
+            report["artifacts"] = [name for name, filename in ARTIFACTS.items() if (directory / filename).exists()]
+            summaries.append(report)
+        return summaries
+
+    def report(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self.artifact(profile_id, "report")
+        if path is None:
+            return None
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None  # Pruned or still being written
+
+    def artifact(self, profile_id: str, name: str) -> Optional[Path]:
+        """Path of a profile's artifact, or None if it doesn't exist."""
+        if name not in ARTIFACTS or Path(profile_id).name != profile_id:
+            return None
+        path = self.output_dir / profile_id / ARTIFACTS[name]
+        return path if path.exists() else None
+
+    def hot_functions(self, limit: int = 50, last: int = 100) -> Dict[str, Any]:
+        """Functions ranked by self time summed over the newest `last` profiles.
+
+        Each profile's report only lists its own top functions, so functions
+        that are never individually hot are undercounted.
+        """
+        totals: Dict[str, Dict[str, Any]] = {}
+        profiles = 0
+        for directory in self._profile_dirs()[:last]:
+            report = self.report(directory.name)
+            if report is None:
+                continue
+            profiles += 1
+            for row in report["functions"]:
+                entry = totals.setdefault(row["function"], {
+                    "function": row["function"], "self_ms": 0.0, "total_ms": 0.0, "profiles": 0
+                })
+                entry["self_ms"] += row["self_ms"]
+                entry["total_ms"] += row["total_ms"]
+                entry["profiles"] += 1
+        return {"profiles": profiles, "functions": _top(list(totals.values()), limit)}
+
+def create_request_profiler(settings) -> Optional[RequestProfiler]:
+    """Build the profiler configured by the `profiling_*` settings, or None if disabled.
+
+    Profiling is on when requests are sampled or when an admin token allows
+    flagging requests with the X-Profile header.
+    """
+    if not settings.profiling_sample_rate and not settings.admin_token:
+        return None
+    return RequestProfiler(
+        output_dir=settings.profiling_dir,
+        sample_rate=settings.profiling_sample_rate,
+        mode=settings.profiling_mode,
+        interval_ms=settings.profiling_interval_ms,
+        max_profiles=settings.profiling_max_profiles
+    )
@@ -1,4 +1,5 @@
 from .base import BaseWorkflow
 from .rag_workflow import RAGWorkflow
+from .dag import DAGWorkflow, Node, build_rag_dag
 
-__all__ = ['BaseWorkflow', 'RAGWorkflow'] 
\ No newline at end of file
+__all__ = ['BaseWorkflow', 'RAGWorkflow', 'DAGWorkflow', 'Node', 'build_rag_dag']
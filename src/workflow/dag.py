@@ -0,0 +1,238 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from ..models import QueryIntent
+from ..components import (
+    BaseComponent,
+    BaseRequestRouter,
+    BaseQueryReformulator,
+    BaseRetriever,
+    BaseCompletionChecker,
+    BaseAnswerGenerator,
+    SessionLookup,
+    SessionContext
+)
+from .base import BaseWorkflow
+from ..logging.base import BaseLogger, StepLog
+from ..logging.json_logger import JsonLogger
+
+# Shared by all DAG workflows; nodes are I/O bound (LLM, embedding and vector store calls)
+_node_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="dag-node")
+
+@dataclass
+class Node:
+    """One step of a DAGWorkflow.
+
+    `inputs` and `kwargs` are references into the workflow state: the name of
+    a workflow input or node, optionally followed by attribute or key lookups
+    (e.g. "reformulator.keywords"). A node depends on every node it
+    references plus those listed in `after` and `optional`. It is skipped when
+    `when` returns False for the state, or when any node it depends on was
+    skipped, except those in `optional`; a skipped node's output is None.
+    """
+    name: str
+    component: BaseComponent
+    inputs: Sequence[str] = ()
+    kwargs: Dict[str, str] = field(default_factory=dict)
+    after: Sequence[str] = ()
+    when: Optional[Callable[[Dict[str, Any]], bool]] = None
+    optional: Sequence[str] = ()
+
+def _root(ref: str) -> str:
+    return ref.split(".", 1)[0]
+
+def resolve(state: Dict[str, Any], ref: str) -> Any:
+    """Look up a reference like "node" or "node.field" in the workflow state."""
+    root, *path = ref.split(".")
+    value = state[root]
+    for part in path:
+        if value is None:
+            return None
+        value = value[part] if isinstance(value, dict) else getattr(value, part)
+    return value
+
+class DAGWorkflow(BaseWorkflow):
+    """Runs components as a dependency graph instead of a fixed sequence.
+
+    Every node whose dependencies are done starts immediately, so independent
+    nodes run concurrently. Positional workflow arguments are bound to
+    `inputs` by name; a "deadline" input is passed to every node. The
+    workflow returns the value of the `output` reference, or None if that
+    node was skipped. Each step log's metadata records the node name and
+    when the node started and finished relative to the workflow start.
+    """
+    def __init__(
+        self,
+        nodes: List[Node],
+        output: str,
+        inputs: Sequence[str] = ("query",),
+        name: str = "dag_workflow",
+        metadata: Optional[Dict[str, Any]] = None,
+        logger: Optional[BaseLogger] = None
+    ):
+        super().__init__(name=name, metadata=metadata)
+        self.nodes = {node.name: node for node in nodes}
+        if len(self.nodes) != len(nodes):
+            raise ValueError("Node names must be unique")
+        self.inputs = list(inputs)
+        self.output = output
+        self.logger = logger or JsonLogger()
+        self.dependencies = {node.name: self._dependencies(node) for node in nodes}
+        self._check_acyclic()
+
+    def _dependencies(self, node: Node) -> Set[str]:
+        refs = [*node.inputs, *node.kwargs.values()]
+        known = set(self.inputs) | set(self.nodes)
+        for ref in [*refs, *node.after, *node.optional]:
+            if _root(ref) not in known:
+                raise ValueError(f"Node {node.name} references unknown {_root(ref)!r}")
+        nodes = {_root(ref) for ref in refs if _root(ref) in self.nodes}
+        return nodes | set(node.after) | set(node.optional)
+
+    def _check_acyclic(self) -> None:
+        remaining = dict(self.dependencies)
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps & remaining.keys()]
+            if not ready:
+                raise ValueError(f"Workflow has a dependency cycle among {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+
+    def _execute(self, *args, **kwargs) -> Tuple[Any, List[StepLog]]:
+        state: Dict[str, Any] = dict.fromkeys(self.inputs)
+        state.update(zip(self.inputs, args))
+        state.update(kwargs)
+        deadline = state.get("deadline")
+        started = time.perf_counter()
+
+        pending = set(self.nodes)
+        finished: Set[str] = set()
+        skipped: Set[str] = set()
+        running: Dict[Future, Tuple[str, float]] = {}
+        step_logs: List[StepLog] = []
+        try:
+            while pending or running:
+                # Start (or skip) everything whose dependencies are done
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for name in sorted(pending):
+                        if not self.dependencies[name] <= finished:
+                            continue
+                        pending.discard(name)
+                        progressed = True
+                        node = self.nodes[name]
+                        required = self.dependencies[name] - set(node.optional)
+                        if required & skipped or (node.when and not node.when(state)):
+                            state[name] = None
+                            skipped.add(name)
+                            finished.add(name)
+                            continue
+                        args_ = [resolve(state, ref) for ref in node.inputs]
+                        kwargs_ = {key: resolve(state, ref) for key, ref in node.kwargs.items()}
+                        # copy_context carries the caller's deadline and other context into the worker
+                        future = _node_executor.submit(
+                            copy_context().run, node.component.execute, *args_, deadline=deadline, **kwargs_
+                        )
+                        running[future] = (name, (time.perf_counter() - started) * 1000)
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, start_ms = running.pop(future)
+                    result, step_log = future.result()
+                    step_log.metadata = {
+                        **step_log.metadata,
+                        "dag_node": name,
+                        "dag_start_ms": start_ms,
+                        "dag_end_ms": (time.perf_counter() - started) * 1000
+                    }
+                    self.logger.log_step(step_log)
+                    step_logs.append(step_log)
+                    state[name] = result
+                    finished.add(name)
+        finally:
+            for future in running:
+                future.cancel()
+        return resolve(state, self.output), step_logs
+
+def build_rag_dag(
+    router: BaseRequestRouter,
+    reformulator: BaseQueryReformulator,
+    retriever: BaseRetriever,
+    completion_checker: BaseCompletionChecker,
+    answer_generator: BaseAnswerGenerator,
+    completion_threshold: float = 0.7,
+    metadata: Optional[Dict[str, Any]] = None,
+    logger: Optional[BaseLogger] = None,
+    session_lookup: Optional[SessionLookup] = None
+) -> DAGWorkflow:
+    """The RAGWorkflow pipeline as a DAG, with routing and reformulation in parallel.
+
+    Takes the same (query, profile, deadline, session_id) arguments as
+    RAGWorkflow. Reformulation no longer waits for the router, which saves
+    one LLM round trip per answered query at the cost of a wasted
+    reformulation for queries the router turns away. With `session_lookup`,
+    reformulation waits for the session lookup instead and follow-ups skip
+    it (see RAGWorkflow).
+    """
+    answer = lambda state: state["router"] == QueryIntent.ANSWER
+    context = "retriever"
+    nodes = [
+        Node("router", router, inputs=["query"]),
+        Node("reformulator", reformulator, inputs=["query"]),
+        Node(
+            "retriever", retriever,
+            inputs=["reformulator.refined_text", "reformulator.keywords"],
+            kwargs={"profile": "profile", "variants": "reformulator.variants"},
+            after=["router"],
+            when=answer
+        ),
+    ]
+    if session_lookup is not None:
+        context = "session_context"
+        nodes[1].after = ["session"]
+        nodes[1].when = lambda state: state["session"].mode == "new"
+        nodes += [
+            Node("session", session_lookup, inputs=["query", "session_id"], kwargs={"profile": "profile"}),
+            Node(
+                "followup_retriever", retriever,
+                inputs=["query", "session.reformulated.keywords"],
+                kwargs={"profile": "profile"},
+                after=["router"],
+                when=lambda state: answer(state) and state["session"].mode == "extend"
+            ),
+            Node(
+                "session_context", SessionContext(session_lookup),
+                inputs=["query", "session_id", "session"],
+                kwargs={
+                    "retrieved": "retriever",
+                    "followup": "followup_retriever",
+                    "reformulated": "reformulator",
+                    "profile": "profile"
+                },
+                after=["router"],
+                optional=["retriever", "followup_retriever", "reformulator"],
+                when=answer
+            ),
+        ]
+    nodes += [
+        Node("completion_checker", completion_checker, inputs=["query", context]),
+        Node(
+            "answer_generator", answer_generator,
+            inputs=["query", context],
+            after=["completion_checker"],
+            when=lambda state: state["completion_checker"] >= completion_threshold
+        ),
+    ]
+    return DAGWorkflow(
+        nodes,
+        output="answer_generator",
+        inputs=["query", "profile", "deadline", "session_id"],
+        name="rag_dag_workflow",
+        metadata=metadata,
+        logger=logger
+    )
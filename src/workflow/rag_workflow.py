@@ -1,18 +1,21 @@
 from typing import Optional, Tuple, List, Dict, Any
 import sys
-from ..models import RAGResponse, QueryIntent
+from ..models import RAGResponse, QueryIntent, RetrievalProfile
 from ..components import (
     BaseRequestRouter,
     BaseQueryReformulator,
     BaseRetriever,
     BaseCompletionChecker,
-    BaseAnswerGenerator
+    BaseAnswerGenerator,
+    SessionLookup,
+    SessionContext
 )
 from .base import BaseWorkflow
-from ..logging.base import StepLog
+from ..components.call_policy import Deadline
+from ..logging.base import BaseLogger, StepLog
 from ..logging.json_logger import JsonLogger
-# Configure logging to write to stdout
-logger = JsonLogger()
+# Step logger used when none is passed to the workflow
+default_logger = JsonLogger()
 
 class RAGWorkflow(BaseWorkflow):
     def __init__(
@@ -23,7 +26,9 @@ class RAGWorkflow(BaseWorkflow):
         completion_checker: BaseCompletionChecker,
         answer_generator: BaseAnswerGenerator,
         completion_threshold: float = 0.7,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        logger: Optional[BaseLogger] = None,
+        session_lookup: Optional[SessionLookup] = None
     ):
         super().__init__(name="rag_workflow", metadata=metadata)
         self.router = router
@@ -32,41 +37,82 @@ class RAGWorkflow(BaseWorkflow):
         self.completion_checker = completion_checker
         self.answer_generator = answer_generator
         self.completion_threshold = completion_threshold
+        self.logger = logger or default_logger
+        # Follow-ups in a session reuse or extend earlier context (see SessionLookup)
+        self.session_lookup = session_lookup
+        self.session_context = SessionContext(session_lookup) if session_lookup else None
     
-    def _execute(self, query: str) -> Tuple[Optional[RAGResponse], List[StepLog]]:
+    def _execute(self, query: str,
+                 profile: Optional[RetrievalProfile] = None,
+                 deadline: Optional[Deadline] = None,
+                 session_id: Optional[str] = None) -> Tuple[Optional[RAGResponse], List[StepLog]]:
+        # Every step gets only what is left of the request's deadline
         step_logs: List[StepLog] = []
         
+        # Match against earlier turns of the session
+        match = None
+        if self.session_lookup and session_id:
+            match, session_log = self.session_lookup.execute(
+                query, session_id, profile=profile, deadline=deadline
+            )
+            self.logger.log_step(session_log)
+            step_logs.append(session_log)
+        mode = match.mode if match else "new"
+        
         # Route
-        intent, route_log = self.router.execute(query)
-        logger.log_step(route_log)
+        intent, route_log = self.router.execute(query, deadline=deadline)
+        self.logger.log_step(route_log)
 
         step_logs.append(route_log)
         if intent != QueryIntent.ANSWER:
             return None, step_logs
         
-        # Reformulate
-        reformulated, reform_log = self.reformulator.execute(query)
-        logger.log_step(reform_log)
-        step_logs.append(reform_log)
-        
-        # Retrieve
-        context, retrieve_log = self.retriever.execute(
-            reformulated.refined_text,
-            reformulated.keywords
-        )
-        step_logs.append(retrieve_log)
-        logger.log_step(retrieve_log)
+        # Reformulate and retrieve, unless the session already has context for this query
+        reformulated = None
+        context = None
+        followup = None
+        if mode == "new":
+            reformulated, reform_log = self.reformulator.execute(query, deadline=deadline)
+            self.logger.log_step(reform_log)
+            step_logs.append(reform_log)
+            context, retrieve_log = self.retriever.execute(
+                reformulated.refined_text,
+                reformulated.keywords,
+                profile=profile,
+                variants=reformulated.variants,
+                deadline=deadline
+            )
+            step_logs.append(retrieve_log)
+            self.logger.log_step(retrieve_log)
+        elif mode == "extend":
+            # A follow-up on the same topic: search for the raw query with the earlier keywords
+            followup, retrieve_log = self.retriever.execute(
+                query, match.reformulated.keywords, profile=profile, deadline=deadline
+            )
+            step_logs.append(retrieve_log)
+            self.logger.log_step(retrieve_log)
+        if match:
+            context, context_log = self.session_context.execute(
+                query, session_id, match,
+                retrieved=context,
+                followup=followup,
+                reformulated=reformulated,
+                profile=profile,
+                deadline=deadline
+            )
+            step_logs.append(context_log)
+            self.logger.log_step(context_log)
         # Check completion
-        completion_score, check_log = self.completion_checker.execute(query, context)
-        logger.log_step(check_log)
+        completion_score, check_log = self.completion_checker.execute(query, context, deadline=deadline)
+        self.logger.log_step(check_log)
         step_logs.append(check_log)
 
         if completion_score < self.completion_threshold:
             return None, step_logs
         
         # Generate answer
-        response, generate_log = self.answer_generator.execute(query, context)
-        logger.log_step(generate_log)
+        response, generate_log = self.answer_generator.execute(query, context, deadline=deadline)
+        self.logger.log_step(generate_log)
 
         step_logs.append(generate_log)
-        return response, step_logs 
\ No newline at end of file
+        return response, step_logs
\ No newline at end of file
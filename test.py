@@ -1,5 +1,6 @@
 import requests
 import json
+import time
 
 # API endpoint
 BASE_URL = "http://localhost:8000"
@@ -28,6 +29,15 @@ response = requests.post(f"{BASE_URL}/documents", json=documents)
 print(f"Status: {response.status_code}")
 print(json.dumps(response.json(), indent=2))
 
+# Wait for the background ingestion job to finish
+job_id = response.json()["job_id"]
+while True:
+    job = requests.get(f"{BASE_URL}/documents/jobs/{job_id}").json()
+    if job["status"] in ("succeeded", "failed"):
+        print(json.dumps(job, indent=2))
+        break
+    time.sleep(0.5)
+
 # Test queries
 test_queries = [
     "When was Python created and by whom?",